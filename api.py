@@ -1,8 +1,30 @@
+import asyncio
+import functools
 import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode,unquote
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 
+from metrics import registry as metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
 ADMIN_CREDENTIALS_FILE = "gruzvill_admin.txt"
 
 url_prefix = "https://ibronevik.ru/taxi/c/gruzvill/api/v1/"
@@ -10,112 +32,439 @@ bot_admin_login = "admin@ibronevik.ru"
 bot_admin_password = "p@ssw0rd"
 bot_admin_type = "e-mail"
 
+# Роли пользователей API (u_role при регистрации, u_a_role — от чьего имени действует админ).
+# Коды не сверены с бэкендом: клиенты по-прежнему регистрируются с u_role "2" (см. RegisterClient)
+ROLE_CLIENT = 1
+ROLE_DRIVER = 2
+ROLE_ADMIN = 4
+
+# Настройки пула HTTP-соединений (меняются через configure_session)
+http_pool_size = 10  # Сколько keep-alive соединений держать открытыми
+http_timeout = (5, 30)  # Таймауты (на подключение, на чтение) в секундах
+http_retries = 3  # Сколько раз повторять запрос при 5xx или ошибке соединения
+http_backoff_factor = 0.5  # Экспоненциальная задержка между повторами: 0.5, 1, 2, ... сек
+http_retry_methods = ("GET", "POST")  # Методы, для которых разрешены повторы
+
+# Две сессии: для идемпотентных запросов (повторы при 5xx и обрывах) и для запросов,
+# меняющих состояние (CreateDrive, RegisterClient, ...): их повтор после отправки может
+# создать дубликат, поэтому повторяются только ошибки подключения (запрос не ушёл)
+_sessions = {}
+_session_lock = threading.Lock()
+
+# Счётчики задержек по эндпоинтам: {"drive/": {"count":..., "errors":..., "total_seconds":..., "max_seconds":...}}
+endpoint_stats = {}
+_stats_lock = threading.Lock()
+
+
+# configure_session меняет настройки пула; сессия пересоздаётся при следующем запросе
+def configure_session(pool_size=None, timeout=None, retries=None, backoff_factor=None, retry_methods=None):
+    global http_pool_size, http_timeout, http_retries, http_backoff_factor, http_retry_methods
+    with _session_lock:
+        if pool_size is not None:
+            http_pool_size = pool_size
+        if timeout is not None:
+            http_timeout = timeout
+        if retries is not None:
+            http_retries = retries
+        if backoff_factor is not None:
+            http_backoff_factor = backoff_factor
+        if retry_methods is not None:
+            http_retry_methods = tuple(retry_methods)
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+# _retry_policy — повторы urllib3 для сессии; для неидемпотентных запросов
+# повторяются только ошибки подключения, а 5xx и обрывы при чтении ответа — нет
+def _retry_policy(idempotent):
+    if idempotent:
+        return Retry(
+            total=http_retries,
+            connect=http_retries,
+            read=http_retries,
+            status=http_retries,
+            backoff_factor=http_backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(http_retry_methods),
+            raise_on_status=False,
+        )
+    return Retry(
+        total=http_retries,
+        connect=http_retries,
+        read=0,
+        status=0,
+        other=0,
+        backoff_factor=http_backoff_factor,
+        allowed_methods=frozenset(http_retry_methods),
+        raise_on_status=False,
+    )
+
+# get_session возвращает общую для модуля requests.Session с пулом keep-alive соединений
+# (idempotent=False — сессия без повторов уже отправленных запросов, см. _retry_policy)
+def get_session(idempotent=True):
+    session = _sessions.get(idempotent)
+    if session is None:
+        with _session_lock:
+            session = _sessions.get(idempotent)
+            if session is None:
+                retry = _retry_policy(idempotent)
+                adapter = HTTPAdapter(pool_connections=http_pool_size, pool_maxsize=http_pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({
+                    "Content-Type": "application/x-www-form-urlencoded",
+                    "Accept": "application/json",
+                    "Connection": "keep-alive"
+                })
+                _sessions[idempotent] = session
+    return session
+
+# Имя эндпоинта для счётчиков: без url_prefix и с заменой числовых id на <id>
+def _endpoint_name(url):
+    if url.startswith(url_prefix):
+        url = url[len(url_prefix):]
+    return re.sub(r"/\d+(?=/|$)", "/<id>", url)
+
+def _record_latency(endpoint, seconds, error):
+    metrics.observe("api_request_seconds", seconds, endpoint=endpoint)
+    if error:
+        metrics.inc("api_request_errors_total", endpoint=endpoint)
+    with _stats_lock:
+        stats = endpoint_stats.setdefault(endpoint, {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        stats["count"] += 1
+        stats["errors"] += int(error)
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+# GetEndpointStats возвращает копию счётчиков задержек со средним временем запроса
+def GetEndpointStats():
+    with _stats_lock:
+        return {
+            endpoint: dict(stats, mean_seconds=stats["total_seconds"] / stats["count"])
+            for endpoint, stats in endpoint_stats.items()
+        }
+
+def ResetEndpointStats():
+    with _stats_lock:
+        endpoint_stats.clear()
+
 # make_request осуществляет запросы к апи с автоподстановкой заголовков
-def make_request(url, data={}, method="POST"):
-    req = None
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Accept": "application/json"
-    }
-    if method == "POST":
-        req = requests.post(url, data=urlencode(data), headers=headers)
-    elif method == "GET":
-        req = requests.get(url, data=urlencode(data), headers=headers)
+# (через общую сессию: соединения переиспользуются, 5xx и обрывы повторяются с задержкой;
+# при idempotent=False повторяются только ошибки подключения)
+def make_request(url, data={}, method="POST", idempotent=True):
+    endpoint = _endpoint_name(url)
+    started = time.perf_counter()
+    try:
+        req = get_session(idempotent).request(method, url, data=urlencode(data), timeout=http_timeout)
+    except requests.RequestException:
+        _record_latency(endpoint, time.perf_counter() - started, True)
+        raise
+    _record_latency(endpoint, time.perf_counter() - started, req.status_code != 200)
     data = json.loads(unquote(req.text))
     if req.status_code != 200:
-        print("REQUESTS ERROR: " + str(data["code"]))
+        logger.warning("REQUESTS ERROR: %s", data["code"])
     return data
 
-# GetAdminHashAndToken получает хэш админа и токен и хранит их в указанном файле(создается если его нет)
-# это сделано для сокращения времени запросов, требующих авторизации админа
-# token и u_hash не меняются во время работы
+# _FileLock — межпроцессная блокировка через отдельный .lock файл (flock на POSIX, msvcrt на Windows)
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a+")
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+
+# AdminCredentials хранит token и u_hash админа в памяти и лениво обновляет их:
+#  - при первом обращении берёт их из файла (или логинится, если файла нет),
+#  - при устаревании (max_age) или ошибке авторизации логинится заново.
+# Файл читается и перезаписывается под межпроцессной блокировкой, а запись атомарна
+# (временный файл + os.replace), поэтому параллельные воркеры делают один общий логин.
+class AdminCredentials:
+    def __init__(self, path=ADMIN_CREDENTIALS_FILE, max_age=None):
+        self.path = path
+        self.max_age = max_age  # Время жизни токена в секундах (None — не устаревает)
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._issued_at = None
+        self._rejected_token = None
+
+    def _is_fresh(self):
+        if self._credentials is None:
+            return False
+        return self.max_age is None or time.time() - self._issued_at < self.max_age
+
+    # get возвращает копию токена и хэша, снятую под блокировкой: иначе invalidate
+    # из другого потока может сбросить их между проверкой и чтением
+    def get(self):
+        with self._lock:
+            if not self._is_fresh():
+                self._load_or_login()
+            return list(self._credentials)
+
+    # invalidate сбрасывает токен (например, после ошибки авторизации);
+    # если передан token, сбрасываем только если он всё ещё текущий
+    def invalidate(self, token=None):
+        with self._lock:
+            if self._credentials is None or (token is not None and self._credentials[0] != token):
+                return
+            self._rejected_token = self._credentials[0]
+            self._credentials = None
+
+    def _read_file(self):
+        try:
+            with open(self.path, "r") as f:
+                r = f.read().split("\n")
+            issued_at = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return None, None
+        if len(r) != 2 or not r[0] or not r[1]:
+            return None, None
+        return r, issued_at
+
+    def _write_file(self, token, u_hash):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".admin_", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(token + "\n" + u_hash)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _load_or_login(self):
+        with _FileLock(self.path + ".lock"):
+            # Другой процесс мог уже залогиниться, пока мы ждали блокировку
+            r, issued_at = self._read_file()
+            if r is not None and r[0] != self._rejected_token and \
+                    (self.max_age is None or time.time() - issued_at < self.max_age):
+                self._credentials, self._issued_at = r, issued_at
+                return
+            self._credentials = _login()
+            self._issued_at = time.time()
+            self._write_file(*self._credentials)
+
+# _login получает token и u_hash админа через auth + token
+def _login():
+    data = {
+        "login": bot_admin_login,
+        "password": bot_admin_password,
+        "type": bot_admin_type
+    }
+    data = make_request(url_prefix + "auth", data)
+    AUTH_HASH = data["auth_hash"]
+    data = {
+        "auth_hash": AUTH_HASH
+    }
+    data = make_request(url_prefix + "token", data)
+    TOKEN = data["data"]["token"]
+    U_HASH = data["data"]["u_hash"]
+    return [TOKEN, U_HASH]
+
+admin_credentials = AdminCredentials()
+
+# GetAdminHashAndToken возвращает токен и хэш админа из памяти (см. AdminCredentials);
+# файл ADMIN_CREDENTIALS_FILE читается только при первом обращении и после сброса токена
 def GetAdminHashAndToken():
-    try:
-        f = open(ADMIN_CREDENTIALS_FILE, "x")
-        f.close()
-    except:
-        pass
-    f = open(ADMIN_CREDENTIALS_FILE, "r+")
-    r = f.read().split("\n")
-    if len(r) == 1 or len(r) == 0:
-        data = {
-            "login": bot_admin_login,
-            "password": bot_admin_password,
-            "type": bot_admin_type
-        }
-        data = make_request(url_prefix + "auth", data)
-        AUTH_HASH = data["auth_hash"]
-        data = {
-            "auth_hash": AUTH_HASH
-        }
-        data = make_request(url_prefix + "token", data)
-        TOKEN = data["data"]["token"]
-        U_HASH = data["data"]["u_hash"]
-        f.write(TOKEN + "\n" + U_HASH)
-        f.close()
-        return [TOKEN, U_HASH]
-    elif len(r) == 2:
-        TOKEN = r[0]
-        U_HASH = r[1]
-        return [TOKEN, U_HASH]
+    return admin_credentials.get()
+
+# Ответ апи с ошибкой авторизации (просроченный или отозванный токен)
+def _is_auth_error(data):
+    if not isinstance(data, dict) or data.get("status") != "error":
+        return False
+    message = json.dumps(data.get("message", ""), ensure_ascii=False).lower()
+    return "token" in message or "auth" in message or "hash" in message
+
+# make_admin_request подставляет token и u_hash админа; при ошибке авторизации
+# сбрасывает токен, логинится заново и повторяет запрос один раз
+def make_admin_request(url, data={}, method="POST", idempotent=True):
+    for attempt in range(2):
+        token, u_hash = GetAdminHashAndToken()
+        result = make_request(url, {"token": token, "u_hash": u_hash, **data}, method, idempotent)
+        if attempt or not _is_auth_error(result):
+            return result
+        admin_credentials.invalidate(token)
+
+# _timed_call записывает время каждого вызова функции API (вместе с повторами
+# и перелогином) в гистограмму api_call_seconds{call="<имя функции>"}
+def _timed_call(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            metrics.inc("api_call_errors_total", call=func.__name__)
+            raise
+        finally:
+            metrics.observe("api_call_seconds", time.perf_counter() - started, call=func.__name__)
+    return wrapper
 
 # Возвращает token и u_hash пользователя, а также данные о пользователе
+@_timed_call
 def GetUserInfo(email:str):
-    token_and_hash = GetAdminHashAndToken()
     data = {
-        "token": token_and_hash[0],
-        "u_hash": token_and_hash[1],
         "u_a_email": email,
     }
-    data = make_request(url_prefix + "token", data=data)
+    data = make_admin_request(url_prefix + "token", data=data)
     return data
-def RegisterClient(email:str, name):
-    token_and_hash = GetAdminHashAndToken()
+# _register регистрирует пользователя с ролью role (u_role)
+def _register(email, name, role):
     data = {
-        "token": token_and_hash[0],
-        "u_hash": token_and_hash[1],
         "u_name": name,
         "u_email": email,
-        "u_role": "2",
+        "u_role": str(role),
         "st": ""
     }
-    data = make_request(url_prefix+"register",data=data,method="POST")
+    data = make_admin_request(url_prefix+"register",data=data,method="POST",idempotent=False)
     return data
-def CreateDrive(u_id,start_latitude,start_longitude,end_latitude,end_longitude,start_datetime,waiting,passenger_count=1,services=[]):
-    token,u_hash = GetAdminHashAndToken()
+# Регистрирует клиента (от его имени создаются заказы, см. CreateDrive)
+@_timed_call
+def RegisterClient(email:str, name):
+    # Исходный u_role клиентов; менять его — только после сверки кодов ролей с бэкендом
+    return _register(email, name, "2")
+# Регистрирует водителя (от его имени принимаются заказы и отдаются голоса, см. main.DriversList)
+@_timed_call
+def RegisterDriver(email:str, name):
+    return _register(email, name, ROLE_DRIVER)
+# Поле data запроса на создание поездки (JSON-строка); его можно подготовить заранее
+# и передать в CreateDrive как data_json
+def DriveData(start_latitude,start_longitude,end_latitude,end_longitude,start_datetime,waiting,passenger_count=1,services=[]):
+    return json.dumps({
+        "b_start_latitude": start_latitude,
+        "b_start_longitude": start_longitude,
+        "b_destination_latitude": end_latitude,
+        "b_destination_longitude": end_longitude,
+        "b_start_datetime": start_datetime,
+        "b_max_waiting": waiting,
+        "b_passengers_count": passenger_count,
+        "b_payment_way": "1",
+        "b_services": services
+    })
+@_timed_call
+def CreateDrive(u_id,start_latitude,start_longitude,end_latitude,end_longitude,start_datetime,waiting,passenger_count=1,services=[],data_json=None):
+    if data_json is None:
+        data_json = DriveData(start_latitude,start_longitude,end_latitude,end_longitude,start_datetime,waiting,passenger_count,services)
     data = {
-        "token": token,
-        "u_hash": u_hash,
-
         "u_a_id":str(u_id), # Авторизован(по токену и хэшу) админ, а drive создастя от лица юзера - имиация пользователя админом
-        "u_a_role":1,
+        "u_a_role":ROLE_CLIENT,
         "u_check_state": 2,
-        "data":json.dumps({
-            "b_start_latitude": start_latitude,
-            "b_start_longitude": start_longitude,
-            "b_destination_latitude": end_latitude,
-            "b_destination_longitude": end_longitude,
-            "b_start_datetime": start_datetime,
-            "b_max_waiting": waiting,
-            "b_passengers_count": passenger_count,
-            "b_payment_way": "1",
-            "b_services": services
-        })
+        "data":data_json
 
     }
-    data = make_request(url_prefix + "drive/", data=data)
+    data = make_admin_request(url_prefix + "drive/", data=data, idempotent=False)
     return data
 
+@_timed_call
 def CancelDrive(drive_id,reason:str):
-    token,u_hash = GetAdminHashAndToken()
     data = {
-        "token": token,
-        "u_hash": u_hash,
-
-        "u_a_role":4, # user_role=4 for deleting drive under admin
+        "u_a_role":ROLE_ADMIN, # Отмена заказа — от имени админа
 
         "action":"set_cancel_state",
         "reason":reason,
     }
-    data = make_request(url_prefix + "drive/get/"+str(drive_id), data=data)
+    data = make_admin_request(url_prefix + "drive/get/"+str(drive_id), data=data)
+    return data
+
+# Водитель driver_id берёт обычный заказ drive_id (админ действует от лица водителя)
+@_timed_call
+def AcceptDrive(drive_id,driver_id):
+    data = {
+        "u_a_id":str(driver_id),
+        "u_a_role":ROLE_DRIVER,
+        "action":"set_performer",
+    }
+    data = make_admin_request(url_prefix + "drive/get/"+str(drive_id), data=data, idempotent=False)
+    return data
+
+# Водитель driver_id голосует за заказ-голосование drive_id (b_services ['5'])
+@_timed_call
+def VoteDrive(drive_id,driver_id):
+    data = {
+        "u_a_id":str(driver_id),
+        "u_a_role":ROLE_DRIVER,
+        "action":"set_vote",
+    }
+    data = make_admin_request(url_prefix + "drive/get/"+str(drive_id), data=data, idempotent=False)
     return data
+
+
+# AsyncApiClient — общий асинхронный клиент для API.
+# Запросы выполняются в пуле потоков поверх тех же keep-alive сессий (get_session),
+# поэтому работают повторы, пул соединений и счётчики задержек; число одновременных
+# запросов ограничено max_concurrency (имеет смысл держать его не больше http_pool_size).
+class AsyncApiClient:
+    def __init__(self, max_concurrency=None):
+        self.max_concurrency = max_concurrency or http_pool_size
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="api")
+        self._semaphores = weakref.WeakKeyDictionary()  # Свой семафор на каждый event loop
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def call(self, func, *args, **kwargs):
+        async with self._semaphore():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+_async_client = None
+
+# configure_async_client пересоздаёт общий асинхронный клиент с новым ограничением параллельности
+def configure_async_client(max_concurrency=None):
+    global _async_client
+    if _async_client is not None:
+        _async_client.close()
+    _async_client = AsyncApiClient(max_concurrency)
+    return _async_client
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncApiClient()
+    return _async_client
+
+async def AsyncGetUserInfo(email:str):
+    return await get_async_client().call(GetUserInfo, email)
+
+async def AsyncRegisterClient(email:str, name):
+    return await get_async_client().call(RegisterClient, email, name)
+
+async def AsyncRegisterDriver(email:str, name):
+    return await get_async_client().call(RegisterDriver, email, name)
+
+async def AsyncCreateDrive(u_id,start_latitude,start_longitude,end_latitude,end_longitude,start_datetime,waiting,passenger_count=1,services=[],data_json=None):
+    return await get_async_client().call(CreateDrive, u_id, start_latitude, start_longitude, end_latitude, end_longitude,
+                                         start_datetime, waiting, passenger_count, services, data_json)
+
+async def AsyncCancelDrive(drive_id,reason:str):
+    return await get_async_client().call(CancelDrive, drive_id, reason)
+
+async def AsyncAcceptDrive(drive_id,driver_id):
+    return await get_async_client().call(AcceptDrive, drive_id, driver_id)
+
+async def AsyncVoteDrive(drive_id,driver_id):
+    return await get_async_client().call(VoteDrive, drive_id, driver_id)
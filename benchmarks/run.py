@@ -0,0 +1,102 @@
+"""
+Запуск бенчмарков симулятора (без доступа к ibronevik: API — локальный stub_server).
+
+    python benchmarks/run.py                          # все сценарии, результат в benchmarks/results.json
+    python benchmarks/run.py --quick --only sampling  # быстрый прогон одного сценария
+    python benchmarks/run.py --baseline benchmarks/baseline.json --fail-on-regression
+
+Результат — JSON: {"meta": {...}, "results": {"<имя>": {"value", "unit", "better"}}}.
+С --baseline каждая метрика сравнивается с сохранённой; ухудшение больше --tolerance
+считается регрессией.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import shapely
+
+from scenarios import SCENARIOS
+
+
+def run(names, scale):
+    results = {}
+    for name in names:
+        print(f"== {name}", file=sys.stderr)
+        for result in SCENARIOS[name](scale):
+            results[result.pop('name')] = result
+            print(f"   {next(reversed(results))}: {result['value']:.6g} {result['unit']}", file=sys.stderr)
+    return {
+        'meta': {
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'shapely': shapely.__version__,
+            'scale': scale,
+            'scenarios': list(names),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """
+    Сравнивает результаты с базовыми. Возвращает список строк отчёта и список регрессий.
+    """
+    lines = []
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None or not base['value']:
+            lines.append(f"{name:60s} {result['value']:12.6g} {result['unit']:10s}  (нет в базовом)")
+            continue
+        ratio = result['value'] / base['value']
+        # change > 0 — улучшение, < 0 — ухудшение (с учётом направления метрики)
+        change = ratio - 1 if result['better'] == 'higher' else 1 / ratio - 1 if ratio else float('inf')
+        mark = ""
+        if change < -tolerance:
+            mark = "  РЕГРЕССИЯ"
+            regressions.append(name)
+        lines.append(f"{name:60s} {result['value']:12.6g} {result['unit']:10s} {change:+8.1%}{mark}")
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки TaxiSim")
+    parser.add_argument("--only", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--quick", action="store_true", help="уменьшенные размеры задач (scale=0.1)")
+    parser.add_argument("--scale", type=float, default=None)
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(__file__), "results.json"))
+    parser.add_argument("--baseline", default=None, help="JSON с результатами для сравнения")
+    parser.add_argument("--save-baseline", default=None, help="сохранить результат и как базовый")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="допустимое ухудшение (доля)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    scale = args.scale if args.scale is not None else (0.1 if args.quick else 1.0)
+    current = run(args.only, scale)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, regressions = compare(current, baseline, args.tolerance)
+        print("\n".join(lines))
+        if regressions:
+            print(f"Регрессий: {len(regressions)}")
+            if args.fail_on_regression:
+                sys.exit(1)
+    else:
+        print(json.dumps(current['results'], ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+"""
+Сценарии бенчмарков. Каждый сценарий — функция scale -> список результатов
+{'name': ..., 'value': ..., 'unit': ..., 'better': 'higher' | 'lower'}.
+
+scale < 1 уменьшает размеры задач (быстрый прогон), scale = 1 — полный прогон.
+"""
+import asyncio
+import math
+import os
+import tempfile
+import time
+
+import numpy as np
+from shapely.geometry import Polygon
+
+import api
+from drivers import GridIndex
+from engine import DiscreteEventEngine, VirtualClock
+from hotspots import HotspotSampler
+from main import AsyncTaxiOrderSimulator, TaxiOrderSimulator, UsersList
+from sampling import make_sampler
+from sinks import ApiOrderSink, FakeOrderSink
+from stub_server import StubServer
+
+# Полигон зоны из примера в main.py (невыпуклый)
+CITY = [
+    (30.42854544631636, -9.611663818359375),
+    (30.45459295698008, -9.53819274902344),
+    (30.420256142845158, -9.545745849609377),
+    (30.410189613309132, -9.526519775390627),
+    (30.385314913418373, -9.482574462890627),
+    (30.35806392728733, -9.477081298828127),
+    (30.34325042354528, -9.472961425781252),
+    (30.329620019722665, -9.481201171875002),
+    (30.315987718557867, -9.50798034667969),
+    (30.329620019722665, -9.539566040039064),
+    (30.347990988731844, -9.567718505859377),
+    (30.378206692827195, -9.602050781250002),
+]
+
+
+def _star(n=12, r_outer=0.06, r_inner=0.02, center=(30.38, -9.54)):
+    angles = np.arange(2 * n) * math.pi / n
+    radii = np.where(np.arange(2 * n) % 2 == 0, r_outer, r_inner)
+    return list(zip(center[0] + radii * np.cos(angles), center[1] + radii * np.sin(angles)))
+
+
+# Полигоны для сценариев генерации точек (координаты (lat, lon), расстояния — в градусах)
+POLYGONS = {
+    'convex': [(30.33, -9.60), (30.43, -9.60), (30.45, -9.54), (30.43, -9.48), (30.33, -9.48), (30.31, -9.54)],
+    'concave': CITY,
+    'star': _star(),
+    # Узкая полоса (набережная): bounding box почти пустой
+    'thin': [(30.30, -9.60), (30.45, -9.48), (30.452, -9.482), (30.302, -9.602)],
+}
+
+# Диапазоны расстояний (градусы): близкие, обычные и дальние поездки
+DISTANCE_BANDS = {
+    'short': (0.0, 0.01),
+    'regular': (0.01, 0.05),
+    'long': (0.08, 0.12),
+}
+
+
+def _result(name, value, unit, better='higher'):
+    return {'name': name, 'value': value, 'unit': unit, 'better': better}
+
+
+def _scaled_sizes(sizes, scale, minimum):
+    """
+    Размеры задач с учётом scale (не меньше minimum) без повторов: при малом scale размеры
+    сливаются, а результаты с одинаковыми именами затирали бы друг друга.
+    """
+    return sorted({max(int(size * scale), minimum) for size in sizes})
+
+
+def _timed(func, min_seconds=0.2):
+    """
+    Повторяет func, пока не наберётся min_seconds; возвращает (время одного вызова, число вызовов).
+    """
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return elapsed / calls, calls
+
+
+def _make_sampler(method, polygon, rng):
+    if method == 'hotspot':
+        return HotspotSampler(polygon, hotspots=[{'center': polygon.centroid.coords[0], 'sigma': 0.01, 'weight': 20}],
+                              rng=rng)
+    return make_sampler(method, polygon, rng=rng)
+
+
+# ---------------------------------
+#   Генерация точек
+# ---------------------------------
+def sampling(scale):
+    """
+    Скорость генерации точек и пар (откуда, куда) на разных полигонах и разными методами.
+    """
+    results = []
+    n = max(int(2048 * scale), 64)
+    for shape, coords in POLYGONS.items():
+        polygon = Polygon(coords)
+        for method in ('triangulation', 'bbox', 'hotspot'):
+            sampler = _make_sampler(method, polygon, np.random.default_rng(0))
+            per_call, _ = _timed(lambda: sampler.sample_points(n))
+            results.append(_result(f'sampling.points.{shape}.{method}', n / per_call, 'points/s'))
+            dmin, dmax = DISTANCE_BANDS['regular']
+            per_call, _ = _timed(lambda: sampler.sample_pairs(max(n // 8, 16), dmin, dmax))
+            results.append(_result(f'sampling.pairs.{shape}.{method}', max(n // 8, 16) / per_call, 'pairs/s'))
+    return results
+
+
+def distance_bands(scale):
+    """
+    Доля принятых кандидатов (bbox), перевыбранных точек отправления (triangulation, hotspot)
+    и точек отправления, для которых понадобилось точное отсечение кольца (triangulation),
+    для разных диапазонов расстояний.
+    """
+    results = []
+    n = max(int(1024 * scale), 64)
+    polygon = Polygon(CITY)
+    for band, (dmin, dmax) in DISTANCE_BANDS.items():
+        bbox = make_sampler('bbox', polygon, rng=np.random.default_rng(0))
+        bbox.sample_pairs(n, dmin, dmax)
+        results.append(_result(f'distance_band.{band}.bbox.acceptance',
+                                bbox.dest_candidates_accepted / max(bbox.dest_candidates_drawn, 1), 'ratio'))
+        for method in ('triangulation', 'hotspot'):
+            sampler = _make_sampler(method, polygon, np.random.default_rng(0))
+            started = time.perf_counter()
+            sampler.sample_pairs(n, dmin, dmax)
+            elapsed = time.perf_counter() - started
+            results.append(_result(f'distance_band.{band}.{method}.origin_retries',
+                                   sampler.origin_retries / n, 'per pair', better='lower'))
+            results.append(_result(f'distance_band.{band}.{method}.pairs', n / elapsed, 'pairs/s'))
+            if method == 'triangulation':
+                results.append(_result(f'distance_band.{band}.triangulation.annulus_clipped',
+                                       sampler.annulus_clipped / n, 'per pair', better='lower'))
+    return results
+
+
+# ---------------------------------
+#   Стоимость update()
+# ---------------------------------
+def _filled_simulator(size):
+    """
+    Симулятор с size активными заказами и 2 * size пользователями; сроки жизни заказов
+    разнесены так, что на каждом тике истекает примерно один заказ.
+    """
+    users = UsersList(user_count=2 * size)
+    users.make_local()
+    # Заказ в секунду, каждый живёт size секунд: в установившемся режиме активно size заказов
+    sim = TaxiOrderSimulator(CITY, users, regular_frequency=3600, voting_frequency=0,
+                             regular_lifetime_minutes=size / 60, sampling_method='bbox',
+                             sink=FakeOrderSink(), clock=VirtualClock(), seed=0)
+    sim.start()
+    # Заказы первых size секунд проходят обычный путь планировщика и отправки одним тиком,
+    # а истекают дальше по одному в секунду
+    DiscreteEventEngine(sim)._advance_game_time(size - 1)
+    sim._generate_due_orders('regular', sim._get_game_time_since_start())
+    return sim
+
+
+def update_cost(scale):
+    """
+    Время update() в установившемся режиме (создание и истечение заказов на каждом тике),
+    get_active_orders(), опрос active_orders_view() и _get_free_user_ids() при 1k / 10k / 100k активных заказов.
+    """
+    results = []
+    for size in _scaled_sizes((1000, 10000, 100000), scale, 100):
+        sim = _filled_simulator(size)
+        try:
+            engine = DiscreteEventEngine(sim)
+            ticks = 500
+            game_time = sim._get_game_time_since_start()
+            started = time.perf_counter()
+            for _ in range(ticks):
+                game_time += 1.0
+                engine._advance_game_time(game_time)
+                sim.update()
+            per_tick = (time.perf_counter() - started) / ticks
+            results.append(_result(f'update.tick.{size}', per_tick * 1e6, 'us', better='lower'))
+
+            per_call, _ = _timed(sim.get_active_orders)
+            results.append(_result(f'update.get_active_orders.{size}', per_call * 1e3, 'ms', better='lower'))
+            # Опрос кэшированного снимка: остаток жизни массивом, без форматирования
+            per_call, _ = _timed(lambda: sim.active_orders_view().remaining_seconds())
+            results.append(_result(f'update.active_orders_view.{size}', per_call * 1e6, 'us', better='lower'))
+            per_call, _ = _timed(sim._get_free_user_ids)
+            results.append(_result(f'update.free_user_ids.{size}', per_call * 1e3, 'ms', better='lower'))
+        finally:
+            # Останавливаем поток планировщика и пул отмен, иначе они копятся от размера к размеру
+            sim.stop()
+    return results
+
+
+# ---------------------------------
+#   Сквозной прогон через локальный стаб API
+# ---------------------------------
+def end_to_end(scale, latency_ms=(0.0, 5.0, 20.0)):
+    """
+    Заказов в секунду (создание + отмена) через ApiOrderSink и локальный stub_server
+    с заданной задержкой ответа. Игровое время — виртуальное, т.е. симулятор ограничен только API.
+    """
+    results = []
+    saved_prefix, saved_credentials = api.url_prefix, api.admin_credentials
+    workdir = tempfile.mkdtemp(prefix="taxisim_bench_")
+    for latency in latency_ms:
+        server = StubServer(latency_ms=latency, seed=0).start()
+        try:
+            api.url_prefix = server.url_prefix
+            api.admin_credentials = api.AdminCredentials(path=os.path.join(workdir, f"admin_{latency:g}.txt"))
+            api.ResetEndpointStats()
+            users = UsersList(user_count=50)
+            users.sync(workers=10)
+            until = max(int(1800 * scale), 300)
+
+            for name, cls in (('sync', TaxiOrderSimulator), ('async', AsyncTaxiOrderSimulator)):
+                sim = cls(CITY, users, regular_frequency=300, voting_frequency=100, regular_lifetime_minutes=2,
+                          voting_lifetime_minutes_min=1, voting_lifetime_minutes_max=3,
+                          sink=ApiOrderSink(), clock=VirtualClock(), seed=0)
+                started = time.perf_counter()
+                try:
+                    if name == 'sync':
+                        DiscreteEventEngine(sim).run(until)
+                    else:
+                        asyncio.run(_run_async(sim, until))
+                finally:
+                    sim.stop()
+                elapsed = time.perf_counter() - started
+                created = len(sim.orders) + len(sim.orders.history)
+                results.append(_result(f'e2e.{name}.latency_{latency:g}ms', created / elapsed, 'orders/s'))
+
+            stats = api.GetEndpointStats().get('drive/')
+            if stats:
+                results.append(_result(f'e2e.create_drive_mean.latency_{latency:g}ms',
+                                       stats['mean_seconds'] * 1e3, 'ms', better='lower'))
+        finally:
+            server.stop()
+            api.url_prefix, api.admin_credentials = saved_prefix, saved_credentials
+    return results
+
+
+# ---------------------------------
+#   Водители: подбор ближайших заказов
+# ---------------------------------
+def _nearest_all_pairs(points, queries, chunk=256):
+    """
+    Ближайшая точка для каждого запроса полным перебором расстояний (для сравнения с GridIndex).
+    """
+    nearest = np.empty(len(queries), dtype=np.int64)
+    for begin in range(0, len(queries), chunk):
+        delta = queries[begin:begin + chunk, None, :] - points[None, :, :]
+        nearest[begin:begin + chunk] = np.einsum('qpk,qpk->qp', delta, delta).argmin(axis=1)
+    return nearest
+
+
+def drivers(scale):
+    """
+    Пакетный поиск ближайшего свободного водителя для активных заказов: сетка GridIndex
+    против полного перебора пар, перестройка индекса при движении и тик симулятора
+    с парком водителей (1k / 10k водителей).
+    """
+    results = []
+    polygon = Polygon(CITY)
+    for count in _scaled_sizes((1000, 10000), scale, 100):
+        rng = np.random.default_rng(0)
+        sampler = make_sampler('triangulation', polygon, rng=rng)
+        positions = sampler.sample_points(count)
+        orders = sampler.sample_points(max(count // 10, 10))
+        index = GridIndex(polygon.bounds, math.sqrt(2 * polygon.area / count), count)
+        index.insert(np.arange(count), positions)
+
+        per_call, _ = _timed(lambda: index.nearest(orders))
+        results.append(_result(f'drivers.nearest.grid.{count}', per_call * 1e3, 'ms', better='lower'))
+        per_call, _ = _timed(lambda: _nearest_all_pairs(positions, orders))
+        results.append(_result(f'drivers.nearest.all_pairs.{count}', per_call * 1e3, 'ms', better='lower'))
+
+        # Сдвиг всех водителей на ~1/20 клетки: в другую клетку переходит малая часть
+        step = rng.normal(0, index.cell_size / 20, positions.shape)
+        moved = [positions]
+
+        def move():
+            moved[0] = moved[0] + step
+            index.move(np.arange(count), moved[0])
+
+        per_call, _ = _timed(move)
+        results.append(_result(f'drivers.index_move.{count}', per_call * 1e3, 'ms', better='lower'))
+
+        users = UsersList(user_count=2 * count)
+        users.make_local()
+        sim = TaxiOrderSimulator(CITY, users, regular_frequency=36000, voting_frequency=0,
+                                 sink=FakeOrderSink(), clock=VirtualClock(), seed=0, drivers={'count': count})
+        engine = DiscreteEventEngine(sim)
+        sim.start()
+        try:
+            ticks = 200
+            game_time = 0.0
+            started = time.perf_counter()
+            for _ in range(ticks):
+                game_time += 1.0
+                engine._advance_game_time(game_time)
+                sim.update()
+            per_tick = (time.perf_counter() - started) / ticks
+        finally:
+            sim.stop()
+        results.append(_result(f'drivers.tick.{count}', per_tick * 1e3, 'ms', better='lower'))
+    return results
+
+
+async def _run_async(sim, until):
+    """
+    Дискретно-событийный прогон асинхронного симулятора (аналог DiscreteEventEngine.run).
+    """
+    engine = DiscreteEventEngine(sim)
+    sim.start()
+    game_time = 0.0
+    while game_time < until:
+        game_time = min(engine.next_event_time(), until)
+        engine._advance_game_time(game_time)
+        await sim.update()
+
+
+SCENARIOS = {
+    'sampling': sampling,
+    'distance_bands': distance_bands,
+    'update': update_cost,
+    'e2e': end_to_end,
+    'drivers': drivers,
+}
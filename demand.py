@@ -0,0 +1,148 @@
+"""
+Профили спроса и расписания генерации заказов.
+
+Расписание отвечает на вопрос "когда следующий заказ данного типа" (в игровых секундах
+от старта симуляции):
+ - FixedIntervalSchedule — заказы через равные интервалы (как раньше, 3600 / frequency);
+ - PoissonSchedule — неоднородный пуассоновский поток с интенсивностью из DemandProfile.
+"""
+import bisect
+import math
+import random
+
+DAY_SECONDS = 24 * 3600
+
+
+class DemandProfile:
+    """
+    Кусочно-постоянная интенсивность заказов по времени суток (заказов в час), период — сутки.
+
+    Накопленная интенсивность Λ(t) на границах участков считается один раз при создании,
+    поэтому обратное преобразование Λ⁻¹ (и момент следующего заказа) находится бинарным
+    поиском за O(log n).
+    """
+
+    def __init__(self, points):
+        """
+        :param points: список (час_начала, заказов_в_час), например [(0, 2), (7, 20), (10, 8), (17, 25), (20, 6)].
+                       Участок действует до начала следующего; последний — до конца суток.
+        """
+        points = sorted((float(hour), float(rate)) for hour, rate in points)
+        if not points:
+            raise ValueError("Профиль спроса пуст")
+        if any(rate < 0 for _, rate in points):
+            raise ValueError("Интенсивность не может быть отрицательной")
+        if any(not 0 <= hour < 24 for hour, _ in points):
+            raise ValueError("Час начала участка должен быть в [0, 24)")
+        if points[0][0] > 0:
+            # Сутки замыкаются: до первого участка действует интенсивность последнего
+            points.insert(0, (0.0, points[-1][1]))
+
+        self.points = points
+        self.starts = [hour * 3600 for hour, _ in points]
+        self.rates = [rate / 3600 for _, rate in points]  # Заказов в секунду
+        ends = self.starts[1:] + [DAY_SECONDS]
+
+        # Накопленная интенсивность на начале и конце каждого участка
+        self.cumulative = []
+        self.cumulative_end = []
+        total = 0.0
+        for start, end, rate in zip(self.starts, ends, self.rates):
+            self.cumulative.append(total)
+            total += rate * (end - start)
+            self.cumulative_end.append(total)
+        self.total = total  # Ожидаемое число заказов за сутки
+
+    @classmethod
+    def hourly(cls, rates):
+        """
+        Профиль из списка интенсивностей по часам суток: rates[h] — заказов в час с h:00 до h+1:00.
+        """
+        if len(rates) != 24:
+            raise ValueError("Нужно ровно 24 значения — по одному на каждый час суток")
+        return cls(list(enumerate(rates)))
+
+    @classmethod
+    def from_spec(cls, spec):
+        """
+        DemandProfile, список из 24 значений по часам или список пар (час, интенсивность).
+        """
+        if isinstance(spec, DemandProfile):
+            return spec
+        spec = list(spec)
+        if spec and all(isinstance(v, (int, float)) for v in spec):
+            return cls.hourly(spec)
+        return cls(spec)
+
+    def rate_at(self, seconds_of_day):
+        """
+        Интенсивность (заказов в час) в момент времени суток (секунды от полуночи).
+        """
+        idx = bisect.bisect_right(self.starts, seconds_of_day % DAY_SECONDS) - 1
+        return self.rates[idx] * 3600
+
+    def cumulative_at(self, seconds):
+        """
+        Λ(t): ожидаемое число заказов с полуночи первого дня до момента seconds.
+        """
+        days, r = divmod(seconds, DAY_SECONDS)
+        idx = bisect.bisect_right(self.starts, r) - 1
+        return days * self.total + self.cumulative[idx] + self.rates[idx] * (r - self.starts[idx])
+
+    def inverse_cumulative(self, value):
+        """
+        Λ⁻¹: момент (секунды от полуночи первого дня), к которому ожидается value заказов.
+        """
+        days, rem = divmod(value, self.total)
+        # Первый участок, который заканчивается позже rem (участки с нулевой интенсивностью пропускаются)
+        idx = bisect.bisect_right(self.cumulative_end, rem)
+        idx = min(idx, len(self.rates) - 1)
+        return days * DAY_SECONDS + self.starts[idx] + (rem - self.cumulative[idx]) / self.rates[idx]
+
+    def next_arrival(self, seconds, rng=random):
+        """
+        Момент следующего заказа после seconds (секунды от полуночи первого дня).
+        """
+        if self.total <= 0:
+            return math.inf
+        return self.inverse_cumulative(self.cumulative_at(seconds) + rng.expovariate(1.0))
+
+
+class FixedIntervalSchedule:
+    """
+    Заказы через равные игровые интервалы; первый — сразу при старте.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_time = 0.0
+
+    def advance(self):
+        self.next_time += self.interval
+
+
+class PoissonSchedule:
+    """
+    Неоднородный пуассоновский поток заказов с интенсивностью по профилю спроса.
+
+    Моменты заказов получаются преобразованием однородного потока единичной интенсивности
+    через Λ⁻¹ (для кусочно-постоянной интенсивности это точнее и дешевле прореживания:
+    каждый следующий заказ — одна экспонента и один бинарный поиск).
+    """
+
+    def __init__(self, profile, day_offset_seconds=0.0, rng=random):
+        """
+        :param profile: DemandProfile (или то, что понимает DemandProfile.from_spec).
+        :param day_offset_seconds: время суток старта симуляции в секундах от полуночи (8:00 -> 28800).
+        :param rng: генератор с методом expovariate (модуль random или random.Random).
+        """
+        self.profile = DemandProfile.from_spec(profile)
+        self.day_offset_seconds = day_offset_seconds
+        self.rng = rng
+        self.next_time = self._arrival_after(0.0)
+
+    def _arrival_after(self, game_seconds):
+        return self.profile.next_arrival(game_seconds + self.day_offset_seconds, self.rng) - self.day_offset_seconds
+
+    def advance(self):
+        self.next_time = self._arrival_after(self.next_time)
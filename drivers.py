@@ -0,0 +1,417 @@
+"""
+Водители: парк машин, который ездит внутри полигона и разбирает активные заказы.
+
+Каждый водитель находится в одном из состояний:
+ - IDLE      — свободен, катается между случайными точками полигона;
+ - PENDING   — выбрал заказ и ждёт ответа API;
+ - TO_PICKUP — едет к точке отправления заказа;
+ - ON_TRIP   — везёт пассажира в точку назначения (после неё снова свободен).
+
+Свободные водители лежат в пространственном индексе GridIndex (равномерная сетка).
+Индекс обновляется по мере движения: ключи меняются только у водителей, перешедших
+в другую клетку. На каждом тике DriverFleet.step() двигает весь парк и пакетными
+запросами к индексу подбирает свободным заказам ближайших свободных водителей.
+Обычный заказ водитель принимает (sink.accept_order), за заказ-голосование
+(b_services ['5']) — голосует (sink.vote_order); вызовы API делает симулятор.
+Проголосовав, водитель сразу снова свободен, а голосование остаётся открытым до
+истечения (за каждое голосует один водитель, другим оно больше не предлагается).
+
+Координаты — те же, что у сэмплера симулятора (при distance_units 'm' / 'km' — метры
+в локальной проекции); скорость и радиус поиска задаются в distance_units.
+"""
+import math
+
+import numpy as np
+
+from sampling import make_sampler
+
+# Состояния водителей
+IDLE, PENDING, TO_PICKUP, ON_TRIP = range(4)
+DRIVER_STATES = ('idle', 'pending', 'to_pickup', 'on_trip')
+
+# Скорость по умолчанию (distance_units в час игрового времени) — около 30 км/ч
+DEFAULT_SPEED = {'degrees': 0.27, 'm': 30000.0, 'km': 30.0}
+
+# Сколько клеток сетки просматривать за один проход пакетного запроса (ограничение памяти)
+QUERY_CHUNK_CELLS = 1 << 20
+
+
+class GridIndex:
+    """
+    Равномерная сетка над точками с номерами 0..capacity-1.
+
+    Записи хранятся отсортированным массивом ключей cell * capacity + номер, так что
+    содержимое клетки — непрерывный отрезок, который находится двоичным поиском.
+    Вставка, удаление и перемещение — пакетные (np.insert / np.delete по позициям из
+    searchsorted), без пересортировки всего массива.
+    """
+
+    def __init__(self, bounds, cell_size, capacity):
+        """
+        :param bounds: (minx, miny, maxx, maxy) — область сетки (точки вне её попадают в крайние клетки).
+        :param cell_size: размер клетки.
+        :param capacity: число возможных точек (номера 0..capacity-1).
+        """
+        minx, miny, maxx, maxy = bounds
+        self.cell_size = cell_size
+        self.capacity = capacity
+        self._origin = np.array([minx, miny], dtype=float)
+        self._shape = (max(int(math.ceil((maxx - minx) / cell_size)), 1),
+                       max(int(math.ceil((maxy - miny) / cell_size)), 1))
+        # Дальше этого расстояния искать бессмысленно: диагональ сетки
+        self._diagonal = cell_size * math.hypot(*self._shape)
+        self.points = np.zeros((capacity, 2))
+        self._cell = np.full(capacity, -1, dtype=np.int64)  # Клетка точки (-1 — точки нет в индексе)
+        self._keys = np.zeros(0, dtype=np.int64)
+        self.cell_changes = 0  # Сколько раз точки переходили в другую клетку
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, item):
+        return self._cell[item] >= 0
+
+    def _cell_xy(self, points):
+        ij = np.floor((points - self._origin) / self.cell_size).astype(np.int64)
+        return np.clip(ij[:, 0], 0, self._shape[0] - 1), np.clip(ij[:, 1], 0, self._shape[1] - 1)
+
+    def _cells(self, points):
+        ix, iy = self._cell_xy(points)
+        return ix * self._shape[1] + iy
+
+    def _insert_keys(self, items, cells):
+        self._cell[items] = cells
+        keys = np.sort(cells * self.capacity + items)
+        self._keys = np.insert(self._keys, np.searchsorted(self._keys, keys), keys)
+
+    def _delete_keys(self, items):
+        keys = self._cell[items] * self.capacity + items
+        self._keys = np.delete(self._keys, np.searchsorted(self._keys, keys))
+        self._cell[items] = -1
+
+    def insert(self, items, points):
+        """
+        Добавляет точки items (номера, которых ещё нет в индексе) с координатами points.
+        """
+        items = np.asarray(items, dtype=np.int64)
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.points[items] = points
+        self._insert_keys(items, self._cells(points))
+
+    def remove(self, items):
+        """
+        Убирает точки items из индекса (отсутствующие пропускаются).
+        """
+        items = np.asarray(items, dtype=np.int64)
+        self._delete_keys(items[self._cell[items] >= 0])
+
+    def move(self, items, points):
+        """
+        Новые координаты точек items (уже лежащих в индексе). Ключи переписываются
+        только у точек, сменивших клетку.
+        """
+        items = np.asarray(items, dtype=np.int64)
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.points[items] = points
+        cells = self._cells(points)
+        changed = cells != self._cell[items]
+        if changed.any():
+            self._delete_keys(items[changed])
+            self._insert_keys(items[changed], cells[changed])
+            self.cell_changes += int(changed.sum())
+
+    def candidates(self, points, radius):
+        """
+        Все пары (номер точки запроса, точка индекса, расстояние) с расстоянием не больше radius.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        reach = min(int(math.ceil(radius / self.cell_size)), max(self._shape))
+        offsets = np.arange(-reach, reach + 1)
+        dx, dy = (offset.ravel() for offset in np.meshgrid(offsets, offsets, indexing='ij'))
+        qx, qy = self._cell_xy(points)
+        chunk = max(QUERY_CHUNK_CELLS // len(dx), 1)
+
+        queries, items = [], []
+        for begin in range(0, len(points), chunk):
+            cx = qx[begin:begin + chunk, None] + dx
+            cy = qy[begin:begin + chunk, None] + dy
+            valid = (cx >= 0) & (cx < self._shape[0]) & (cy >= 0) & (cy < self._shape[1])
+            query = np.broadcast_to(np.arange(begin, begin + len(cx))[:, None], cx.shape)[valid]
+            cells = cx[valid] * self._shape[1] + cy[valid]
+            # Отрезок ключей каждой клетки
+            starts = np.searchsorted(self._keys, cells * self.capacity)
+            counts = np.searchsorted(self._keys, (cells + 1) * self.capacity) - starts
+            nonempty = counts > 0
+            query, starts, counts = query[nonempty], starts[nonempty], counts[nonempty]
+            # Позиции всех ключей найденных отрезков одним массивом
+            positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            queries.append(np.repeat(query, counts))
+            items.append(self._keys[positions] % self.capacity)
+
+        query = np.concatenate(queries) if queries else np.zeros(0, dtype=np.int64)
+        item = np.concatenate(items) if items else np.zeros(0, dtype=np.int64)
+        delta = self.points[item] - points[query]
+        distance = np.hypot(delta[:, 0], delta[:, 1])
+        close = distance <= radius
+        return query[close], item[close], distance[close]
+
+    def nearest(self, points, max_distance=math.inf):
+        """
+        Ближайшая точка индекса для каждой точки запроса: (номера, расстояния);
+        если в пределах max_distance никого нет — номер -1 и расстояние inf.
+
+        Поиск идёт расширяющимися квадратами клеток: радиус удваивается только для
+        запросов, рядом с которыми никого не нашлось.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        found_items = np.full(len(points), -1, dtype=np.int64)
+        found_distance = np.full(len(points), math.inf)
+        pending = np.arange(len(points))
+        radius = self.cell_size
+        while len(pending) and len(self):
+            radius = min(radius, max_distance)
+            query, item, distance = self.candidates(points[pending], radius)
+            if len(query):
+                # Ближайший кандидат каждого запроса — первый после сортировки по (запрос, расстояние)
+                order = np.lexsort((distance, query))
+                query, item, distance = query[order], item[order], distance[order]
+                first = np.ones(len(query), dtype=bool)
+                first[1:] = query[1:] != query[:-1]
+                found_items[pending[query[first]]] = item[first]
+                found_distance[pending[query[first]]] = distance[first]
+            pending = pending[found_items[pending] < 0]
+            if radius >= max_distance or radius >= self._diagonal:
+                break
+            radius *= 2
+        return found_items, found_distance
+
+
+class DriverFleet:
+    """
+    Парк водителей симулятора: движение, индекс свободных водителей и подбор заказов.
+    """
+
+    def __init__(self, simulator, count=100, speed=None, search_radius=None, tick_seconds=10.0,
+                 cell_size=None, driver_ids=None, seed=None):
+        """
+        :param simulator: TaxiOrderSimulator, заказы которого разбирает парк.
+        :param count: число водителей.
+        :param speed: скорость (distance_units в час игрового времени); по умолчанию около 30 км/ч.
+        :param search_radius: насколько далеко (в distance_units) водитель готов ехать за заказом;
+                              None — без ограничения.
+        :param tick_seconds: шаг (игровые секунды), с которым парк обновляется в
+                             дискретно-событийном режиме (см. engine.DiscreteEventEngine).
+        :param cell_size: размер клетки индекса (в distance_units); по умолчанию — около
+                          двух водителей на клетку полигона.
+        :param driver_ids: id водителей в API (main.DriversList после sync()); без сети по умолчанию
+                           0..count-1 (как у DriversList.make_local), а для сетевого приёмника обязательны.
+        :param seed: зерно генератора точек; по умолчанию берётся из генератора симулятора.
+        """
+        self.simulator = simulator
+        self.count = count
+        self.tick_seconds = tick_seconds
+        if driver_ids is None and simulator.sink.remote:
+            raise ValueError("Для сетевого приёмника нужны driver_ids — id водителей, "
+                             "зарегистрированных в API (см. main.DriversList)")
+        self.driver_ids = list(driver_ids) if driver_ids is not None else list(range(count))
+        if len(self.driver_ids) != count:
+            raise ValueError(f"driver_ids: ожидалось {count} id, получено {len(self.driver_ids)}")
+
+        scale = simulator._distance_scale
+        speed = speed if speed is not None else DEFAULT_SPEED[simulator.distance_units]
+        self._speed = speed * scale / 3600  # Единиц сэмплера в игровую секунду
+        self._search_radius = search_radius * scale if search_radius is not None else math.inf
+
+        polygon = simulator.polygon
+        if simulator.projection is not None:
+            polygon = simulator.projection.forward_geometry(polygon)
+        rng = np.random.default_rng(seed if seed is not None else simulator.random.getrandbits(64))
+        # Свой сэмплер: сэмплером симулятора пользуется поток планировщика
+        self.sampler = make_sampler(simulator.sampling_method, polygon, rng=rng)
+        if cell_size is None:
+            cell_size = math.sqrt(2 * polygon.area / max(count, 1))
+        else:
+            cell_size *= scale
+
+        self.positions = self.sampler.sample_points(count)
+        self.targets = self.sampler.sample_points(count)
+        self.state = np.full(count, IDLE, dtype=np.int8)
+        self.pickup = np.zeros((count, 2))
+        self.dropoff = np.zeros((count, 2))
+        self.order_ids = np.full(count, -1, dtype=np.int64)  # Заказ водителя (-1 — нет)
+        self.index = GridIndex(polygon.bounds, cell_size, count)
+        self.index.insert(np.arange(count), self.positions)
+
+        self._last_time = None  # Игровое время последнего шага
+        self._claimed = set()  # Заказы, по которым ждём ответа API
+        self._voted = set()  # Голосования, за которые уже проголосовали (пока они активны)
+        self._orders_version = None
+        self._orders = None  # (id, откуда, куда) активных заказов в координатах сэмплера
+        self.matched = 0
+        self.votes = 0
+        self.trips_completed = 0
+
+    def next_time(self):
+        """
+        Игровое время (сек от старта) следующего шага в дискретно-событийном режиме.
+        """
+        return 0.0 if self._last_time is None else self._last_time + self.tick_seconds
+
+    def step(self, game_time):
+        """
+        Двигает парк к игровому времени game_time и подбирает свободным заказам водителей.
+        Возвращает список пар (номер водителя, id заказа); водители этих пар ждут ответа
+        API, и симулятор сообщает результат через confirm(), voted() или release().
+        """
+        dt = 0.0 if self._last_time is None else game_time - self._last_time
+        self._last_time = max(game_time, self._last_time or 0.0)
+        if dt > 0:
+            self._move(dt)
+        return self._match()
+
+    def _move(self, dt):
+        delta = self.targets - self.positions
+        distance = np.hypot(delta[:, 0], delta[:, 1])
+        # Доля оставшегося пути, которую водитель проезжает за dt (1 — доехал до цели)
+        fraction = np.divide(self._speed * dt, distance, out=np.ones_like(distance), where=distance > self._speed * dt)
+        fraction[self.state == PENDING] = 0.0
+        self.positions += delta * fraction[:, None]
+        arrived = np.flatnonzero(fraction == 1.0)
+        self.positions[arrived] = self.targets[arrived]
+
+        state = self.state[arrived]
+        picked_up, dropped_off, wandered = arrived[state == TO_PICKUP], arrived[state == ON_TRIP], arrived[state == IDLE]
+
+        idle = np.flatnonzero(self.state == IDLE)
+        self.index.move(idle, self.positions[idle])
+        self.state[picked_up] = ON_TRIP
+        self.targets[picked_up] = self.dropoff[picked_up]
+        if len(dropped_off):
+            self.state[dropped_off] = IDLE
+            self.order_ids[dropped_off] = -1
+            self.trips_completed += len(dropped_off)
+            self.index.insert(dropped_off, self.positions[dropped_off])
+        free = np.concatenate((wandered, dropped_off))
+        if len(free):
+            self.targets[free] = self.sampler.sample_points(len(free))
+
+    def _orders_at(self, slots):
+        store = self.simulator.orders
+        return (store.ids[slots].copy(),
+                self.simulator._from_order_coords(store.origin[slots]),
+                self.simulator._from_order_coords(store.destination[slots]))
+
+    def _open_orders(self):
+        """
+        Активные заказы в координатах сэмплера. Обновляются по дельте хранилища
+        (OrderStore.changes_since): пересчитываются координаты только новых заказов.
+        """
+        store = self.simulator.orders
+        if self._orders_version == store.version:
+            return self._orders
+        changes = store.changes_since(self._orders_version) if self._orders_version is not None else None
+        if changes is None:
+            self._orders = self._orders_at(store.active_slots())
+            self._voted.intersection_update(self._orders[0].tolist())
+        else:
+            _, added, removed = changes
+            ids, origins, destinations = self._orders
+            if len(removed):
+                self._voted.difference_update(removed.tolist())
+                keep = ~np.isin(ids, removed)
+                ids, origins, destinations = ids[keep], origins[keep], destinations[keep]
+            if len(added):
+                new_ids, new_origins, new_destinations = self._orders_at([store.slot_of(i) for i in added.tolist()])
+                ids = np.concatenate((ids, new_ids))
+                origins = np.concatenate((origins, new_origins))
+                destinations = np.concatenate((destinations, new_destinations))
+            self._orders = (ids, origins, destinations)
+        self._orders_version = store.version
+        return self._orders
+
+    def _match(self):
+        ids, origins, destinations = self._open_orders()
+        pending = np.arange(len(ids))
+        taken = self._claimed | self._voted
+        if taken:
+            pending = pending[~np.isin(ids, np.fromiter(taken, dtype=np.int64))]
+
+        matches = []
+        while len(pending) and len(self.index):
+            drivers, distance = self.index.nearest(origins[pending], self._search_radius)
+            found = drivers >= 0
+            pending, drivers, distance = pending[found], drivers[found], distance[found]
+            if not len(pending):
+                break
+            # На одного водителя претендуют несколько заказов — он достаётся ближайшему,
+            # остальные заказы ищут следующего свободного на новом проходе
+            order = np.lexsort((distance, drivers))
+            won = np.zeros(len(pending), dtype=bool)
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = drivers[order][1:] != drivers[order][:-1]
+            won[order[first]] = True
+
+            winners, orders = drivers[won], pending[won]
+            self.index.remove(winners)
+            self.state[winners] = PENDING
+            self.pickup[winners] = origins[orders]
+            self.dropoff[winners] = destinations[orders]
+            self.order_ids[winners] = ids[orders]
+            self._claimed.update(ids[orders].tolist())
+            matches.extend(zip(winners.tolist(), ids[orders].tolist()))
+            pending = pending[~won]
+        return matches
+
+    def confirm(self, driver):
+        """
+        API приняло действие водителя: он едет к точке отправления заказа.
+        """
+        self._claimed.discard(int(self.order_ids[driver]))
+        self.state[driver] = TO_PICKUP
+        self.targets[driver] = self.pickup[driver]
+        self.matched += 1
+
+    def voted(self, driver):
+        """
+        API приняло голос водителя: голосование остаётся активным, но другим водителям
+        больше не предлагается; водитель снова свободен.
+        """
+        self._voted.add(int(self.order_ids[driver]))
+        self.votes += 1
+        self.release(driver)
+
+    def release(self, driver):
+        """
+        Действие водителя не прошло (ошибка API или заказ уже завершён): водитель снова свободен.
+        """
+        self._claimed.discard(int(self.order_ids[driver]))
+        self.order_ids[driver] = -1
+        self.state[driver] = IDLE
+        self.index.insert([driver], self.positions[driver])
+
+    def locations(self):
+        """
+        Координаты водителей (lat, lon) массивом (n, 2).
+        """
+        if self.simulator.projection is not None:
+            return self.simulator.projection.inverse_points(self.positions)
+        return self.positions.copy()
+
+    def stats(self):
+        counts = np.bincount(self.state, minlength=len(DRIVER_STATES))
+        stats = {name: int(counts[code]) for code, name in enumerate(DRIVER_STATES)}
+        stats.update(matched=self.matched, votes=self.votes, trips_completed=self.trips_completed,
+                     index_cell_changes=self.index.cell_changes)
+        return stats
+
+
+def make_driver_fleet(spec, simulator):
+    """
+    DriverFleet по описанию: число водителей или словарь {'count': ..., <параметры DriverFleet>};
+    None — без водителей.
+    """
+    if spec is None:
+        return None
+    if isinstance(spec, int):
+        spec = {'count': spec}
+    return DriverFleet(simulator, **spec)
@@ -0,0 +1,145 @@
+"""
+Дискретно-событийный (headless) режим симуляции.
+
+Вместо ожидания реального времени движок переводит виртуальные часы симулятора
+сразу к следующему событию (генерация заказа, истечение активного заказа или
+шаг парка водителей) и вызывает update(). Параметры симуляции — те же, что у TaxiOrderSimulator.
+"""
+import math
+import time
+
+
+class VirtualClock:
+    """
+    Виртуальные "реальные" часы: стоят на месте, пока их не переведут.
+    Передаётся в TaxiOrderSimulator(clock=...) вместо time.time.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance_to(self, t):
+        self.now = max(self.now, t)
+
+
+class DiscreteEventEngine:
+    """
+    Прогоняет TaxiOrderSimulator по событиям так быстро, как позволяет процессор.
+
+    Очередь событий — это расписание генерации (next_generation_time_regular/_voting),
+    куча истечения активных заказов самого симулятора и шаги парка водителей
+    (drivers.DriverFleet.next_time, раз в tick_seconds игрового времени); движок берёт из них ближайшее
+    событие, переводит часы и вызывает simulator.update(), который обрабатывает всё,
+    что к этому моменту наступило.
+    """
+
+    def __init__(self, simulator):
+        """
+        :param simulator: TaxiOrderSimulator, созданный с clock=VirtualClock()
+                          (если передан другой clock, он будет заменён).
+        """
+        self.simulator = simulator
+        if not isinstance(simulator.clock, VirtualClock):
+            simulator.clock = VirtualClock()
+        self.clock = simulator.clock
+        self.events_processed = 0
+
+    def next_event_time(self):
+        """
+        Игровое время (в секундах от старта) ближайшего события или inf, если событий нет.
+        """
+        sim = self.simulator
+        candidates = [sim.next_generation_time_regular, sim.next_generation_time_voting]
+        if sim._expiry_heap:
+            candidates.append(sim._expiry_heap[0][0] - sim._start_ts)
+        if sim.drivers is not None:
+            candidates.append(sim.drivers.next_time())
+        return min(candidates)
+
+    def _advance_game_time(self, game_seconds):
+        """
+        Переводит часы так, чтобы игровое время стало не меньше game_seconds.
+        """
+        sim = self.simulator
+        self.clock.advance_to(sim.real_start_time + game_seconds / sim.time_compression)
+        # Защита от ошибок округления при делении/умножении на time_compression
+        while sim._get_game_time_since_start() < game_seconds:
+            self.clock.now = math.nextafter(self.clock.now, math.inf)
+
+    def run(self, until=None):
+        """
+        Прогоняет симуляцию до игрового времени until (в секундах от старта;
+        по умолчанию — simulation_hours). Возвращает статистику прогона.
+        """
+        sim = self.simulator
+        if until is None:
+            until = sim.simulation_hours * 3600
+        if sim.real_start_time is None:
+            sim.start()
+
+        started = time.perf_counter()
+        while True:
+            t = self.next_event_time()
+            if t > until:
+                break
+            self._advance_game_time(t)
+            sim.update()
+            self.events_processed += 1
+
+        # Доводим часы до конца прогона, чтобы обработать всё, что истекло к этому моменту
+        if not math.isinf(until):
+            self._advance_game_time(until)
+            sim.update()
+
+        return {
+            'game_seconds': sim._get_game_time_since_start(),
+            'events': self.events_processed,
+            'active_orders': len(sim.orders),
+            'wall_seconds': time.perf_counter() - started,
+        }
+
+
+if __name__ == '__main__':
+    # Пример: сутки заказов в JSONL-файл без обращения к API
+    from main import TaxiOrderSimulator, UsersList
+    from sinks import JsonlOrderSink
+
+    polygon_coords = [
+        (30.42854544631636, -9.611663818359375),
+        (30.45459295698008, -9.53819274902344),
+        (30.420256142845158, -9.545745849609377),
+        (30.410189613309132, -9.526519775390627),
+        (30.385314913418373, -9.482574462890627),
+        (30.35806392728733, -9.477081298828127),
+        (30.34325042354528, -9.472961425781252),
+        (30.329620019722665, -9.481201171875002),
+        (30.315987718557867, -9.50798034667969),
+        (30.329620019722665, -9.539566040039064),
+        (30.347990988731844, -9.567718505859377),
+        (30.378206692827195, -9.602050781250002),
+        (30.42854544631636, -9.611663818359375)
+    ]
+
+    users = UsersList(user_count=1000)
+    users.make_local()
+
+    sink = JsonlOrderSink("orders.jsonl")
+    simulator = TaxiOrderSimulator(
+        polygon_coords=polygon_coords,
+        users_list=users,
+        regular_frequency=500,
+        voting_frequency=200,
+        distance_min=1,
+        distance_max=5,
+        distance_units='km',
+        simulation_hours=24,
+        time_shift_minutes=3 * 60,
+        sink=sink,
+        clock=VirtualClock()
+    )
+    stats = DiscreteEventEngine(simulator).run()
+    sink.close()
+    print(stats)
@@ -0,0 +1,151 @@
+"""
+Конвейер отмены просроченных заказов.
+
+Просроченные заказы копятся в очереди и отменяются параллельно (не больше max_in_flight
+запросов одновременно) в пуле потоков. update() только ставит заказы в очередь и забирает
+готовые результаты, поэтому тик не ждёт сети. Неудачные отмены повторяются позже
+с экспоненциальной задержкой.
+"""
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiryPipeline:
+    """
+    Очередь отмен с ограничением числа одновременных запросов и повторами.
+
+    При max_in_flight=0 отмены выполняются сразу в вызывающем потоке (как раньше) —
+    так делается для приёмников без сети, чтобы порядок событий оставался детерминированным.
+    """
+
+    def __init__(self, sink, max_in_flight=8, reason="Order expired", retry_delay=1.0,
+                 max_retry_delay=60.0, max_attempts=10, clock=time.monotonic):
+        """
+        :param sink: приёмник заказов (sink.cancel_order(order, reason)).
+        :param max_in_flight: сколько отмен может выполняться одновременно (0 — синхронно).
+        :param reason: причина отмены для API.
+        :param retry_delay: задержка перед первым повтором (сек), дальше удваивается.
+        :param max_retry_delay: наибольшая задержка между повторами (сек).
+        :param max_attempts: после стольких неудач заказ попадает в abandoned.
+        :param clock: источник реального времени для повторов.
+        """
+        self.sink = sink
+        self.max_in_flight = max_in_flight
+        self.reason = reason
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self._executor = (ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="cancel")
+                          if max_in_flight > 0 else None)
+        self._queue = deque()  # (order, номер попытки)
+        self._retries = []  # Куча (время повтора, порядковый номер, order, номер попытки)
+        self._retry_seq = itertools.count()
+        self._in_flight = {}  # future -> (order, номер попытки)
+
+        self.cancelled = 0
+        self.failures = 0  # Неудачных попыток (включая те, что потом удались)
+        self.abandoned = []  # Заказы, которые так и не удалось отменить
+
+    def __len__(self):
+        """
+        Сколько отмен ещё не завершено (в очереди, в ожидании повтора и в работе).
+        """
+        return len(self._queue) + len(self._retries) + len(self._in_flight)
+
+    def submit(self, orders):
+        """
+        Ставит просроченные заказы в очередь на отмену.
+        """
+        self._queue.extend((order, 0) for order in orders)
+
+    def _failed(self, order, attempt, error):
+        self.failures += 1
+        attempt += 1
+        if attempt >= self.max_attempts:
+            self.abandoned.append(order)
+            logger.error("API->Order %s cancellation abandoned after %d attempts: %r", order['id'], attempt, error)
+            return
+        delay = min(self.retry_delay * 2 ** (attempt - 1), self.max_retry_delay)
+        heapq.heappush(self._retries, (self.clock() + delay, next(self._retry_seq), order, attempt))
+
+    def retry(self, order, error):
+        """
+        Ставит заказ, отмена которого не удалась в другом месте, в очередь повторов.
+        """
+        self._failed(order, 0, error)
+
+    def _collect(self):
+        done = [future for future in self._in_flight if future.done()]
+        for future in done:
+            order, attempt = self._in_flight.pop(future)
+            error = future.exception()
+            if error is None:
+                self.cancelled += 1
+            else:
+                self._failed(order, attempt, error)
+
+    def _cancel(self, order, attempt):
+        try:
+            self.sink.cancel_order(order, self.reason)
+            self.cancelled += 1
+        except Exception as e:
+            self._failed(order, attempt, e)
+
+    def pump(self):
+        """
+        Забирает результаты завершённых отмен, возвращает в очередь подошедшие повторы
+        и запускает новые отмены в пределах max_in_flight. Не блокирует (кроме режима max_in_flight=0).
+        """
+        self._collect()
+        now = self.clock()
+        while self._retries and self._retries[0][0] <= now:
+            _, _, order, attempt = heapq.heappop(self._retries)
+            self._queue.append((order, attempt))
+
+        if self._executor is None:
+            while self._queue:
+                self._cancel(*self._queue.popleft())
+            return
+        while self._queue and len(self._in_flight) < self.max_in_flight:
+            order, attempt = self._queue.popleft()
+            future = self._executor.submit(self.sink.cancel_order, order, self.reason)
+            self._in_flight[future] = (order, attempt)
+
+    def drain(self, timeout=None):
+        """
+        Ждёт завершения всех отмен (включая повторы) не дольше timeout секунд.
+        Возвращает True, если очередь опустела.
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        while True:
+            self.pump()
+            if not len(self):
+                return True
+            now = self.clock()
+            if deadline is not None and now >= deadline:
+                return False
+            # Ждём первой завершённой отмены или ближайшего повтора
+            wake = self._retries[0][0] if self._retries else None
+            if deadline is not None:
+                wake = deadline if wake is None else min(wake, deadline)
+            pause = None if wake is None else max(wake - now, 0.0)
+            if self._in_flight:
+                wait(list(self._in_flight), timeout=pause, return_when=FIRST_COMPLETED)
+            elif pause:
+                time.sleep(pause)
+
+    def close(self, timeout=None):
+        """
+        Дожидается отмен (не дольше timeout) и останавливает пул потоков.
+        """
+        drained = self.drain(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=drained)
+        return drained
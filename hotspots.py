@@ -0,0 +1,355 @@
+"""
+Пространственная модель спроса: заказы тяготеют к горячим точкам (вокзалы, ТЦ, аэропорт).
+
+Полигон один раз растеризуется в сетку, обрезанную по полигону; каждой клетке назначается
+вес (гауссовы горячие точки и/или тепловая карта из файла), и по весам строится таблица
+псевдонимов (alias table) — клетка выбирается за O(1). Внутри клетки точка берётся
+равномерно по её части, лежащей в полигоне.
+"""
+import math
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+from demand import DemandProfile
+from sampling import (TriangulatedSampler, clip_convex_by_triangles, fan_padded, orient_ccw,
+                      points_in_triangles, triangle_areas, triangulate_polygon)
+
+
+def build_alias_table(weights):
+    """
+    Таблица псевдонимов (метод Воуза) для выбора индекса пропорционально весам.
+    Возвращает (prob, alias): индекс i выбирается с вероятностью prob[i], иначе — alias[i].
+    """
+    weights = np.asarray(weights, dtype=float)
+    total = weights.sum()
+    if len(weights) == 0 or not total > 0:
+        raise ValueError("Сумма весов должна быть положительной")
+    scaled = (weights * len(weights) / total).tolist()
+    prob = np.ones(len(weights))
+    alias = np.arange(len(weights))
+    small = [i for i, w in enumerate(scaled) if w < 1]
+    large = [i for i, w in enumerate(scaled) if w >= 1]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] += scaled[s] - 1
+        (small if scaled[l] < 1 else large).append(l)
+    # Оставшиеся индексы (в том числе из-за погрешности округления) выбираются с вероятностью 1
+    return prob, alias
+
+
+def alias_sample(prob, alias, n, rng):
+    """
+    n индексов по таблице псевдонимов (векторно).
+    """
+    idx = rng.integers(0, len(prob), n)
+    return np.where(rng.random(n) < prob[idx], idx, alias[idx])
+
+
+def load_heatmap(path):
+    """
+    Загружает тепловую карту — массив (n, 3) точек (lat, lon, вес).
+
+    Поддерживаются .npy и CSV со столбцами lat,lon[,weight] (строка заголовка допускается).
+    Без столбца веса каждая точка весит 1.
+    """
+    if path.endswith('.npy'):
+        data = np.load(path)
+    else:
+        data = np.genfromtxt(path, delimiter=',')
+    data = np.atleast_2d(np.asarray(data, dtype=float))
+    data = data[~np.isnan(data).any(axis=1)]
+    if data.shape[1] == 2:
+        data = np.column_stack((data, np.ones(len(data))))
+    if data.shape[1] != 3:
+        raise ValueError(f"Тепловая карта {path!r}: ожидаются столбцы lat,lon[,weight]")
+    return data
+
+
+class HotspotSampler:
+    """
+    Сэмплер с неравномерной плотностью заказов по клеткам сетки.
+
+    Плотность в клетке: background + сумма weight * exp(-d² / (2 sigma²)) по горячим точкам,
+    плюс (если задана) тепловая карта — её точки раскладываются по клеткам и нормируются так,
+    что вся карта весит столько же, сколько равномерный фон с background=1.
+    Точки назначения по умолчанию распределены так же, как точки отправления; матрица
+    od_matrix задаёт вес перехода из клетки в клетку (строки — отправление, столбцы — назначение).
+
+    У горячей точки может быть профиль по времени суток (как demand.DemandProfile): её вес
+    умножается на значение профиля в текущий момент (set_time). Таблицы псевдонимов
+    перестраиваются только на границах участков профилей.
+
+    Диапазон расстояний [dmin, dmax] выдерживается отбраковкой (max_rounds попыток на точку);
+    для оставшихся точек назначение берётся равномерно из кольца расстояний (TriangulatedSampler).
+    """
+
+    def __init__(self, polygon, hotspots=(), heat_points=None, background=1.0, grid_size=64,
+                 od_matrix=None, rng=None, max_rounds=32):
+        """
+        :param polygon: shapely Polygon/MultiPolygon в координатах сэмплера.
+        :param hotspots: список словарей {'center': (x, y), 'sigma': радиус, 'weight': пиковая плотность}
+                         в координатах сэмплера; необязательный ключ 'profile' — множитель веса
+                         по времени суток (то, что понимает DemandProfile.from_spec).
+        :param heat_points: массив (n, 3) точек тепловой карты (x, y, вес) в координатах сэмплера.
+        :param background: равномерная плотность фона (0 — только горячие точки и тепловая карта).
+        :param grid_size: число клеток сетки по длинной стороне полигона.
+        :param od_matrix: матрица (k, k) весов переходов между клетками (порядок — cell_bounds).
+        :param rng: numpy.random.Generator (по умолчанию — новый генератор).
+        :param max_rounds: сколько раз перевыбирать точку назначения вне диапазона расстояний.
+        """
+        self.polygon = polygon
+        shapely.prepare(self.polygon)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.max_rounds = max_rounds
+        self._uniform = None
+        self.fallbacks = 0  # Сколько точек назначения взято из равномерного кольца
+        self.dest_rejections = 0  # Кандидатов в точки назначения вне диапазона расстояний
+        self.origin_retries = 0  # Перевыбранных точек отправления
+
+        self._build_grid(grid_size)
+        # Горячие точки с профилями: (вес по клеткам при множителе 1, профиль)
+        self._profiled = []
+        self._profile_rates = None
+        self._base_weights = self._cell_weights(hotspots, heat_points, background)
+        # До первого set_time горячие точки с профилями берутся с множителем 1
+        self.weights = self._weights_at([1.0] * len(self._profiled))
+        self._od_matrix = None
+        self._od_tables = None
+        self._origin_table = build_alias_table(self.weights)
+        if od_matrix is not None:
+            self.set_od_matrix(od_matrix)
+
+    # ---------------------------------
+    #   Сетка
+    # ---------------------------------
+    def _build_grid(self, grid_size):
+        minx, miny, maxx, maxy = self.polygon.bounds
+        self.cell_size = max(maxx - minx, maxy - miny) / grid_size
+        self._origin = (minx, miny)
+        self._shape = (max(math.ceil((maxx - minx) / self.cell_size), 1),
+                       max(math.ceil((maxy - miny) / self.cell_size), 1))
+        ix, iy = np.meshgrid(np.arange(self._shape[0]), np.arange(self._shape[1]), indexing='ij')
+        ix, iy = ix.ravel(), iy.ravel()
+        x0, y0 = minx + ix * self.cell_size, miny + iy * self.cell_size
+        x1, y1 = x0 + self.cell_size, y0 + self.cell_size
+        # Вершины клеток против часовой стрелки
+        corners = np.stack((np.column_stack((x0, y0)), np.column_stack((x1, y0)),
+                            np.column_stack((x1, y1)), np.column_stack((x0, y1))), axis=1)
+        boxes = shapely.box(x0, y0, x1, y1)
+        inside = np.nonzero(shapely.contains(self.polygon, boxes))[0]
+        border = np.nonzero(shapely.intersects(self.polygon, boxes) & ~shapely.contains(self.polygon, boxes))[0]
+
+        # Клетки внутри полигона — два треугольника, пограничные режутся треугольниками полигона
+        inner_triangles, inner_owner = fan_padded(corners[inside], np.full(len(inside), 4))
+        polygon_triangles = orient_ccw(triangulate_polygon(self.polygon))
+        tree = STRtree(shapely.polygons(np.concatenate((polygon_triangles, polygon_triangles[:, :1]), axis=1)))
+        cell_idx, triangle_idx = tree.query(boxes[border])
+        pieces, counts, rows = clip_convex_by_triangles(
+            corners[border][cell_idx], np.full(len(cell_idx), 4), polygon_triangles[triangle_idx]
+        )
+        border_triangles, border_owner = fan_padded(pieces, counts)
+
+        triangles = np.concatenate((inner_triangles, border_triangles))
+        grid_owner = np.concatenate((inside[inner_owner], border[cell_idx][rows][border_owner]))
+        areas = triangle_areas(triangles)
+        triangles, grid_owner, areas = triangles[areas > 0], grid_owner[areas > 0], areas[areas > 0]
+
+        # Оставляем только клетки с ненулевой площадью внутри полигона, нумеруем их подряд
+        grid_cells, owner = np.unique(grid_owner, return_inverse=True)
+        order = np.argsort(owner, kind='stable')
+        self.triangles, self._triangle_cell, areas = triangles[order], owner[order], areas[order]
+        self._cumulative = np.cumsum(areas)
+        self.cell_areas = np.bincount(self._triangle_cell, weights=areas)
+        self._cell_offsets = np.cumsum(self.cell_areas) - self.cell_areas
+        tri_counts = np.bincount(self._triangle_cell)
+        self._first_triangle = np.cumsum(tri_counts) - tri_counts
+        self._last_triangle = self._first_triangle + tri_counts - 1
+
+        self.cell_bounds = np.column_stack((x0, y0, x1, y1))[grid_cells]
+        # Центр масс части клетки внутри полигона
+        centroids = self.triangles.mean(axis=1)
+        self.cell_centers = np.column_stack([
+            np.bincount(self._triangle_cell, weights=centroids[:, k] * areas) / self.cell_areas for k in range(2)
+        ])
+        # Номер клетки по индексу в полной сетке (-1 — вне полигона)
+        self._grid_lookup = np.full(self._shape[0] * self._shape[1], -1)
+        self._grid_lookup[grid_cells] = np.arange(len(grid_cells))
+
+    def stats(self):
+        """
+        Счётчики отбраковки и перевыбора точек (для метрик).
+        """
+        return {
+            'dest_rejections': self.dest_rejections,
+            'fallbacks': self.fallbacks,
+            'origin_retries': self.origin_retries,
+        }
+
+    def cells_of(self, points):
+        """
+        Номера клеток для массива (n, 2) точек (-1 — точка вне сетки полигона).
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        ix = np.floor((points[:, 0] - self._origin[0]) / self.cell_size).astype(np.int64)
+        iy = np.floor((points[:, 1] - self._origin[1]) / self.cell_size).astype(np.int64)
+        valid = (ix >= 0) & (ix < self._shape[0]) & (iy >= 0) & (iy < self._shape[1])
+        cells = np.full(len(points), -1)
+        cells[valid] = self._grid_lookup[ix[valid] * self._shape[1] + iy[valid]]
+        return cells
+
+    def _cell_weights(self, hotspots, heat_points, background):
+        density = np.full(len(self.cell_areas), float(background))
+        for hotspot in hotspots:
+            d2 = ((self.cell_centers - np.asarray(hotspot['center'], dtype=float)) ** 2).sum(axis=1)
+            kernel = hotspot.get('weight', 1.0) * np.exp(-d2 / (2 * hotspot['sigma'] ** 2))
+            if hotspot.get('profile') is not None:
+                self._profiled.append((kernel * self.cell_areas, DemandProfile.from_spec(hotspot['profile'])))
+            else:
+                density += kernel
+        weights = density * self.cell_areas
+
+        if heat_points is not None and len(heat_points):
+            heat_points = np.asarray(heat_points, dtype=float)
+            cells = self.cells_of(heat_points[:, :2])
+            inside = cells >= 0
+            heat = np.bincount(cells[inside], weights=heat_points[inside, 2], minlength=len(weights))
+            if heat.sum() > 0:
+                weights += heat * self.cell_areas.sum() / heat.sum()
+        return weights
+
+    def set_od_matrix(self, od_matrix):
+        """
+        Задаёт матрицу (k, k) весов переходов между клетками (k = len(cell_bounds)).
+        Для каждой строки строится своя таблица псевдонимов, поэтому память — O(k²):
+        для матриц лучше брать крупную сетку (небольшой grid_size).
+        """
+        od_matrix = np.asarray(od_matrix, dtype=float)
+        k = len(self.cell_areas)
+        if od_matrix.shape != (k, k):
+            raise ValueError(f"Матрица переходов должна быть размера ({k}, {k})")
+        self._od_matrix = od_matrix
+        # Строки без переходов используют распределение точек отправления
+        tables = [build_alias_table(row) if row.sum() > 0 else self._origin_table for row in od_matrix]
+        self._od_tables = (np.stack([prob for prob, _ in tables]), np.stack([alias for _, alias in tables]))
+
+    def _rates_at(self, seconds_of_day):
+        return tuple(profile.rate_at(seconds_of_day) for _, profile in self._profiled)
+
+    def _weights_at(self, rates):
+        weights = self._base_weights.copy()
+        for rate, (kernel, _) in zip(rates, self._profiled):
+            weights += rate * kernel
+        return weights
+
+    def set_time(self, seconds_of_day):
+        """
+        Переводит веса горячих точек с профилями на момент времени суток (секунды от полуночи).
+        Возвращает True, если распределение точек изменилось. Если в этот момент все веса
+        нулевые, остаётся прежнее распределение.
+        """
+        if not self._profiled:
+            return False
+        rates = self._rates_at(seconds_of_day)
+        if rates == self._profile_rates:
+            return False
+        self._profile_rates = rates
+        weights = self._weights_at(rates)
+        if not weights.sum() > 0:
+            return False
+        self.weights = weights
+        self._origin_table = build_alias_table(weights)
+        if self._od_matrix is not None:
+            # Строки без переходов ссылаются на таблицу точек отправления
+            self.set_od_matrix(self._od_matrix)
+        return True
+
+    # ---------------------------------
+    #   Генерация точек
+    # ---------------------------------
+    def points_in_cells(self, cells):
+        """
+        По одной равномерной точке в части каждой клетки, лежащей внутри полигона.
+        """
+        targets = self._cell_offsets[cells] + self.rng.random(len(cells)) * self.cell_areas[cells]
+        chosen = np.searchsorted(self._cumulative, targets, side='right')
+        chosen = np.clip(chosen, self._first_triangle[cells], self._last_triangle[cells])
+        return points_in_triangles(self.triangles[chosen], self.rng)
+
+    def sample_cells(self, n):
+        """
+        n клеток отправления пропорционально весам.
+        """
+        return alias_sample(*self._origin_table, n, self.rng)
+
+    def sample_points(self, n):
+        """
+        Возвращает массив (n, 2) точек отправления по весам клеток.
+        """
+        return self.points_in_cells(self.sample_cells(n))
+
+    def _destination_cells(self, origin_cells):
+        if self._od_tables is None:
+            return self.sample_cells(len(origin_cells))
+        prob, alias = self._od_tables
+        rows = np.where(origin_cells >= 0, origin_cells, 0)
+        idx = self.rng.integers(0, prob.shape[1], len(rows))
+        cells = np.where(self.rng.random(len(rows)) < prob[rows, idx], idx, alias[rows, idx])
+        # Точки отправления вне сетки берут распределение точек отправления
+        return np.where(origin_cells >= 0, cells, self.sample_cells(len(rows)))
+
+    def _sample_band(self, origins, dmin, dmax):
+        """
+        Возвращает (destinations, ok) — точки назначения в диапазоне расстояний [dmin, dmax].
+        """
+        origin_cells = self.cells_of(origins)
+        destinations = np.full(origins.shape, np.nan)
+        pending = np.arange(len(origins))
+        for _ in range(self.max_rounds):
+            if not len(pending):
+                break
+            candidates = self.points_in_cells(self._destination_cells(origin_cells[pending]))
+            d = np.hypot(*(candidates - origins[pending]).T)
+            accepted = (d >= dmin) & (d <= dmax)
+            destinations[pending[accepted]] = candidates[accepted]
+            pending = pending[~accepted]
+            self.dest_rejections += len(pending)
+
+        ok = np.ones(len(origins), dtype=bool)
+        if len(pending):
+            # Редкие пары вне весового распределения — равномерно из кольца расстояний
+            if self._uniform is None:
+                self._uniform = TriangulatedSampler(self.polygon, rng=self.rng)
+            destinations[pending], ok[pending] = self._uniform._sample_annulus(origins[pending], dmin, dmax)
+            self.fallbacks += len(pending)
+        return destinations, ok
+
+    def sample_destinations(self, origins, dmin, dmax):
+        """
+        Для каждой точки отправления генерирует точку назначения на расстоянии [dmin, dmax].
+        """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+        destinations, ok = self._sample_band(origins, dmin, dmax)
+        if not ok.all():
+            raise ValueError("Для части точек отправления в полигоне нет точек на расстоянии [dmin, dmax]")
+        return destinations
+
+    def sample_pairs(self, n, dmin, dmax):
+        """
+        Возвращает (origins, destinations) — два массива (n, 2) пар точек для заказов.
+        """
+        origins = self.sample_points(n)
+        destinations, ok = self._sample_band(origins, dmin, dmax)
+        rounds = 0
+        while not ok.all():
+            if rounds >= self.max_rounds:
+                raise RuntimeError("Не удалось подобрать пары точек в заданном диапазоне расстояний")
+            retry = np.nonzero(~ok)[0]
+            self.origin_retries += len(retry)
+            origins[retry] = self.sample_points(len(retry))
+            destinations[retry], ok[retry] = self._sample_band(origins[retry], dmin, dmax)
+            rounds += 1
+        return origins, destinations
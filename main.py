@@ -1,41 +1,156 @@
+import asyncio
 import json
+import logging
+import os
 import random
+import sys
 import time
 import datetime
-from shapely.geometry import Point, Polygon
+import heapq
+import itertools
+from collections import deque
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from shapely.geometry import Polygon
+from shapely.geometry.base import BaseGeometry
 
 from api import *
+from projection import DISTANCE_UNITS, LocalProjection
+from sampling import make_sampler
+from orders import ORDER_NAMES, ORDER_TYPES, ActiveOrdersView, OrderStore
+from sinks import ApiOrderSink, RecordingSink
+from demand import FixedIntervalSchedule, PoissonSchedule
+from planning import OrderPlanner
+from ratecontrol import make_rate_controller
+from drivers import make_driver_fleet
+from hotspots import HotspotSampler, load_heatmap
+from expiry import ExpiryPipeline
+from metrics import LAG_BUCKETS, default_profiler, registry
+
+logger = logging.getLogger(__name__)
 
 
 class UsersList:
-    def __init__(self, user_count=5):
+    def __init__(self, user_count=5, cache_file=None):
         self.users_count = user_count
         """
         Создаёт список пользователей:
          [{'id': 0, 'name': 'Test_0', 'email': 'testUser_0@test.com'}, {'id': 1, 'name': 'Test_1', 'email': 'testUser_1@test.com'}, ...]
+
+        :param cache_file: путь к JSON-кэшу email -> пользователь; пользователи из кэша
+                           при повторном запуске не запрашиваются у API.
         """
         self.users = []
-    def sync(self):
-        api_users = []
+        self.cache_file = cache_file
+
+    @staticmethod
+    def _email(i):
+        return "testUser_" + str(i) + "@test.com"
+
+    @staticmethod
+    def _name(i):
+        return "Test" + str(i)
+
+    @staticmethod
+    def _register(email, name):
+        return RegisterClient(email, name)
+
+    def _sync_user(self, i):
+        """
+        Находит пользователя i в API (или регистрирует его) и возвращает auth_user.
+        """
+        email = self._email(i)
+        user_info = GetUserInfo(email)
+        if user_info["status"] == "success":
+            return user_info["auth_user"]
+        elif user_info["status"] == "error" and user_info["message"]["error"] == "user not found":
+            self._register(email, self._name(i))
+            return GetUserInfo(email)["auth_user"]
+        else:
+            raise Exception(json.dumps(user_info, indent=4, ensure_ascii=False))
+
+    def _load_cache(self):
+        if self.cache_file is None or not os.path.exists(self.cache_file):
+            return {}
+        with open(self.cache_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_cache(self, cache):
+        if self.cache_file is None:
+            return
+        tmp_path = self.cache_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_file)
+
+    def sync(self, workers=8, retries=3, progress_every=500):
+        """
+        Синхронизирует пользователей с API: поиск и регистрация идут параллельно
+        в пуле из workers потоков. Неудачные пользователи повторяются отдельными
+        проходами (до retries раз), не прерывая остальных; исключение выбрасывается
+        только если после всех повторов кто-то так и не синхронизировался.
+
+        :param workers: размер пула потоков.
+        :param retries: сколько дополнительных проходов делать для неудачных пользователей.
+        :param progress_every: как часто (в пользователях) печатать прогресс.
+        """
+        cache = self._load_cache()
+        users = {}
+        pending = []
         for i in range(0,self.users_count):
-            email = "testUser_" + str(i) + "@test.com"
-            user_info = GetUserInfo(email)
-            if user_info["status"] == "success":
-                api_users.append(user_info["auth_user"])
-            elif user_info["status"] == "error" and user_info["message"]["error"] == "user not found":
-                RegisterClient(email, "Test"+str(i))
-                api_users.append(GetUserInfo(email)["auth_user"])
+            cached = cache.get(self._email(i))
+            if cached is not None:
+                users[i] = cached
             else:
-                raise Exception(json.dumps(user_info, indent=4, ensure_ascii=False))
+                pending.append(i)
 
-        api_users = [{
-            "id": user["u_id"],
-            "name": user["u_name"],
-            "email": user["u_email"],
-        } for user in api_users]
-        self.users = api_users
-        print("API->Users synced")
+        errors = {}
+        done = 0
+        to_sync = len(pending)
+        for attempt in range(retries + 1):
+            if not pending:
+                break
+            errors = {}
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(self._sync_user, i): i for i in pending}
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        user = future.result()
+                    except Exception as e:
+                        errors[i] = e
+                        continue
+                    users[i] = {
+                        "id": user["u_id"],
+                        "name": user["u_name"],
+                        "email": user["u_email"],
+                    }
+                    done += 1
+                    if progress_every and done % progress_every == 0:
+                        logger.info("API->Users synced %d/%d", done, to_sync)
+            pending = sorted(errors)
+            if pending and attempt < retries:
+                logger.warning("API->Users sync: %d failed, retrying", len(pending))
 
+        self._save_cache({user["email"]: user for user in users.values()})
+        if errors:
+            raise Exception(f"API->Users sync failed for {len(errors)} users: " +
+                            "; ".join(f"{self._email(i)}: {e}" for i, e in sorted(errors.items())[:10]))
+
+        self.users = [users[i] for i in range(0,self.users_count)]
+        logger.info("API->Users synced")
+
+
+    def make_local(self):
+        """
+        Создаёт пользователей локально, без обращения к API (для офлайн-режимов):
+         [{'id': 0, 'name': 'Test0', 'email': 'testUser_0@test.com'}, ...]
+        """
+        self.users = [{
+            "id": i,
+            "name": self._name(i),
+            "email": self._email(i),
+        } for i in range(0,self.users_count)]
 
     def get_users(self):
         """Возвращает полный список пользователей."""
@@ -46,6 +161,27 @@ class UsersList:
         return [u['id'] for u in self.users]
 
 
+class DriversList(UsersList):
+    """
+    Водители в API (testDriver_<i>@test.com, регистрируются с ролью водителя через RegisterDriver):
+    их id передаются в drivers.DriverFleet (driver_ids), чтобы принимать заказы и голосовать
+    от имени настоящих водителей. sync(), кэш и make_local() — как у UsersList; кэш водителей
+    нужно держать в отдельном файле (cache_file перезаписывается целиком).
+    """
+
+    @staticmethod
+    def _email(i):
+        return "testDriver_" + str(i) + "@test.com"
+
+    @staticmethod
+    def _name(i):
+        return "Driver" + str(i)
+
+    @staticmethod
+    def _register(email, name):
+        return RegisterDriver(email, name)
+
+
 class TaxiOrderSimulator:
     def __init__(
             self,
@@ -59,29 +195,98 @@ class TaxiOrderSimulator:
             voting_lifetime_minutes_min=5,  # Минимальное время жизни для "голосования"
             voting_lifetime_minutes_max=15,  # Максимальное время жизни для "голосования"
             # --- Геометрические параметры ---
-            distance_min=0.01,  # Минимальное расстояние (в градусах)
-            distance_max=0.05,  # Максимальное расстояние (в градусах)
+            distance_min=0.01,  # Минимальное расстояние (в единицах distance_units)
+            distance_max=0.05,  # Максимальное расстояние (в единицах distance_units)
+            distance_units='degrees',  # 'degrees', 'm' или 'km'
             # --- Прочие параметры ---
             time_compression=1.0,  # Коэффициент сжатия времени
             simulation_hours=2,  # Длительность симуляции в часах (от 8:00)
-            time_shift_minutes = 0
+            time_shift_minutes = 0,
+            geometry_batch_size=256,  # Сколько пар точек (откуда, куда) генерировать за раз
+            sampling_method='triangulation',  # 'triangulation' (без отбраковки) или 'bbox' (bounding box + проверка)
+            sink=None,  # Куда отправлять заказы (по умолчанию — живой API)
+            clock=None,  # Источник реального времени (по умолчанию time.time)
+            regular_profile=None,  # Профиль спроса обычных заказов (заменяет regular_frequency)
+            voting_profile=None,  # Профиль спроса голосований (заменяет voting_frequency)
+            # --- Пространственная модель спроса ---
+            hotspots=None,  # Горячие точки: [{'center': (lat, lon), 'sigma': радиус, 'weight': плотность}, ...]
+            heatmap_file=None,  # Тепловая карта (CSV lat,lon[,weight] или .npy)
+            hotspot_background=1.0,  # Равномерная плотность фона
+            hotspot_grid_size=64,  # Число клеток сетки по длинной стороне полигона
+            od_matrix=None,  # Матрица переходов между клетками сетки (см. hotspots.HotspotSampler)
+            # --- Воспроизводимость ---
+            seed=None,  # Зерно генераторов случайных чисел симулятора
+            record_path=None,  # Куда записывать поток заказов (JSONL, см. replay.py)
+            cancel_concurrency=8,  # Сколько отмен просроченных заказов отправлять одновременно
+            metrics=None,  # Реестр метрик (по умолчанию metrics.registry)
+            profiler=None,  # Переключатель профилирования (по умолчанию metrics.default_profiler)
+            plan_lookahead=256,  # Сколько заказов готовить заранее в фоновом потоке (0 — без упреждения)
+            rate_control=None,  # Политика при перегрузке бэкенда (см. ratecontrol.py), по умолчанию 'none'
+            drivers=None  # Водители, разбирающие заказы (см. drivers.py): число или словарь параметров
     ):
         """
-        :param polygon_coords: список кортежей (lat, lon), не меньше 3 точек (многоугольник).
+        :param polygon_coords: список кортежей (lat, lon), не меньше 3 точек (многоугольник),
+                               либо готовый shapely Polygon/MultiPolygon (допускаются дыры).
         :param users_list: экземпляр класса UsersList (список пользователей).
         :param regular_frequency: частота появления обычных заказов (шт/час).
         :param voting_frequency: частота появления заказов-голосований (шт/час).
         :param regular_lifetime_minutes: время жизни обычного заказа (минуты).
         :param voting_lifetime_minutes_min: минимальное время жизни "голосования" (минуты).
         :param voting_lifetime_minutes_max: максимальное время жизни "голосования" (минуты).
-        :param distance_min: минимальное расстояние между точками отправления и назначения (в градусах).
-        :param distance_max: максимальное расстояние между точками отправления и назначения (в градусах).
+        :param distance_min: минимальное расстояние между точками отправления и назначения (в distance_units).
+        :param distance_max: максимальное расстояние между точками отправления и назначения (в distance_units).
+        :param distance_units: единицы расстояний — 'degrees' (как раньше), 'm' или 'km'.
         :param time_compression: коэффициент сжатия времени (1.0 — без изменений).
         :param simulation_hours: длительность симуляции в часах, начиная с 8:00.
+        :param geometry_batch_size: размер пачки заранее сгенерированных пар точек (откуда, куда).
+        :param sampling_method: метод генерации точек — 'triangulation' (триангуляция полигона,
+                                точное равномерное распределение, по умолчанию) или 'bbox'
+                                (bounding box + проверка).
+        :param sink: приёмник заказов (см. sinks.py); по умолчанию ApiOrderSink — живой API.
+        :param clock: функция без аргументов, возвращающая "реальное" время в секундах
+                      (по умолчанию time.time; engine.VirtualClock — для дискретно-событийного режима).
+        :param regular_profile: профиль спроса обычных заказов по времени суток — demand.DemandProfile,
+                                24 значения (заказов в час по часам) или список пар (час, заказов в час).
+                                Если задан, заказы приходят неоднородным пуассоновским потоком, а
+                                regular_frequency не используется.
+        :param voting_profile: то же для заказов-голосований.
+        :param hotspots: горячие точки спроса — список словарей {'center': (lat, lon), 'sigma': радиус
+                         (в distance_units), 'weight': пиковая плотность относительно фона}; необязательный
+                         'profile' — множитель веса по времени суток в формате regular_profile
+                         (например, вокзал утром и вечером, ТЦ днём).
+        :param heatmap_file: файл тепловой карты спроса (см. hotspots.load_heatmap).
+        :param hotspot_background: плотность равномерного фона (0 — заказы только около горячих точек).
+        :param hotspot_grid_size: размер сетки пространственной модели (клеток по длинной стороне).
+        :param od_matrix: матрица весов переходов между клетками сетки (строки — отправление).
+                          Если задано что-то из hotspots / heatmap_file / od_matrix, точки генерируются
+                          hotspots.HotspotSampler, а sampling_method не используется.
+        :param seed: зерно генераторов случайных чисел (random.Random и numpy) — при одинаковом seed,
+                     параметрах и часах (engine.VirtualClock) поток заказов повторяется в точности.
+        :param record_path: путь к файлу записи созданных и просроченных заказов (sinks.RecordingSink);
+                            запись воспроизводится через replay.OrderReplayer.
+        :param cancel_concurrency: сколько отмен просроченных заказов может выполняться одновременно
+                                   (expiry.ExpiryPipeline). Для приёмников без сети отмены
+                                   выполняются синхронно.
+        :param metrics: реестр метрик metrics.Metrics (по умолчанию общий metrics.registry):
+                        время фаз update(), задержки API, отставание от расписания, gauge-метрики.
+        :param profiler: metrics.Profiler — cProfile включается/выключается в начале тика update().
+        :param plan_lookahead: сколько следующих заказов (геометрия, время жизни, строки времени,
+                               тело запроса) держать подготовленными (planning.OrderPlanner);
+                               к моменту заказа остаётся выбрать пользователя и отправить запрос.
+        :param rate_control: что делать с опоздавшими заказами, когда бэкенд не успевает —
+                             ratecontrol.RateController, имя политики ('none', 'drop', 'coalesce',
+                             'defer', 'aimd') или словарь {'policy': ..., <параметры RateController>}.
+        :param drivers: парк водителей (drivers.DriverFleet) — число водителей или словарь
+                        {'count': ..., <параметры DriverFleet>}. Водители ездят по полигону,
+                        принимают обычные заказы и голосуют за заказы-голосования через sink;
+                        принятые заказы уходят в историю с исходом 'accepted', а голосования
+                        остаются активными до истечения (и отменяются как обычно). None — без водителей.
 
-        ВАЖНО: Расстояния в Shapely рассчитываются в тех же единицах, что и координаты.
-               Для координат (широта/долгота) это градусы, что не эквивалентно реальным метрам.
-               Для точных геодезических расстояний используйте проекцию (pyproj) или иные методы.
+        ВАЖНО: При distance_units='degrees' расстояния считаются прямо в координатах (lat, lon),
+               то есть в градусах, что не эквивалентно реальным метрам.
+               При distance_units='m' или 'km' полигон один раз проецируется в локальную
+               азимутальную равнопромежуточную проекцию (в метрах): генерация точек и проверки
+               расстояний идут в метрах, а обратно в (lat, lon) точки переводятся пачками.
         """
         # === Параметры, связанные с типами заказов ===
         self.regular_frequency = regular_frequency
@@ -95,13 +300,22 @@ class TaxiOrderSimulator:
         self.distance_max = distance_max
 
         # === Прочие ===
-        self.polygon = Polygon(polygon_coords)
+        self.polygon = polygon_coords if isinstance(polygon_coords, BaseGeometry) else Polygon(polygon_coords)
         self.users_list = users_list
         self.time_compression = time_compression
         self.simulation_hours = simulation_hours
 
+        # === Генераторы случайных чисел (свои у каждого симулятора) ===
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.np_random = np.random.default_rng(seed)
+        # Расписания и время жизни заказов разыгрываются в потоке планировщика — отдельным генератором
+        self.plan_random = random.Random(self.random.getrandbits(64))
+
         # === Время старта симуляции (реальное) ===
         self.real_start_time = None
+        self.clock = clock if clock is not None else time.time
+        self.sink = sink if sink is not None else ApiOrderSink()
 
         # "Игровое" время начала — условно 8:00 сегодня
         self.sim_start_game_time = datetime.datetime.combine(
@@ -109,8 +323,40 @@ class TaxiOrderSimulator:
             datetime.time(hour=8, minute=0, second=0)
         )
 
-        # Список активных заказов
-        self.active_orders = []
+        # Время заказов хранится в секундах эпохи; отсчёт — от sim_start_game_time
+        self._start_ts = self.sim_start_game_time.timestamp()
+
+        # Запись создаёт сам симулятор, он же закрывает её в stop(); исходный приёмник
+        # принадлежит вызывающему и остаётся открытым
+        self._recording = None
+        if record_path is not None:
+            self.sink = self._recording = RecordingSink(self.sink, record_path, meta={
+                'seed': seed,
+                'time_compression': time_compression,
+                'start_ts': self._start_ts,
+                'polygon': self.polygon.wkt,
+            }, close_inner=False)
+
+        # === Метрики ===
+        self.metrics = metrics if metrics is not None else registry
+        self.profiler = profiler if profiler is not None else default_profiler
+
+        # Отмена просроченных заказов: очередь с параллельной отправкой и повторами
+        self.expiry = ExpiryPipeline(self.sink, max_in_flight=cancel_concurrency if self.sink.remote else 0)
+
+        # Активные заказы (колоночное хранилище) и история завершённых
+        self.orders = OrderStore()
+        # Последний снимок активных заказов (перестраивается при смене orders.version)
+        self._active_view = None
+        # Очередь истечения: куча (expire_ts, порядковый номер, id заказа)
+        self._expiry_heap = []
+        self._expiry_seq = itertools.count()
+        # Свободные пользователи: список индексов в users_list + позиция каждого индекса
+        # в этом списке (-1 — занят), выбор и удаление за O(1).
+        # Заполняется из users_list при старте (или при первом заказе).
+        self._user_ids = []
+        self._free_users = None
+        self._free_user_pos = None
 
         # Расчёт игровых интервалов для каждого типа заказа
         # (сколько игровых секунд между двумя заказами данного типа)
@@ -118,38 +364,122 @@ class TaxiOrderSimulator:
             'inf')
         self.game_interval_between_voting = 3600 / self.voting_frequency if self.voting_frequency > 0 else float('inf')
 
-        # Отслеживание времени следующей генерации (в "игровых" секундах)
-        self.next_generation_time_regular = 0.0
-        self.next_generation_time_voting = 0.0
+        # Расписания генерации (время следующего заказа в "игровых" секундах):
+        # по профилю спроса, если он задан, иначе — через равные интервалы
+        day_offset = (self.sim_start_game_time - datetime.datetime.combine(
+            self.sim_start_game_time.date(), datetime.time())).total_seconds()
+        self._day_start_ts = self._start_ts - day_offset
+        self.regular_schedule = (
+            PoissonSchedule(regular_profile, day_offset, rng=self.plan_random) if regular_profile is not None
+            else FixedIntervalSchedule(self.game_interval_between_regular)
+        )
+        self.voting_schedule = (
+            PoissonSchedule(voting_profile, day_offset, rng=self.plan_random) if voting_profile is not None
+            else FixedIntervalSchedule(self.game_interval_between_voting)
+        )
 
         self.time_shift_minutes = time_shift_minutes
+        # Сдвиг часового пояса для start_datetime: '+HH:MM' / '-HH:MM' (один раз на симулятор)
+        shift_hours, shift_minutes = divmod(abs(time_shift_minutes), 60)
+        self._time_shift_suffix = f"{'-' if time_shift_minutes < 0 else '+'}{shift_hours:02d}:{shift_minutes:02d}"
+
+        # === Генерация геометрии заказов пачками ===
+        # === Единицы расстояний и проекция ===
+        self.distance_units = distance_units
+        if distance_units == 'degrees':
+            self.projection = None
+            self._distance_scale = 1.0
+            sampling_polygon = self.polygon
+        elif distance_units in DISTANCE_UNITS:
+            self.projection = LocalProjection.for_geometry(self.polygon)
+            self._distance_scale = DISTANCE_UNITS[distance_units]
+            sampling_polygon = self.projection.forward_geometry(self.polygon)
+        else:
+            raise ValueError(f"Неизвестные единицы расстояний: {distance_units!r}")
+
+        self.sampling_method = sampling_method
+        if hotspots or heatmap_file or od_matrix is not None:
+            self.sampler = HotspotSampler(
+                sampling_polygon,
+                hotspots=[
+                    dict(h, center=self._from_order_coords([h['center']])[0], sigma=h['sigma'] * self._distance_scale)
+                    for h in hotspots or ()
+                ],
+                heat_points=self._load_heat_points(heatmap_file) if heatmap_file else None,
+                background=hotspot_background,
+                grid_size=hotspot_grid_size,
+                od_matrix=od_matrix,
+                rng=self.np_random
+            )
+        else:
+            self.sampler = make_sampler(sampling_method, sampling_polygon, rng=self.np_random)
+        self.geometry_batch_size = geometry_batch_size
+        self._order_coords_buffer = deque()
+
+        # Упреждающая подготовка заказов по расписаниям (расписаниями дальше владеет планировщик)
+        self.planner = OrderPlanner({'regular': self.regular_schedule, 'voting': self.voting_schedule},
+                                    self._prepare_order, lookahead=plan_lookahead)
+        # Допуск наступивших заказов к отправке (по задержке и ошибкам CreateDrive);
+        # темп 'aimd' считается по часам симулятора, в дискретно-событийном режиме — виртуальным
+        self.rate_control = make_rate_controller(rate_control, metrics=self.metrics, clock=lambda: self.clock())
+        # Водители (после сэмплера: парк генерирует свои точки в тех же координатах)
+        self.drivers = make_driver_fleet(drivers, self)
+
+        self.metrics.add_collector(self._collect_metrics)
+
+    @property
+    def next_generation_time_regular(self):
+        """
+        Игровое время (сек от старта) следующего обычного заказа.
+        """
+        return self.planner.next_time('regular')
+
+    @property
+    def next_generation_time_voting(self):
+        """
+        Игровое время (сек от старта) следующего заказа-голосования.
+        """
+        return self.planner.next_time('voting')
 
     # ---------------------------------
     #   Вспомогательные методы
     # ---------------------------------
-    def _random_point_in_polygon(self):
+    def _from_order_coords(self, points):
+        """
+        Переводит точки (lat, lon) в массив (n, 2) в координатах сэмплера.
+        """
+        if self.projection is not None:
+            return self.projection.forward_points(points)
+        return np.asarray(points, dtype=float).reshape(-1, 2)
+
+    def _load_heat_points(self, path):
         """
-        Генерирует случайную точку внутри полигона методом "bounding box + проверка".
+        Тепловая карта в координатах сэмплера: массив (n, 3) (x, y, вес).
         """
-        minx, miny, maxx, maxy = self.polygon.bounds
-        while True:
-            rand_x = random.uniform(minx, maxx)
-            rand_y = random.uniform(miny, maxy)
-            point = Point(rand_x, rand_y)
-            if self.polygon.contains(point):
-                return (rand_x, rand_y)
+        heat = load_heatmap(path)
+        return np.column_stack((self._from_order_coords(heat[:, :2]), heat[:, 2]))
 
-    def _random_dest_in_polygon_within_dist_range(self, origin, dmin, dmax):
+    def _to_order_coords(self, points):
         """
-        Генерирует случайную точку внутри полигона,
-        чтобы расстояние от origin до этой точки лежало в [dmin, dmax].
+        Переводит массив (n, 2) точек сэмплера в список кортежей (lat, lon).
         """
-        origin_point = Point(origin)
-        while True:
-            dest = self._random_point_in_polygon()
-            distance = origin_point.distance(Point(dest))
-            if dmin <= distance <= dmax:
-                return dest
+        if self.projection is not None:
+            points = self.projection.inverse_points(points)
+        return list(map(tuple, points.tolist()))
+
+    def _random_order_coords(self):
+        """
+        Возвращает пару (origin_coords, destination_coords) для нового заказа.
+        Пары генерируются пачками по geometry_batch_size и берутся из буфера.
+        """
+        if not self._order_coords_buffer:
+            origins, destinations = self.sampler.sample_pairs(
+                self.geometry_batch_size,
+                self.distance_min * self._distance_scale,
+                self.distance_max * self._distance_scale
+            )
+            self._order_coords_buffer.extend(zip(self._to_order_coords(origins), self._to_order_coords(destinations)))
+        return self._order_coords_buffer.popleft()
 
     def _get_game_time_since_start(self):
         """
@@ -157,7 +487,7 @@ class TaxiOrderSimulator:
         """
         if self.real_start_time is None:
             return 0.0
-        real_elapsed = time.time() - self.real_start_time
+        real_elapsed = self.clock() - self.real_start_time
         game_elapsed = real_elapsed * self.time_compression
         return game_elapsed
 
@@ -168,156 +498,333 @@ class TaxiOrderSimulator:
         elapsed_seconds = self._get_game_time_since_start()
         return self.sim_start_game_time + datetime.timedelta(seconds=elapsed_seconds)
 
+    def _now_ts(self):
+        """
+        Текущее "игровое" время в секундах эпохи.
+        """
+        return self._start_ts + self._get_game_time_since_start()
+
+    def _ts_to_datetime(self, ts):
+        """
+        "Игровое" время в секундах эпохи -> datetime.
+        """
+        return self.sim_start_game_time + datetime.timedelta(seconds=ts - self._start_ts)
+
+    def _init_free_users(self):
+        """
+        Заполняет список свободных пользователей: все пользователи без активных заказов.
+        """
+        self._user_ids = list(self.users_list.get_user_ids())
+        busy = set(self.orders.user_index[self.orders.active_slots()].tolist())
+        self._free_users = [i for i in range(len(self._user_ids)) if i not in busy]
+        self._free_user_pos = np.full(len(self._user_ids), -1, dtype=np.int64)
+        self._free_user_pos[self._free_users] = np.arange(len(self._free_users))
+
     def _get_free_user_ids(self):
         """
         Возвращает список id пользователей, у которых на данный момент нет активных заказов.
         """
-        used_user_ids = {order['userID'] for order in self.active_orders}
-        all_ids = self.users_list.get_user_ids()
-        free_user_ids = [uid for uid in all_ids if uid not in used_user_ids]
-        return free_user_ids
+        if self._free_users is None:
+            self._init_free_users()
+        return [self._user_ids[i] for i in self._free_users]
+
+    def _take_free_user(self):
+        """
+        Выбирает случайного свободного пользователя и помечает его занятым (O(1)).
+        Возвращает индекс пользователя в users_list или None, если свободных пользователей нет.
+        """
+        if self._free_users is None:
+            self._init_free_users()
+        if not self._free_users:
+            return None
+        pos = self.random.randrange(len(self._free_users))
+        user_index = self._free_users[pos]
+        # Удаление из середины списка: переносим на его место последний элемент
+        last = self._free_users.pop()
+        if last != user_index:
+            self._free_users[pos] = last
+            self._free_user_pos[last] = pos
+        self._free_user_pos[user_index] = -1
+        return user_index
+
+    def _release_user(self, user_index):
+        """
+        Возвращает пользователя (по индексу) в список свободных (O(1)).
+        """
+        if self._free_users is None or self._free_user_pos[user_index] >= 0:
+            return
+        self._free_user_pos[user_index] = len(self._free_users)
+        self._free_users.append(user_index)
+
+    def _format_start_datetime(self, creation_time):
+        """
+        Время старта заказа для API: 'YYYY-MM-DD HH:MM:SS+HH:MM' (сдвиг — time_shift_minutes).
+        """
+        return creation_time.strftime("%Y-%m-%d %H:%M:%S") + self._time_shift_suffix
 
     # ---------------------------------
     #   Генерация заказов
     # ---------------------------------
-    def _generate_regular_order(self):
+    def _prepare_order(self, order_type, game_seconds):
         """
-        Генерирует Обычный заказ (regular order).
-        Если нет свободных пользователей, заказ не создаётся.
+        Готовит заказ типа order_type на игровое время game_seconds (сек от старта) — всё,
+        кроме пользователя. Вызывается планировщиком (в том числе из фонового потока).
         """
-        free_users = self._get_free_user_ids()
-        if not free_users:
-            # Нет свободных пользователей — пропускаем
-            return
+        creation_ts = self._start_ts + game_seconds
+        # Веса горячих точек с профилями зависят от времени суток: когда они меняются,
+        # заранее сгенерированные пары точек больше не годятся
+        set_time = getattr(self.sampler, 'set_time', None)
+        if set_time is not None and set_time(creation_ts - self._day_start_ts):
+            self._order_coords_buffer.clear()
+        origin_coords, destination_coords = self._random_order_coords()
 
-        chosen_user_id = random.choice(free_users)
+        if order_type == 'regular':
+            lifetime_minutes = self.regular_lifetime_minutes
+            services = []  # Для обычного заказа b_services = []
+        else:
+            # Случайная длительность "голосования" (мин)
+            lifetime_minutes = self.plan_random.randint(self.voting_lifetime_minutes_min,
+                                                        self.voting_lifetime_minutes_max)
+            services = ['5']  # Для voting b_services = ['5']
 
-        origin_coords = self._random_point_in_polygon()
-        destination_coords = self._random_dest_in_polygon_within_dist_range(
-            origin_coords,
-            self.distance_min,
-            self.distance_max
-        )
-
-        creation_time = self._get_current_game_datetime()
-        expire_time = creation_time + datetime.timedelta(minutes=self.regular_lifetime_minutes)
-
-        time_shift = ("0"*(2-len(str(self.time_shift_minutes//60).replace("-",""))) + str(self.time_shift_minutes//60).replace("-","")
-                      + ":" + "0"*(2-len(str(self.time_shift_minutes%60).replace("-",""))) + str(self.time_shift_minutes%60).replace("-",""))
-        time_shift_delimeter = "+"
-        if self.time_shift_minutes < 0:
-            time_shift_delimeter = "-"
-        response = CreateDrive(chosen_user_id,
-                               origin_coords[0],
-                               origin_coords[1],
-                               destination_coords[0],
-                               destination_coords[1],
-                               creation_time.strftime("%Y-%m-%d %H:%M:%S") + time_shift_delimeter + time_shift,
-                               self.regular_lifetime_minutes*60,
-                               1,
-                               []) # Для обычного заказа b_services = []
-        print(
-            "API->Order " + str(response["data"]["b_id"]) + " created. Type: regular, Start time: " + creation_time.strftime(
-                "%Y-%m-%d %H:%M:%S") + time_shift_delimeter + time_shift)
-        #print(json.dumps(response, indent=4))
-        #print(json.dumps(make_request(url_prefix + "drive/get/" + str(response["data"]["b_id"]),{"token": GetAdminHashAndToken()[0],"u_hash": GetAdminHashAndToken()[1]}), indent=4))
+        creation_time = self._ts_to_datetime(creation_ts)
+        start_datetime = self._format_start_datetime(creation_time)
         order = {
-            'id': response["data"]["b_id"],
-            'order_type': 'regular',
-            'name': 'order',
-            'userID': chosen_user_id,
+            'id': None,
+            'order_type': order_type,
+            'name': ORDER_NAMES[order_type],
+            'userID': None,
+            'user_index': None,
             'coords': origin_coords,
             'destination_coords': destination_coords,
             'creation_time': creation_time,
-            'expire_time': expire_time
+            'expire_time': creation_time + datetime.timedelta(minutes=lifetime_minutes),
+            'creation_ts': creation_ts,
+            'expire_ts': creation_ts + lifetime_minutes * 60,
+            'start_datetime': start_datetime,
+            'waiting': lifetime_minutes * 60,
+            'services': services
         }
-        self.active_orders.append(order)
+        if self.sink.remote:
+            # Тело запроса CreateDrive собирается заранее — при отправке не тратим на это время
+            order['data_json'] = DriveData(origin_coords[0], origin_coords[1], destination_coords[0],
+                                           destination_coords[1], start_datetime, order['waiting'], 1, services)
+        return order
 
-    def _generate_voting_order(self):
+    def _assign_user(self, order):
         """
-        Генерирует заказ-голосование (voting order) с временем жизни
-        в диапазоне [voting_lifetime_minutes_min, voting_lifetime_minutes_max].
+        Отдаёт подготовленный заказ свободному пользователю.
+        Если нет свободных пользователей, возвращает None.
         """
-        free_users = self._get_free_user_ids()
-        if not free_users:
+        user_index = self._take_free_user()
+        if user_index is None:
             # Нет свободных пользователей — пропускаем
+            self.metrics.inc('orders_skipped_total', order_type=order['order_type'])
+            return None
+        order['userID'] = self._user_ids[user_index]
+        order['user_index'] = user_index
+        return order
+
+    def _plan_due_orders(self, current_game_time):
+        """
+        Забирает у планировщика все заказы, время которых уже наступило, и раздаёт их
+        свободным пользователям (пользователи сразу считаются занятыми).
+        """
+        planned = []
+        now_ts = self._start_ts + current_game_time
+        for order_type in ('regular', 'voting'):
+            due = self.planner.pop_due(order_type, current_game_time)
+            for order in self.rate_control.admit(order_type, due, now_ts):
+                if self._assign_user(order) is not None:
+                    planned.append(order)
+        return planned
+
+    def _register_created_order(self, order, order_id):
+        """
+        Записывает id (b_id) созданного заказа и добавляет его в активные.
+        """
+        order['id'] = order_id
+        logger.debug("API->Order %s created. Type: %s, Start time: %s", order_id, order['order_type'], order['start_datetime'])
+        self.metrics.inc('orders_created_total', order_type=order['order_type'])
+        # Насколько отправка отстала от времени заказа по расписанию (игровые секунды)
+        sent_ts = order.get('sent_ts', order['creation_ts'])
+        self.metrics.observe('order_send_delay_seconds', sent_ts - order['creation_ts'],
+                             buckets=LAG_BUCKETS, order_type=order['order_type'])
+        order_id = int(order_id)
+        self.orders.add(order_id, order['user_index'], order['coords'], order['destination_coords'],
+                        order['order_type'], order['creation_ts'], order['expire_ts'], sent_ts)
+        heapq.heappush(self._expiry_heap, (order['expire_ts'], next(self._expiry_seq), order_id))
+
+    def _order_from_slot(self, slot):
+        """
+        Заказ из слота хранилища в виде словаря (как при создании).
+        """
+        orders = self.orders
+        order_type = ORDER_TYPES[orders.order_type[slot]]
+        return {
+            'id': int(orders.ids[slot]),
+            'order_type': order_type,
+            'name': ORDER_NAMES[order_type],
+            'userID': self._user_ids[orders.user_index[slot]],
+            'user_index': int(orders.user_index[slot]),
+            'coords': tuple(orders.origin[slot].tolist()),
+            'destination_coords': tuple(orders.destination[slot].tolist()),
+            'creation_time': self._ts_to_datetime(orders.creation_ts[slot]),
+            'expire_time': self._ts_to_datetime(orders.expire_ts[slot]),
+            'creation_ts': float(orders.creation_ts[slot]),
+            'expire_ts': float(orders.expire_ts[slot]),
+        }
+
+    def _generate_due_orders(self, order_type, current_game_time):
+        """
+        Отправляет подготовленные заказы типа order_type, время которых уже наступило
+        (из них — те, что пропустит rate_control).
+        """
+        due = self.planner.pop_due(order_type, current_game_time)
+        for order in self.rate_control.admit(order_type, due, self._start_ts + current_game_time):
+            if self._assign_user(order) is not None:
+                self._send_order(order)
+
+    def _send_order(self, order):
+        """
+        Отправляет подготовленный заказ в sink. Ошибка API не прерывает тик: она
+        логируется и считается, пользователь освобождается (как в AsyncTaxiOrderSimulator).
+        """
+        order['sent_ts'] = self._now_ts()
+        started = time.perf_counter()
+        try:
+            with self.metrics.timer('order_create_seconds', order_type=order['order_type']):
+                order_id = self.sink.create_order(order)
+        except Exception as e:
+            self.rate_control.observe(time.perf_counter() - started, ok=False)
+            self.metrics.inc('order_create_errors_total', order_type=order['order_type'])
+            self._release_user(order['user_index'])
+            logger.warning("API->Order creation failed. Type: %s, error: %r", order['order_type'], e)
             return
+        self.rate_control.observe(time.perf_counter() - started)
+        self._register_created_order(order, order_id)
 
-        chosen_user_id = random.choice(free_users)
+    # ---------------------------------
+    #   Водители
+    # ---------------------------------
+    def _driver_order(self, order_id):
+        """
+        Заказ, выбранный водителем, и действие над ним: 'accept' (обычный) или 'vote' (голосование).
+        """
+        order = self._order_from_slot(self.orders.slot_of(order_id))
+        order['action_ts'] = self._now_ts()
+        order['action_time'] = self._ts_to_datetime(order['action_ts'])
+        return order, 'vote' if order['order_type'] == 'voting' else 'accept'
 
-        origin_coords = self._random_point_in_polygon()
-        destination_coords = self._random_dest_in_polygon_within_dist_range(
-            origin_coords,
-            self.distance_min,
-            self.distance_max
-        )
+    def _register_driver_action(self, driver, order, action):
+        if action == 'vote':
+            self._register_voted_order(driver, order)
+        else:
+            self._register_accepted_order(driver, order)
 
-        creation_time = self._get_current_game_datetime()
-
-        # Случайная длительность "голосования" (мин)
-        voting_lifetime = random.randint(self.voting_lifetime_minutes_min,
-                                         self.voting_lifetime_minutes_max)
-
-        expire_time = creation_time + datetime.timedelta(minutes=voting_lifetime)
-
-        time_shift = ("0" * (2 - len(str(self.time_shift_minutes // 60).replace("-", ""))) + str(
-            self.time_shift_minutes // 60).replace("-", "")
-                      + ":" + "0" * (2 - len(str(self.time_shift_minutes % 60).replace("-", ""))) + str(
-                    self.time_shift_minutes % 60).replace("-", ""))
-        time_shift = time_shift.replace("-", "")
-        time_shift_delimeter = "+"
-        if self.time_shift_minutes < 0:
-            time_shift_delimeter = "-"
-        response = CreateDrive(chosen_user_id,
-                               origin_coords[0],
-                               origin_coords[1],
-                               destination_coords[0],
-                               destination_coords[1],
-                               creation_time.strftime("%Y-%m-%d %H:%M:%S") + time_shift_delimeter + time_shift,
-                               voting_lifetime*60,
-                               1,
-                               ['5'])  # Для voting b_services = ['5']
-        print("API->Order " + str(response["data"]["b_id"]) + " created. Type: voting, Start time: " + creation_time.strftime("%Y-%m-%d %H:%M:%S") + time_shift_delimeter + time_shift)
+    def _register_accepted_order(self, driver, order):
+        """
+        Водитель взял заказ: заказ уходит в историю с исходом 'accepted', пассажир освобождается.
+        """
+        if order['id'] not in self.orders:
+            # Пока ждали ответа API, заказ истёк
+            self.drivers.release(driver)
+            return
+        self.orders.remove(self.orders.slot_of(order['id']), order['action_ts'], 'accepted')
+        self._release_user(order['user_index'])
+        self.drivers.confirm(driver)
+        self.metrics.inc('orders_accepted_total', order_type=order['order_type'])
 
-        order = {
-            'id': response["data"]["b_id"],
-            'order_type': 'voting',
-            'name': 'Vote',
-            'userID': chosen_user_id,
-            'coords': origin_coords,
-            'destination_coords': destination_coords,
-            'creation_time': creation_time,
-            'expire_time': expire_time
-        }
-        self.active_orders.append(order)
+    def _register_voted_order(self, driver, order):
+        """
+        Водитель проголосовал: голосование остаётся активным до истечения (тогда оно
+        отменяется, как обычно), водитель снова свободен.
+        """
+        if order['id'] not in self.orders:
+            self.drivers.release(driver)
+            return
+        self.drivers.voted(driver)
+        self.metrics.inc('orders_voted_total')
+
+    def _driver_action_failed(self, driver, action, error):
+        logger.warning("API->Driver %s %s failed: %r", self.drivers.driver_ids[driver], action, error)
+        self.metrics.inc('driver_action_errors_total', action=action)
+        self.drivers.release(driver)
+
+    def _dispatch_drivers(self, current_game_time):
+        """
+        Двигает водителей и отправляет в sink их действия над подобранными заказами.
+        """
+        for driver, order_id in self.drivers.step(current_game_time):
+            order, action = self._driver_order(order_id)
+            try:
+                with self.metrics.timer('driver_action_seconds', action=action):
+                    getattr(self.sink, action + '_order')(order, self.drivers.driver_ids[driver])
+            except Exception as e:
+                self._driver_action_failed(driver, action, e)
+                continue
+            self._register_driver_action(driver, order, action)
 
     # ---------------------------------
     #   Основные методы симуляции
     # ---------------------------------
+    def _pop_expired_orders(self):
+        """
+        Убирает из активных заказы, у которых истекло время жизни, и возвращает их.
+        """
+        now_ts = self._now_ts()
+
+        expired_orders = []
+        while self._expiry_heap and self._expiry_heap[0][0] <= now_ts:
+            _, _, order_id = heapq.heappop(self._expiry_heap)
+            if order_id not in self.orders:
+                continue
+            slot = self.orders.slot_of(order_id)
+            order = self._order_from_slot(slot)
+            self.orders.remove(slot, now_ts, 'expired')
+            self._release_user(order['user_index'])
+            expired_orders.append(order)
+        return expired_orders
+
     def _remove_expired_orders(self):
         """
         Удаляем заказы, у которых истекло время жизни.
         """
-        now = self._get_current_game_datetime()
+        expired = self._pop_expired_orders()
+        if expired:
+            logger.debug("API->Orders expired: %d, cancellations pending: %d", len(expired), len(self.expiry) + len(expired))
+            self.metrics.inc('orders_expired_total', len(expired))
+            self.expiry.submit(expired)
+        self.expiry.pump()
 
-        expired_orders = [
-            o for o in self.active_orders
-            if o['expire_time'] <= now
-        ]
-        for order in expired_orders:
-            print(f"API->Order {order['id']} expired")
-            CancelDrive(order['id'], "Order expired")
+    def start(self, real_start_time=None):
+        """
+        Запускаем симуляцию (фиксируем реальное время).
 
-        self.active_orders = [
-            o for o in self.active_orders
-            if o['expire_time'] > now
-        ]
+        :param real_start_time: общий момент старта (по clock) — чтобы несколько
+                                симуляторов вели одно и то же игровое время.
+        """
+        self.real_start_time = self.clock() if real_start_time is None else real_start_time
+        self._init_free_users()
+        self.planner.start()
 
-    def start(self):
+    def stop(self, timeout=None):
         """
-        Запускаем симуляцию (фиксируем реальное время).
+        Останавливает планировщик и дожидается отправки отмен просроченных заказов
+        (не дольше timeout секунд), затем закрывает файл записи (record_path).
+        Последние значения gauge-метрик фиксируются, и коллектор снимается с реестра:
+        остановленный симулятор больше не пишет в него (например, в воркере, где после
+        этой зоны реестр обнулён для следующей).
+        Возвращает True, если все отмены завершены.
         """
-        self.real_start_time = time.time()
+        self.planner.stop()
+        drained = self.expiry.close(timeout)
+        self._collect_metrics(self.metrics)
+        self.metrics.remove_collector(self._collect_metrics)
+        if self._recording is not None:
+            self._recording.close()
+            self._recording = None
+        return drained
 
     def update(self):
         """
@@ -325,25 +832,34 @@ class TaxiOrderSimulator:
          - Генерирует обычные заказы, если пришло время (и есть свободные пользователи).
          - Генерирует заказы-голосования, если пришло время (и есть свободные пользователи).
          - Удаляет просроченные заказы.
+         - Двигает водителей и отдаёт им заказы (если задан парк водителей).
          - Проверяет окончание симуляции (необязательно останавливать).
         """
         if self.real_start_time is None:
             return  # Симуляция ещё не запущена
 
+        self.profiler.apply()
+        started = time.perf_counter()
         current_game_time = self._get_game_time_since_start()
+        self._record_schedule_lag(current_game_time)
 
         # --- Генерация обычных заказов ---
-        while current_game_time >= self.next_generation_time_regular:
-            self._generate_regular_order()
-            self.next_generation_time_regular += self.game_interval_between_regular
+        with self.metrics.timer('update_phase_seconds', phase='regular'):
+            self._generate_due_orders('regular', current_game_time)
 
         # --- Генерация заказов-голосований ---
-        while current_game_time >= self.next_generation_time_voting:
-            self._generate_voting_order()
-            self.next_generation_time_voting += self.game_interval_between_voting
+        with self.metrics.timer('update_phase_seconds', phase='voting'):
+            self._generate_due_orders('voting', current_game_time)
 
         # --- Удаляем "протухшие" заказы ---
-        self._remove_expired_orders()
+        with self.metrics.timer('update_phase_seconds', phase='expire'):
+            self._remove_expired_orders()
+
+        # --- Водители разбирают заказы ---
+        if self.drivers is not None:
+            with self.metrics.timer('update_phase_seconds', phase='drivers'):
+                self._dispatch_drivers(current_game_time)
+        self.metrics.observe('update_seconds', time.perf_counter() - started)
 
         # --- (Опционально) проверяем окончание симуляции ---
         end_game_time = self.sim_start_game_time + datetime.timedelta(hours=self.simulation_hours)
@@ -351,12 +867,62 @@ class TaxiOrderSimulator:
             # Здесь можно завершать/останавливать, если нужно
             pass
 
+    def _record_schedule_lag(self, current_game_time):
+        """
+        Отставание от расписания (игровые секунды): насколько текущее игровое время
+        ушло за момент ещё не сгенерированного заказа.
+        """
+        self.metrics.set_gauge('schedule_lag_seconds', max(current_game_time - self.next_generation_time_regular, 0.0),
+                               order_type='regular')
+        self.metrics.set_gauge('schedule_lag_seconds', max(current_game_time - self.next_generation_time_voting, 0.0),
+                               order_type='voting')
+
+    def _collect_metrics(self, metrics):
+        """
+        Gauge-метрики состояния, обновляемые при снимке метрик (а не на каждом тике).
+        """
+        metrics.set_gauge('active_orders', len(self.orders))
+        metrics.set_gauge('free_users', len(self._free_users) if self._free_users is not None else 0)
+        metrics.set_gauge('cancellations_pending', len(self.expiry))
+        metrics.set_gauge('cancellations_abandoned', len(self.expiry.abandoned))
+        metrics.set_gauge('cancellation_failures', self.expiry.failures)
+        if self.real_start_time is not None:
+            metrics.set_gauge('game_time_seconds', self._get_game_time_since_start())
+        for name, value in self.planner.stats().items():
+            metrics.set_gauge('planner_' + name, value)
+        for name, value in self.rate_control.stats().items():
+            metrics.set_gauge('rate_control_' + name, value, policy=self.rate_control.policy)
+        if self.drivers is not None:
+            for name, value in self.drivers.stats().items():
+                metrics.set_gauge('drivers_' + name, value)
+        for name, value in getattr(self.sampler, 'stats', dict)().items():
+            metrics.set_gauge('sampler_' + name, value, method=type(self.sampler).__name__)
+
+    def active_orders_view(self):
+        """
+        Неизменяемый снимок активных заказов (orders.ActiveOrdersView). Пока заказы не
+        добавлялись и не удалялись, возвращается один и тот же объект, так что опрашивать
+        его можно хоть на каждом кадре.
+        """
+        view = self._active_view
+        if view is None or view.version != self.orders.version or view.user_ids is not self._user_ids:
+            view = self._active_view = ActiveOrdersView(self.orders, self._user_ids, self._now_ts, self._day_start_ts)
+        return view
+
+    def active_orders_changes(self, since_version):
+        """
+        Дельта активных заказов с версии since_version (см. ActiveOrdersView.version):
+        (текущая версия, добавленные id, удалённые id) или None, если нужен полный снимок.
+        """
+        return self.orders.changes_since(since_version)
+
     def get_active_orders(self):
         """
         Возвращает список активных заказов в формате:
         {
+            'id': <b_id>,
             'order_type': 'regular' или 'voting',
-            'name': 'Простой заказ' или 'Голосование',
+            'name': 'order' или 'Vote',
             'userID': <int>,
             'coords': (lat, lon),
             'destination_coords': (lat, lon),
@@ -364,63 +930,137 @@ class TaxiOrderSimulator:
             'remaining_lifetime': 'X мин Y сек'
         }
         """
-        now = self._get_current_game_datetime()
-        result = []
-        for o in self.active_orders:
-            remaining_seconds = (o['expire_time'] - now).total_seconds()
-            creation_time_str = o['creation_time'].strftime('%H:%M:%S')
-            result.append({
-                'userID': o['userID'],
-                'coords': o['coords'],
-                'destination_coords': o['destination_coords'],
-                'creation_time': creation_time_str,
-                'remaining_lifetime': f"{int(remaining_seconds // 60)} мин {int(remaining_seconds % 60)} сек"
-            })
-        return result
+        return self.active_orders_view().to_list()
+
+    def get_order_history(self):
+        """
+        История завершённых заказов в виде pandas.DataFrame (см. OrderHistory.to_dataframe).
+        """
+        return self.orders.history.to_dataframe(user_ids=self._user_ids)
+
+
+class AsyncTaxiOrderSimulator(TaxiOrderSimulator):
+    """
+    Вариант симулятора с асинхронным update(): заказы, набежавшие за один тик,
+    и отмены просроченных заказов отправляются в sink одновременно (для ApiOrderSink —
+    через AsyncApiClient с ограничением параллельности), а полученные b_id затем сводятся в хранилище активных заказов.
+    """
+
+    async def _create_order_async(self, order):
+        order['sent_ts'] = self._now_ts()
+        started = time.perf_counter()
+        try:
+            order_id = await self.sink.create_order_async(order)
+        except Exception as e:
+            self.rate_control.observe(time.perf_counter() - started, ok=False)
+            self._release_user(order['user_index'])
+            self.metrics.inc('order_create_errors_total', order_type=order['order_type'])
+            logger.warning("API->Order creation failed. Type: %s, error: %r", order['order_type'], e)
+            return
+        self.rate_control.observe(time.perf_counter() - started)
+        self._register_created_order(order, order_id)
+
+    async def _cancel_order_async(self, order):
+        try:
+            await self.sink.cancel_order_async(order, "Order expired")
+        except Exception as e:
+            logger.warning("API->Order %s cancellation failed: %r", order['id'], e)
+            # Повтор — через общий конвейер отмен (в пуле потоков, с задержкой)
+            self.expiry.retry(order, e)
+
+    async def _driver_action_async(self, driver, order_id):
+        order, action = self._driver_order(order_id)
+        try:
+            with self.metrics.timer('driver_action_seconds', action=action):
+                await getattr(self.sink, action + '_order_async')(order, self.drivers.driver_ids[driver])
+        except Exception as e:
+            self._driver_action_failed(driver, action, e)
+            return
+        self._register_driver_action(driver, order, action)
+
+    async def update(self):
+        """
+        Асинхронный аналог TaxiOrderSimulator.update().
+        """
+        if self.real_start_time is None:
+            return  # Симуляция ещё не запущена
+
+        self.profiler.apply()
+        started = time.perf_counter()
+        current_game_time = self._get_game_time_since_start()
+        self._record_schedule_lag(current_game_time)
+
+        with self.metrics.timer('update_phase_seconds', phase='plan'):
+            planned = self._plan_due_orders(current_game_time)
+
+        # Повторы отмен из прошлых тиков уходят в конвейер здесь же, как в синхронном update()
+        with self.metrics.timer('update_phase_seconds', phase='expire'):
+            expired = self._pop_expired_orders()
+            self.metrics.inc('orders_expired_total', len(expired))
+            self.expiry.pump()
+
+        with self.metrics.timer('update_phase_seconds', phase='send'):
+            await asyncio.gather(
+                *(self._create_order_async(order) for order in planned),
+                *(self._cancel_order_async(order) for order in expired)
+            )
+        if self.drivers is not None:
+            with self.metrics.timer('update_phase_seconds', phase='drivers'):
+                matches = self.drivers.step(current_game_time)
+                await asyncio.gather(*(self._driver_action_async(driver, order_id) for driver, order_id in matches))
+        self.metrics.observe('update_seconds', time.perf_counter() - started)
 
 
 if __name__ == '__main__':
     # Пример использования
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if len(sys.argv) > 1:
+        # Параметры из файла сценария (см. scenario.py): python main.py examples/rate_vs_latency.toml
+        from scenario import build_simulator, build_users, load_scenario
 
-    # Создаём список пользователей (5 пользователей)
-    users = UsersList(user_count=5)
-    users.sync()
-
-    # Координаты полигона (широта, долгота):
-    polygon_coords = [
-        (30.42854544631636, -9.611663818359375),
-        (30.45459295698008, -9.53819274902344),
-        (30.420256142845158, -9.545745849609377),
-        (30.410189613309132, -9.526519775390627),
-        (30.385314913418373, -9.482574462890627),
-        (30.35806392728733, -9.477081298828127),
-        (30.34325042354528, -9.472961425781252),
-        (30.329620019722665, -9.481201171875002),
-        (30.315987718557867, -9.50798034667969),
-        (30.329620019722665, -9.539566040039064),
-        (30.347990988731844, -9.567718505859377),
-        (30.378206692827195, -9.602050781250002),
-        (30.42854544631636, -9.611663818359375)
-    ]
-
-    # Создаём симулятор
-    # Частоты:
-    #   regular_frequency=5  -> 5 обычных заказов в час
-    #   voting_frequency=2   -> 2 заказа-голосования в час
-    simulator = TaxiOrderSimulator(
-        polygon_coords=polygon_coords,
-        users_list=users,
-        regular_frequency=5,
-        voting_frequency=2,
-        regular_lifetime_minutes=10,
-        voting_lifetime_minutes_min=5,
-        voting_lifetime_minutes_max=15,
-        distance_min=0.01,
-        distance_max=0.05,
-        time_compression=15.0,  # ускоряем время в 20 раз
-        simulation_hours=4,  # 1 час симуляции (с 8:00 до 9:00)
-        time_shift_minutes=3*60
-    )
+        scenario = load_scenario(sys.argv[1])
+        simulator = build_simulator(scenario, build_users(scenario, sync=True))
+    else:
+        # Создаём список пользователей (5 пользователей)
+        users = UsersList(user_count=5)
+        users.sync()
+
+        # Координаты полигона (широта, долгота):
+        polygon_coords = [
+            (30.42854544631636, -9.611663818359375),
+            (30.45459295698008, -9.53819274902344),
+            (30.420256142845158, -9.545745849609377),
+            (30.410189613309132, -9.526519775390627),
+            (30.385314913418373, -9.482574462890627),
+            (30.35806392728733, -9.477081298828127),
+            (30.34325042354528, -9.472961425781252),
+            (30.329620019722665, -9.481201171875002),
+            (30.315987718557867, -9.50798034667969),
+            (30.329620019722665, -9.539566040039064),
+            (30.347990988731844, -9.567718505859377),
+            (30.378206692827195, -9.602050781250002),
+            (30.42854544631636, -9.611663818359375)
+        ]
+
+        # Создаём симулятор
+        # Частоты:
+        #   regular_frequency=5  -> 5 обычных заказов в час
+        #   voting_frequency=2   -> 2 заказа-голосования в час
+        simulator = TaxiOrderSimulator(
+            polygon_coords=polygon_coords,
+            users_list=users,
+            regular_frequency=5,
+            voting_frequency=2,
+            regular_lifetime_minutes=10,
+            voting_lifetime_minutes_min=5,
+            voting_lifetime_minutes_max=15,
+            distance_min=0.01,
+            distance_max=0.05,
+            time_compression=15.0,  # ускоряем время в 20 раз
+            simulation_hours=4,  # 1 час симуляции (с 8:00 до 9:00)
+            time_shift_minutes=3*60
+        )
 
     simulator.start()
 
@@ -450,4 +1090,5 @@ if __name__ == '__main__':
 
     # Дополнительный вызов update() — если хотим «доубирать» заказы и отменить их на API
     simulator.update()
+    simulator.stop()
 
@@ -0,0 +1,376 @@
+"""
+Метрики и профилирование симулятора.
+
+ - Metrics — счётчики, gauge-метрики и гистограммы с метками; снимок через snapshot()
+   (pull API) и текст в формате Prometheus через to_prometheus();
+ - MetricsServer — HTTP-эндпоинт /metrics (и переключатели профилирования /debug/...);
+ - Profiler — cProfile и tracemalloc, включаемые и выключаемые во время работы.
+
+По умолчанию всё пишется в общий реестр модуля registry.
+"""
+import bisect
+import cProfile
+import io
+import math
+import pstats
+import threading
+import time
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Границы корзин гистограмм времени (сек) по умолчанию
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Границы корзин для отставаний в игровых секундах (заказ отправлен позже расписания)
+LAG_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными границами корзин (как в Prometheus).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Последняя корзина — +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        Оценка квантиля по корзинам (верхняя граница корзины, в которую он попадает).
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Гистограмма из to_dict() (например, из снимка метрик другого процесса).
+        """
+        histogram = cls(float(bound) for bound in data['buckets'] if bound != '+Inf')
+        histogram.counts = list(data['buckets'].values())
+        histogram.count = data['count']
+        histogram.sum = data['sum']
+        histogram.max = data['max']
+        return histogram
+
+    def merge(self, other):
+        """
+        Добавляет наблюдения другой гистограммы с теми же границами корзин.
+        """
+        if other.buckets != self.buckets:
+            raise ValueError("У гистограмм разные границы корзин")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], self.counts)),
+        }
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+
+class Metrics:
+    """
+    Реестр метрик. Метрика задаётся именем и метками (именованными аргументами):
+    metrics.inc('orders_created_total', order_type='regular').
+
+    Gauge-метрики, которые дорого обновлять на каждом тике, можно отдавать через
+    коллекторы — функции, вызываемые при каждом снимке (add_collector).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _labels_key(labels))] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Измеряет время блока и записывает его в гистограмму name.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def add_collector(self, collector):
+        """
+        Регистрирует функцию collector(metrics), обновляющую метрики перед снимком.
+        Связанные методы хранятся по слабой ссылке (объект может быть удалён).
+        """
+        ref = weakref.WeakMethod(collector) if hasattr(collector, '__self__') else (lambda: collector)
+        with self._lock:
+            self._collectors.append(ref)
+
+    def remove_collector(self, collector):
+        """
+        Снимает регистрацию collector (add_collector); незарегистрированный игнорируется.
+        """
+        with self._lock:
+            self._collectors = [ref for ref in self._collectors if ref() is not None and ref() != collector]
+
+    def _collect(self):
+        with self._lock:
+            self._collectors = [ref for ref in self._collectors if ref() is not None]
+            collectors = [ref() for ref in self._collectors]
+        for collector in collectors:
+            if collector is not None:
+                collector(self)
+
+    def snapshot(self):
+        """
+        Снимок всех метрик: {'counters': {...}, 'gauges': {...}, 'histograms': {...}},
+        ключи — 'имя{метки}'.
+        """
+        self._collect()
+        with self._lock:
+            return {
+                'counters': {name + _format_labels(key): value for (name, key), value in self._counters.items()},
+                'gauges': {name + _format_labels(key): value for (name, key), value in self._gauges.items()},
+                'histograms': {name + _format_labels(key): h.to_dict() for (name, key), h in self._histograms.items()},
+            }
+
+    def counter_total(self, name, **labels):
+        """
+        Сумма счётчика name по всем меткам (или только по тем, где совпадают заданные labels).
+        """
+        wanted = set(_labels_key(labels))
+        with self._lock:
+            return sum(value for (metric, key), value in self._counters.items()
+                       if metric == name and wanted <= set(key))
+
+    def merged_histogram(self, name):
+        """
+        Гистограмма name, сведённая по всем меткам (пустая, если наблюдений не было).
+        """
+        merged = Histogram()
+        with self._lock:
+            for (metric, _), h in self._histograms.items():
+                if metric != name:
+                    continue
+                if h.buckets != merged.buckets:
+                    if merged.count:
+                        raise ValueError(f"У гистограмм {name} разные границы корзин")
+                    merged = Histogram(h.buckets)
+                merged.counts = [a + b for a, b in zip(merged.counts, h.counts)]
+                merged.count += h.count
+                merged.sum += h.sum
+                merged.max = max(merged.max, h.max)
+        return merged
+
+    def to_prometheus(self):
+        """
+        Метрики в текстовом формате Prometheus.
+        """
+        self._collect()
+        lines = []
+        with self._lock:
+            for kind, metrics in (('counter', self._counters), ('gauge', self._gauges)):
+                for name in sorted({name for name, _ in metrics}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (metric, key), value in metrics.items():
+                        if metric == name:
+                            lines.append(f"{name}{_format_labels(key)} {value}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, key), h in self._histograms.items():
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(h.buckets + (math.inf,), h.counts):
+                        cumulative += count
+                        le = "+Inf" if math.isinf(bound) else repr(bound)
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', le)])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {h.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+class Profiler:
+    """
+    cProfile и tracemalloc, переключаемые во время работы.
+
+    cProfile профилирует только поток, в котором включён, поэтому из других потоков
+    (например, из MetricsServer) включение лишь запрашивается, а применяется в цикле
+    симуляции вызовом apply() — TaxiOrderSimulator.update() делает это в начале тика.
+    """
+
+    def __init__(self):
+        self._profile = None
+        self._wanted = False
+        self._last_stats = ""
+
+    def request_cprofile(self, enabled):
+        self._wanted = enabled
+
+    def apply(self):
+        """
+        Включает или выключает cProfile в текущем потоке, если это было запрошено.
+        """
+        if self._wanted and self._profile is None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif not self._wanted and self._profile is not None:
+            self._profile.disable()
+            self._last_stats = self._format(self._profile)
+            self._profile = None
+
+    @property
+    def cprofile_enabled(self):
+        return self._profile is not None
+
+    @staticmethod
+    def _format(profile, limit=30):
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+    def cprofile_stats(self):
+        """
+        Отчёт cProfile по последнему завершённому сеансу профилирования.
+        """
+        return self._last_stats
+
+    def start_tracemalloc(self, frames=1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop_tracemalloc(self):
+        tracemalloc.stop()
+
+    def tracemalloc_top(self, limit=20):
+        """
+        Строки кода с наибольшим объёмом выделенной памяти.
+        """
+        if not tracemalloc.is_tracing():
+            return "tracemalloc не запущен\n"
+        stats = tracemalloc.take_snapshot().statistics('lineno')[:limit]
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"current={current} peak={peak}"] + [str(stat) for stat in stats]
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    HTTP-эндпоинт метрик в отдельном потоке:
+     /metrics — текст Prometheus,
+     /debug/cprofile/start, /debug/cprofile/stop — включить / выключить cProfile (stop отдаёт отчёт),
+     /debug/tracemalloc/start, /debug/tracemalloc/top, /debug/tracemalloc/stop.
+    """
+
+    def __init__(self, host="127.0.0.1", port=9100, metrics=None, profiler=None):
+        metrics = metrics if metrics is not None else registry
+        profiler = profiler if profiler is not None else default_profiler
+
+        def cprofile_stop():
+            profiler.request_cprofile(False)
+            return "cProfile: остановка запрошена; отчёт — по /debug/cprofile/stats\n"
+
+        routes = {
+            "/metrics": metrics.to_prometheus,
+            "/debug/cprofile/start": lambda: profiler.request_cprofile(True) or "cProfile: запуск запрошен\n",
+            "/debug/cprofile/stop": cprofile_stop,
+            "/debug/cprofile/stats": profiler.cprofile_stats,
+            "/debug/tracemalloc/start": lambda: profiler.start_tracemalloc() or "tracemalloc запущен\n",
+            "/debug/tracemalloc/top": profiler.tracemalloc_top,
+            "/debug/tracemalloc/stop": lambda: profiler.stop_tracemalloc() or "tracemalloc остановлен\n",
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                route = routes.get(self.path.split("?", 1)[0])
+                body = (route() if route else "not found\n").encode("utf-8")
+                self.send_response(200 if route else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# Общий реестр метрик и профилировщик модуля
+registry = Metrics()
+default_profiler = Profiler()
@@ -0,0 +1,378 @@
+"""
+Колоночное (struct-of-arrays) хранилище заказов.
+
+Активные заказы лежат в массивах NumPy фиксированного типа (слоты переиспользуются),
+завершённые — в append-only таблице истории на колонках array.array.
+Время хранится в секундах эпохи (float64).
+"""
+from array import array
+from collections.abc import Sequence
+
+import numpy as np
+
+# Коды типов заказов в колонке order_type
+ORDER_TYPES = ('regular', 'voting')
+ORDER_TYPE_CODES = {name: code for code, name in enumerate(ORDER_TYPES)}
+ORDER_NAMES = {'regular': 'order', 'voting': 'Vote'}
+
+# Коды исходов в истории заказов
+OUTCOMES = ('expired', 'cancelled', 'accepted')
+OUTCOME_CODES = {name: code for code, name in enumerate(OUTCOMES)}
+
+
+class OrderHistory:
+    """
+    Append-only таблица завершённых заказов.
+    """
+
+    # Колонки: имя -> typecode array.array
+    COLUMNS = {
+        'id': 'q',
+        'user_index': 'q',
+        'origin_x': 'd',
+        'origin_y': 'd',
+        'destination_x': 'd',
+        'destination_y': 'd',
+        'order_type': 'b',
+        'creation_ts': 'd',
+        'sent_ts': 'd',
+        'expire_ts': 'd',
+        'finished_ts': 'd',
+        'outcome': 'b',
+    }
+
+    def __init__(self):
+        self._columns = {name: array(typecode) for name, typecode in self.COLUMNS.items()}
+
+    def __len__(self):
+        return len(self._columns['id'])
+
+    def append(self, row):
+        """
+        Добавляет строку: словарь {колонка: значение} со всеми колонками COLUMNS.
+        """
+        for name, column in self._columns.items():
+            column.append(row[name])
+
+    def columns(self):
+        """
+        Колонки как массивы NumPy без копирования (представления над буферами array.array).
+        Представления действительны до следующего append.
+        """
+        return {
+            name: np.frombuffer(column, dtype=np.dtype(column.typecode)) if len(column) else np.empty(0, dtype=np.dtype(column.typecode))
+            for name, column in self._columns.items()
+        }
+
+    def to_dataframe(self, user_ids=None):
+        """
+        История в виде pandas.DataFrame (типы заказов и исходы — категории, время — datetime).
+
+        :param user_ids: массив id пользователей по индексу (для колонки userID).
+        """
+        import pandas as pd
+
+        cols = self.columns()
+        df = pd.DataFrame({name: values.copy() for name, values in cols.items()})
+        df['order_type'] = pd.Categorical.from_codes(df['order_type'], categories=ORDER_TYPES)
+        df['outcome'] = pd.Categorical.from_codes(df['outcome'], categories=OUTCOMES)
+        for name in ('creation_ts', 'sent_ts', 'expire_ts', 'finished_ts'):
+            # Округляем до миллисекунд, чтобы не тащить погрешность float в datetime
+            df[name.replace('_ts', '_time')] = pd.to_datetime(np.round(df[name].to_numpy() * 1000).astype(np.int64), unit='ms')
+        if user_ids is not None:
+            df['userID'] = np.asarray(user_ids, dtype=object)[cols['user_index']]
+        return df
+
+    def to_parquet(self, path, user_ids=None):
+        """
+        Сохраняет историю в Parquet (нужен pyarrow или fastparquet).
+        """
+        self.to_dataframe(user_ids).to_parquet(path, index=False)
+
+
+class OrderStore:
+    """
+    Активные заказы в колонках NumPy.
+
+    Каждый заказ занимает слот; освободившиеся слоты переиспользуются, а при нехватке
+    места массивы увеличиваются вдвое. Удалённые заказы переносятся в history.
+
+    Каждое добавление и удаление увеличивает version и пишется в журнал изменений
+    (последние change_log_size записей), по которому changes_since отдаёт дельту.
+    """
+
+    def __init__(self, capacity=1024, change_log_size=65536):
+        self.history = OrderHistory()
+        self.change_log_size = change_log_size
+        self._changes = []  # (id заказа, добавлен ли) для версий (_changes_base, version]
+        self._changes_base = 0
+        self._capacity = 0
+        self._high_water = 0  # Слоты [0, _high_water) хотя бы раз использовались
+        self._free_slots = []
+        self._slot_by_id = {}
+
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.user_index = np.zeros(0, dtype=np.int64)
+        self.origin = np.zeros((0, 2))
+        self.destination = np.zeros((0, 2))
+        self.order_type = np.zeros(0, dtype=np.int8)
+        self.creation_ts = np.zeros(0)
+        self.sent_ts = np.zeros(0)
+        self.expire_ts = np.zeros(0)
+        self.active = np.zeros(0, dtype=bool)
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        def resized(column):
+            new = np.zeros((capacity,) + column.shape[1:], dtype=column.dtype)
+            new[:self._capacity] = column
+            return new
+
+        self.ids = resized(self.ids)
+        self.user_index = resized(self.user_index)
+        self.origin = resized(self.origin)
+        self.destination = resized(self.destination)
+        self.order_type = resized(self.order_type)
+        self.creation_ts = resized(self.creation_ts)
+        self.sent_ts = resized(self.sent_ts)
+        self.expire_ts = resized(self.expire_ts)
+        self.active = resized(self.active)
+        self._capacity = capacity
+
+    def __len__(self):
+        return len(self._slot_by_id)
+
+    def __contains__(self, order_id):
+        return order_id in self._slot_by_id
+
+    def slot_of(self, order_id):
+        return self._slot_by_id[order_id]
+
+    @property
+    def version(self):
+        return self._changes_base + len(self._changes)
+
+    def _log_change(self, order_id, added):
+        if len(self._changes) >= self.change_log_size:
+            # Отбрасываем старшую половину журнала
+            drop = len(self._changes) // 2
+            del self._changes[:drop]
+            self._changes_base += drop
+        self._changes.append((order_id, added))
+
+    def changes_since(self, version):
+        """
+        Дельта активных заказов с версии version: (текущая версия, добавленные id, удалённые id).
+        Заказ, добавленный и удалённый в этом промежутке, не попадает ни в один список.
+        Если журнал уже не покрывает version, возвращает None — нужен полный снимок.
+        """
+        if version < self._changes_base or version > self.version:
+            return None
+        state = {}
+        for order_id, added in self._changes[version - self._changes_base:]:
+            if state.get(order_id) is None:
+                state[order_id] = added
+            elif state[order_id] != added:
+                del state[order_id]  # Появился и исчез (или наоборот) — изменений нет
+        added = [order_id for order_id, was_added in state.items() if was_added]
+        removed = [order_id for order_id, was_added in state.items() if not was_added]
+        return self.version, np.array(added, dtype=np.int64), np.array(removed, dtype=np.int64)
+
+    def add(self, order_id, user_index, origin, destination, order_type, creation_ts, expire_ts, sent_ts=None):
+        """
+        Добавляет заказ и возвращает номер его слота.
+
+        creation_ts — время заказа по расписанию, sent_ts — когда он фактически ушёл в sink
+        (по умолчанию совпадает с creation_ts).
+        """
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            if self._high_water == self._capacity:
+                self._grow(max(2 * self._capacity, 16))
+            slot = self._high_water
+            self._high_water += 1
+        self.ids[slot] = order_id
+        self.user_index[slot] = user_index
+        self.origin[slot] = origin
+        self.destination[slot] = destination
+        self.order_type[slot] = ORDER_TYPE_CODES[order_type]
+        self.creation_ts[slot] = creation_ts
+        self.sent_ts[slot] = creation_ts if sent_ts is None else sent_ts
+        self.expire_ts[slot] = expire_ts
+        self.active[slot] = True
+        self._slot_by_id[order_id] = slot
+        self._log_change(order_id, True)
+        return slot
+
+    def remove(self, slot, finished_ts, outcome='expired'):
+        """
+        Освобождает слот и переносит заказ в историю.
+        """
+        self.history.append({
+            'id': int(self.ids[slot]),
+            'user_index': int(self.user_index[slot]),
+            'origin_x': float(self.origin[slot, 0]),
+            'origin_y': float(self.origin[slot, 1]),
+            'destination_x': float(self.destination[slot, 0]),
+            'destination_y': float(self.destination[slot, 1]),
+            'order_type': int(self.order_type[slot]),
+            'creation_ts': float(self.creation_ts[slot]),
+            'sent_ts': float(self.sent_ts[slot]),
+            'expire_ts': float(self.expire_ts[slot]),
+            'finished_ts': float(finished_ts),
+            'outcome': OUTCOME_CODES[outcome],
+        })
+        order_id = int(self.ids[slot])
+        del self._slot_by_id[order_id]
+        self.active[slot] = False
+        self._free_slots.append(slot)
+        self._log_change(order_id, False)
+
+    def active_slots(self):
+        """
+        Номера занятых слотов (в порядке слотов).
+        """
+        return np.flatnonzero(self.active[:self._high_water])
+
+    def columns(self):
+        """
+        Колонки без копирования: представления только для чтения над слотами [0, high_water)
+        плюс маска active. Представления действительны до следующего add (массивы могут вырасти).
+        """
+        views = {
+            'id': self.ids,
+            'user_index': self.user_index,
+            'origin': self.origin,
+            'destination': self.destination,
+            'order_type': self.order_type,
+            'creation_ts': self.creation_ts,
+            'sent_ts': self.sent_ts,
+            'expire_ts': self.expire_ts,
+            'active': self.active,
+        }
+        result = {}
+        for name, column in views.items():
+            view = column[:self._high_water]
+            view.flags.writeable = False
+            result[name] = view
+        return result
+
+
+class ActiveOrdersView(Sequence):
+    """
+    Неизменяемый снимок активных заказов на версии хранилища.
+
+    Числовые поля — массивы NumPy только для чтения; строковые поля (время создания,
+    остаток жизни) форматируются лениво — при обращении к заказу или в to_list().
+    Остаток жизни считается на момент обращения (now_ts()), поэтому снимок можно
+    держать, пока не изменится version.
+    """
+
+    def __init__(self, store, user_ids, now_ts, day_start_ts):
+        """
+        :param store: OrderStore, с которого снимается снимок.
+        :param user_ids: id пользователей по индексу.
+        :param now_ts: функция текущего игрового времени (сек эпохи).
+        :param day_start_ts: игровое время начала суток (для формата 'HH:MM:SS').
+        """
+        self.version = store.version
+        self.user_ids = user_ids
+        self._now_ts = now_ts
+        self._day_start_ts = day_start_ts
+        self._creation_times = None
+        self._static_rows = None
+
+        slots = store.active_slots()
+        self.ids = store.ids[slots]
+        self.user_index = store.user_index[slots]
+        self.origin = store.origin[slots]
+        self.destination = store.destination[slots]
+        self.order_type = store.order_type[slots]
+        self.creation_ts = store.creation_ts[slots]
+        self.expire_ts = store.expire_ts[slots]
+        for column in (self.ids, self.user_index, self.origin, self.destination,
+                       self.order_type, self.creation_ts, self.expire_ts):
+            column.flags.writeable = False
+
+    def __len__(self):
+        return len(self.ids)
+
+    def remaining_seconds(self):
+        """
+        Остаток жизни заказов (сек) на текущий момент.
+        """
+        return self.expire_ts - self._now_ts()
+
+    def _format_times(self, creation_ts):
+        seconds = np.floor(creation_ts - self._day_start_ts).astype(np.int64) % 86400
+        return [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in seconds.tolist()]
+
+    def creation_times(self):
+        """
+        Время создания заказов в формате 'HH:MM:SS' (вычисляется один раз на снимок).
+        """
+        if self._creation_times is None:
+            self._creation_times = self._format_times(self.creation_ts)
+        return self._creation_times
+
+    def _build_rows(self, idx, creation_times):
+        """
+        Неизменные поля заказов с индексами idx (массив индексов или срез).
+        """
+        names = [(name, ORDER_NAMES[name]) for name in ORDER_TYPES]
+        return [
+            {
+                'id': order_id,
+                'order_type': names[type_code][0],
+                'name': names[type_code][1],
+                'userID': self.user_ids[user_index],
+                'coords': tuple(origin),
+                'destination_coords': tuple(destination),
+                'creation_time': creation_time,
+            }
+            for order_id, type_code, user_index, origin, destination, creation_time in zip(
+                self.ids[idx].tolist(), self.order_type[idx].tolist(), self.user_index[idx].tolist(),
+                self.origin[idx].tolist(), self.destination[idx].tolist(), creation_times)
+        ]
+
+    def _rows(self):
+        """
+        Неизменные поля всех заказов (всё, кроме остатка жизни) — строятся один раз на снимок.
+        """
+        if self._static_rows is None:
+            self._static_rows = self._build_rows(slice(None), self.creation_times())
+        return self._static_rows
+
+    @staticmethod
+    def _remaining_strings(remaining):
+        minutes = (remaining // 60).astype(np.int64).tolist()
+        seconds = (remaining % 60).astype(np.int64).tolist()
+        return [f"{m} мин {s} сек" for m, s in zip(minutes, seconds)]
+
+    def __getitem__(self, i):
+        # Строятся только запрошенные строки (если все строки ещё не построены to_list())
+        if isinstance(i, slice):
+            idx = np.arange(*i.indices(len(self)))
+        else:
+            if i < 0:
+                i += len(self)
+            if not 0 <= i < len(self):
+                raise IndexError(i)
+            idx = np.array([i])
+        if self._static_rows is not None:
+            rows = [self._static_rows[j] for j in idx.tolist()]
+        else:
+            creation_times = self._format_times(self.creation_ts[idx])
+            rows = self._build_rows(idx, creation_times)
+        remaining = self._remaining_strings(self.expire_ts[idx] - self._now_ts())
+        orders = [dict(row, remaining_lifetime=r) for row, r in zip(rows, remaining)]
+        return orders if isinstance(i, slice) else orders[0]
+
+    def to_list(self):
+        """
+        Все заказы списком словарей (формат TaxiOrderSimulator.get_active_orders).
+        Каждый вызов возвращает новые словари; пересчитывается только остаток жизни.
+        """
+        remaining = self._remaining_strings(self.remaining_seconds())
+        return [dict(row, remaining_lifetime=r) for row, r in zip(self._rows(), remaining)]
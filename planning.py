@@ -0,0 +1,150 @@
+"""
+Упреждающее планирование заказов.
+
+OrderPlanner заранее (в фоновом потоке) готовит следующие заказы по расписаниям
+генерации: геометрию, время жизни, строки времени и тело запроса. Когда заказ наступает,
+симулятору остаётся выбрать свободного пользователя и отправить его.
+
+Заказы всех типов готовятся в одном потоке строго по возрастанию времени (при равенстве —
+в порядке типов в schedules), поэтому при заданном seed результат не зависит от того,
+успел ли фоновый поток подготовить заказ заранее или его пришлось готовить на месте.
+"""
+import logging
+import math
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class OrderPlanner:
+    """
+    Очереди подготовленных заказов по типам, пополняемые фоновым потоком.
+    """
+
+    def __init__(self, schedules, prepare, lookahead=256):
+        """
+        :param schedules: {тип заказа: расписание} (см. demand.FixedIntervalSchedule, demand.PoissonSchedule);
+                          расписаниями дальше распоряжается только планировщик.
+        :param prepare: функция (тип заказа, игровое время в сек от старта) -> словарь заказа.
+        :param lookahead: сколько заказов держать подготовленными; 0 — без фонового потока,
+                          каждый заказ готовится в момент, когда он нужен.
+        """
+        self.schedules = schedules
+        self.prepare = prepare
+        self.lookahead = lookahead
+        self._queues = {order_type: deque() for order_type in schedules}
+        self._queued = 0
+        self._exhausted = False
+        # _produce_lock — расписания и prepare; _cond — очереди (порядок захвата: _produce_lock -> _cond)
+        self._produce_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self.prepared = 0
+        self.prepared_inline = 0  # Подготовлено на месте (фоновый поток не успел или выключен)
+
+    def __len__(self):
+        return self._queued
+
+    def _produce(self, inline, wanted=None):
+        """
+        Готовит следующий по времени заказ. Возвращает False, если расписания исчерпаны
+        (или, если задан wanted, — если заказов типа wanted больше не будет).
+        """
+        with self._produce_lock:
+            if wanted is not None:
+                if self._queues[wanted]:
+                    return True  # Пока ждали блокировку, заказ подготовил фоновый поток
+                if math.isinf(self.schedules[wanted].next_time):
+                    return False  # Не готовим впустую заказы других типов
+            if self._exhausted:
+                return False
+            order_type = min(self.schedules, key=lambda name: self.schedules[name].next_time)
+            schedule = self.schedules[order_type]
+            due = schedule.next_time
+            if math.isinf(due):
+                self._exhausted = True
+                return False
+            # Расписание сдвигается только после удачной подготовки: если prepare упал
+            # в фоновом потоке, этот же заказ готовится на месте
+            order = self.prepare(order_type, due)
+            schedule.advance()
+            self.prepared += 1
+            self.prepared_inline += inline
+            with self._cond:
+                self._queues[order_type].append((due, order))
+                self._queued += 1
+        return True
+
+    def _head(self, order_type):
+        """
+        Ближайший подготовленный заказ типа order_type (готовится на месте, если очередь пуста) или None.
+        """
+        queue = self._queues[order_type]
+        while True:
+            with self._cond:
+                if queue:
+                    return queue[0]
+            if not self._produce(inline=True, wanted=order_type):
+                with self._cond:
+                    return queue[0] if queue else None
+
+    def next_time(self, order_type):
+        """
+        Игровое время (сек от старта) следующего заказа типа order_type или inf.
+        """
+        head = self._head(order_type)
+        return head[0] if head is not None else math.inf
+
+    def pop_due(self, order_type, game_time):
+        """
+        Забирает подготовленные заказы типа order_type со временем не позже game_time (по порядку).
+        """
+        due = []
+        queue = self._queues[order_type]
+        while True:
+            head = self._head(order_type)
+            if head is None or head[0] > game_time:
+                return due
+            with self._cond:
+                queue.popleft()
+                self._queued -= 1
+                self._cond.notify()
+            due.append(head[1])
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                while self._queued >= self.lookahead and not self._stop.is_set():
+                    self._cond.wait()
+            if self._stop.is_set():
+                return
+            try:
+                if not self._produce(inline=False):
+                    return
+            except Exception:
+                # Заказ подготовится на месте (и ошибка всплывёт там)
+                logger.exception("Order planning failed")
+                return
+
+    def start(self):
+        if self.lookahead > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="order-planner", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {
+            'queued': self._queued,
+            'prepared': self.prepared,
+            'prepared_inline': self.prepared_inline,
+        }
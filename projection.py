@@ -0,0 +1,98 @@
+"""
+Локальная метрическая проекция для перевода координат (lat, lon) в метры и обратно.
+"""
+import math
+
+import numpy as np
+import shapely
+
+# Средний радиус Земли (м)
+EARTH_RADIUS_M = 6371008.8
+
+# Множители перевода единиц расстояния в метры (параметр distance_units у TaxiOrderSimulator)
+DISTANCE_UNITS = {
+    'm': 1.0,
+    'km': 1000.0,
+}
+
+
+class LocalProjection:
+    """
+    Азимутальная равнопромежуточная проекция (сфера) с центром в заданной точке.
+
+    Расстояния от центра передаются точно, а в пределах города искажения расстояний
+    между любыми двумя точками пренебрежимо малы. Прямое и обратное преобразования
+    работают сразу с массивами NumPy.
+    """
+
+    def __init__(self, center_lat, center_lon, radius=EARTH_RADIUS_M):
+        self.center_lat = center_lat
+        self.center_lon = center_lon
+        self.radius = radius
+        self._lat0 = math.radians(center_lat)
+        self._lon0 = math.radians(center_lon)
+        self._sin_lat0 = math.sin(self._lat0)
+        self._cos_lat0 = math.cos(self._lat0)
+
+    @classmethod
+    def for_geometry(cls, geometry):
+        """
+        Проекция с центром в центроиде геометрии, заданной в координатах (lat, lon).
+        """
+        centroid = geometry.centroid
+        return cls(centroid.x, centroid.y)
+
+    def forward(self, lat, lon):
+        """
+        (lat, lon) в градусах -> (x, y) в метрах (x — на восток, y — на север).
+        """
+        lat = np.radians(np.asarray(lat, dtype=float))
+        dlon = np.radians(np.asarray(lon, dtype=float)) - self._lon0
+        sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+        cos_dlon = np.cos(dlon)
+        cos_c = np.clip(self._sin_lat0 * sin_lat + self._cos_lat0 * cos_lat * cos_dlon, -1.0, 1.0)
+        c = np.arccos(cos_c)
+        # k = c / sin(c), в центре проекции предел равен 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            k = np.where(c > 1e-12, c / np.sin(c), 1.0)
+        x = self.radius * k * cos_lat * np.sin(dlon)
+        y = self.radius * k * (self._cos_lat0 * sin_lat - self._sin_lat0 * cos_lat * cos_dlon)
+        return x, y
+
+    def inverse(self, x, y):
+        """
+        (x, y) в метрах -> (lat, lon) в градусах.
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        rho = np.hypot(x, y)
+        c = rho / self.radius
+        sin_c, cos_c = np.sin(c), np.cos(c)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lat = np.where(
+                rho > 0,
+                np.arcsin(np.clip(cos_c * self._sin_lat0 + y * sin_c * self._cos_lat0 / rho, -1.0, 1.0)),
+                self._lat0
+            )
+        lon = self._lon0 + np.arctan2(x * sin_c, rho * self._cos_lat0 * cos_c - y * self._sin_lat0 * sin_c)
+        return np.degrees(lat), np.degrees(lon)
+
+    def forward_points(self, points):
+        """
+        Массив (n, 2) точек (lat, lon) -> массив (n, 2) точек (x, y) в метрах.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        return np.column_stack(self.forward(points[:, 0], points[:, 1]))
+
+    def inverse_points(self, points):
+        """
+        Массив (n, 2) точек (x, y) в метрах -> массив (n, 2) точек (lat, lon).
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        return np.column_stack(self.inverse(points[:, 0], points[:, 1]))
+
+    def forward_geometry(self, geometry):
+        """
+        Проецирует shapely-геометрию в координатах (lat, lon) в метры (одним вызовом для всех вершин).
+        """
+        return shapely.transform(geometry, self.forward_points)
@@ -0,0 +1,203 @@
+"""
+Управление темпом создания заказов при перегрузке бэкенда.
+
+Если бэкенд тормозит, тик update() затягивается, и к следующему тику набегает пачка
+пропущенных по расписанию заказов, которая нагружает бэкенд ещё сильнее. RateController
+стоит между планировщиком и отправкой и по политике решает, что делать с заказами,
+опоздавшими больше чем на max_lag_seconds игрового времени:
+
+ - 'none'     — отправлять все (как раньше);
+ - 'drop'     — опоздавшие отбрасывать;
+ - 'coalesce' — из опоздавших за тик отправлять только последний, остальные отбрасывать;
+ - 'defer'    — отправлять не больше max_burst заказов за тик, остальные откладывать на следующие тики;
+ - 'aimd'     — держать темп отправки (заказов в секунду реального времени) не выше лимита,
+                который растёт линейно, пока CreateDrive отвечает быстро и без ошибок, и
+                уменьшается в decrease_factor раз при ошибке или задержке выше latency_target.
+
+У 'defer' и 'aimd' отложенные заказы ждут, пока опаздывают не больше чем на max_lag_seconds
+и ещё не истекли (expire_ts); остальные отбрасываются.
+
+Задержку и ошибки CreateDrive симулятор сообщает через observe(). Каждое решение
+считается в метрике rate_control_decisions_total{policy, decision, order_type}.
+"""
+import time
+from collections import deque
+
+POLICIES = ('none', 'drop', 'coalesce', 'defer', 'aimd')
+
+
+class RateController:
+    """
+    Допуск подготовленных заказов к отправке по выбранной политике.
+    """
+
+    def __init__(self, policy='none', metrics=None, max_lag_seconds=60.0, max_burst=10, max_backlog=1000,
+                 target_rate=10.0, min_rate=0.5, max_rate=None, additive_increase=1.0, decrease_factor=0.5,
+                 latency_target=0.5, ewma_alpha=0.2, cooldown_seconds=1.0, clock=time.monotonic):
+        """
+        :param policy: одна из POLICIES.
+        :param metrics: реестр метрик (metrics.Metrics) для решений; None — не писать.
+        :param max_lag_seconds: на сколько игровых секунд заказ может опоздать, не считаясь пропущенным.
+        :param max_burst: сколько заказов одного типа отправлять за тик (политика 'defer').
+        :param max_backlog: сколько отложенных заказов одного типа держать ('defer', 'aimd'); лишние отбрасываются.
+        :param target_rate: начальный лимит темпа, заказов в секунду реального времени ('aimd').
+        :param min_rate: нижняя граница лимита.
+        :param max_rate: верхняя граница лимита (None — без ограничения).
+        :param additive_increase: на сколько заказов/сек лимит растёт за секунду без перегрузки.
+        :param decrease_factor: во сколько раз уменьшать лимит при перегрузке.
+        :param latency_target: задержка CreateDrive (сек), выше которой бэкенд считается перегруженным.
+        :param ewma_alpha: вес нового значения в скользящих средних задержки и доли ошибок.
+        :param cooldown_seconds: не уменьшать лимит чаще, чем раз в столько секунд.
+        :param clock: источник реального времени (у симулятора — его часы, в том числе виртуальные).
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Неизвестная политика: {policy!r} (доступны: {', '.join(POLICIES)})")
+        self.policy = policy
+        self.metrics = metrics
+        self.max_lag_seconds = max_lag_seconds
+        self.max_burst = max_burst
+        self.max_backlog = max_backlog
+        self.limit = target_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.additive_increase = additive_increase
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.ewma_alpha = ewma_alpha
+        self.cooldown_seconds = cooldown_seconds
+        self.clock = clock
+
+        self._backlog = {}  # Тип заказа -> deque отложенных заказов
+        self._tokens = float(max_burst)
+        self._refilled_at = None
+        self._increased_at = None
+        self._decreased_at = None
+        self.latency_ewma = 0.0
+        self.error_rate = 0.0
+        self.decisions = {}  # Решение -> сколько раз
+
+    def _record(self, decision, order_type, count=1):
+        if not count:
+            return
+        self.decisions[decision] = self.decisions.get(decision, 0) + count
+        if self.metrics is not None:
+            self.metrics.inc('rate_control_decisions_total', count, policy=self.policy, decision=decision,
+                             order_type=order_type)
+
+    def backlog(self):
+        return sum(len(queue) for queue in self._backlog.values())
+
+    def admit(self, order_type, orders, now_ts):
+        """
+        Решает, какие из наступивших заказов (и ранее отложенных) отправить сейчас.
+
+        :param orders: заказы, время которых наступило (по возрастанию creation_ts).
+        :param now_ts: текущее игровое время (сек эпохи).
+        :return: список заказов к отправке.
+        """
+        if self.policy == 'none':
+            self._record('sent', order_type, len(orders))
+            return orders
+
+        if self.policy in ('drop', 'coalesce'):
+            late = [order for order in orders if now_ts - order['creation_ts'] > self.max_lag_seconds]
+            on_time = [order for order in orders if now_ts - order['creation_ts'] <= self.max_lag_seconds]
+            if self.policy == 'drop':
+                self._record('dropped', order_type, len(late))
+                admitted = on_time
+            else:
+                # Вместо пачки пропущенных — один заказ (самый поздний из них)
+                self._record('coalesced', order_type, max(len(late) - 1, 0))
+                admitted = late[-1:] + on_time
+            self._record('sent', order_type, len(admitted))
+            return admitted
+
+        # 'defer' и 'aimd': сначала отложенные ранее, потом новые
+        backlog = self._backlog.setdefault(order_type, deque())
+        backlog.extend(orders)
+        fresh = deque(order for order in backlog if self._fresh(order, now_ts))
+        stale = len(backlog) - len(fresh)
+        if stale:
+            self._backlog[order_type] = backlog = fresh
+            self._record('dropped', order_type, stale)
+        queued = min(len(orders), len(backlog))  # Сколько новых заказов осталось в очереди (они в её конце)
+        budget = self.max_burst if self.policy == 'defer' else self._take_tokens()
+        admitted = [backlog.popleft() for _ in range(min(budget, len(backlog)))]
+        if self.policy == 'aimd':
+            self._tokens -= len(admitted)
+        self._record('sent', order_type, len(admitted))
+        # Новые заказы стоят в конце очереди: отложены те из них, что в ней остались
+        self._record('deferred', order_type, min(queued, len(backlog)))
+        overflow = len(backlog) - self.max_backlog
+        if overflow > 0:
+            # Отбрасываем самые старые из отложенных
+            for _ in range(overflow):
+                backlog.popleft()
+            self._record('dropped', order_type, overflow)
+        return admitted
+
+    def _fresh(self, order, now_ts):
+        """
+        Можно ли ещё отправить заказ: он не истёк и опаздывает не больше чем на max_lag_seconds.
+        """
+        return now_ts < order['expire_ts'] and now_ts - order['creation_ts'] <= self.max_lag_seconds
+
+    def _take_tokens(self):
+        """
+        Пополняет "ведро" разрешений по текущему лимиту и возвращает, сколько заказов можно отправить.
+        """
+        now = self.clock()
+        if self._refilled_at is not None:
+            self._tokens = min(self._tokens + (now - self._refilled_at) * self.limit, max(self.limit, 1.0))
+        self._refilled_at = now
+        return int(self._tokens)
+
+    def observe(self, latency, ok=True):
+        """
+        Результат вызова CreateDrive: задержка (сек) и успех.
+        """
+        alpha = self.ewma_alpha
+        self.latency_ewma += alpha * (latency - self.latency_ewma)
+        self.error_rate += alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if self.policy != 'aimd':
+            return
+
+        now = self.clock()
+        if not ok or latency > self.latency_target:
+            if self._decreased_at is None or now - self._decreased_at >= self.cooldown_seconds:
+                self.limit = max(self.limit * self.decrease_factor, self.min_rate)
+                self._decreased_at = now
+                self._record('limit_decreased', 'any')
+        else:
+            if self._increased_at is not None:
+                self.limit += self.additive_increase * (now - self._increased_at)
+                if self.max_rate is not None:
+                    self.limit = min(self.limit, self.max_rate)
+        self._increased_at = now
+
+    def stats(self):
+        return {
+            'limit': self.limit if self.policy == 'aimd' else 0.0,
+            'backlog': self.backlog(),
+            'latency_ewma_seconds': self.latency_ewma,
+            'error_rate': self.error_rate,
+        }
+
+
+def make_rate_controller(spec, metrics=None, clock=None):
+    """
+    RateController по описанию: готовый объект, имя политики или словарь
+    {'policy': ..., <параметры RateController>}; None — политика 'none'.
+    clock (если задан и не указан в словаре) — источник времени для лимита 'aimd'.
+    """
+    if isinstance(spec, RateController):
+        if spec.metrics is None:
+            spec.metrics = metrics
+        return spec
+    if spec is None:
+        spec = 'none'
+    if isinstance(spec, str):
+        spec = {'policy': spec}
+    if clock is not None:
+        spec = {'clock': clock, **spec}
+    return RateController(metrics=metrics, **spec)
@@ -0,0 +1,328 @@
+"""
+Офлайн-рендеринг прогона в видео (MP4/GIF) или серию PNG без дисплея (бэкенд Agg).
+
+Источник — поток событий (JSONL / JSONL.gz от sinks.RecordingSink, в т.ч. сведённый
+zones.merge_event_logs) или история заказов (OrderHistory.to_dataframe, сохранённая в Parquet/CSV).
+Источник читается потоком, кадры рисуются параллельно в процессах-воркерах, а в очереди
+на отрисовку держится не больше нескольких кадров на воркер — память не растёт с длиной прогона.
+
+    python render.py run.jsonl.gz --output run.mp4 --frame-seconds 60 --fps 10
+    python render.py history.parquet --polygon zone.json --output frames/
+"""
+import argparse
+import collections
+import datetime
+import heapq
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import numpy as np
+import shapely
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from shapely.geometry import Polygon
+
+from orders import ORDER_TYPE_CODES
+from replay import read_events
+from visu import OrdersView
+
+logger = logging.getLogger(__name__)
+
+FRAME_PATTERN = "frame_%06d.png"
+
+# Кадров в очереди на каждый воркер (ограничивает память главного процесса)
+PENDING_PER_WORKER = 4
+
+
+# ---------------------------------
+#   Источники изменений
+# ---------------------------------
+# Источник — итератор (ts, key, row): row = (origin_x, origin_y, dest_x, dest_y, type_code)
+# для появившегося заказа и None для снятого.
+
+def read_meta(path):
+    """
+    Заголовок записи ({"event": "meta", ...}) или пустой словарь.
+    """
+    for event in read_events(path):
+        return event if event.get('event') == 'meta' else {}
+    return {}
+
+
+def event_log_changes(path):
+    """
+    Изменения набора активных заказов по потоку событий. Заказы разных зон
+    (сведённый лог) различаются по полю "zone"; голоса ("voted") набор не меняют.
+    """
+    for event in read_events(path):
+        kind = event.get('event')
+        if kind == 'created':
+            origin, destination = event['coords'], event['destination_coords']
+            yield event['ts'], (event.get('zone'), event['id']), (
+                origin[0], origin[1], destination[0], destination[1], ORDER_TYPE_CODES[event['order_type']])
+        elif kind in ('expired', 'accepted'):
+            yield event['ts'], (event.get('zone'), event['id']), None
+
+
+def _read_history(path):
+    import pandas as pd
+
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def history_changes(path):
+    """
+    Изменения по истории заказов: появление в creation_ts и снятие в finished_ts.
+    Таблица загружается в компактные массивы, а события порождаются лениво (слиянием
+    двух отсортированных по времени последовательностей).
+    """
+    df = _read_history(path)
+    rows = np.column_stack([df[name].to_numpy(dtype=float)
+                            for name in ('origin_x', 'origin_y', 'destination_x', 'destination_y')])
+    order_type = df['order_type']
+    if order_type.dtype.kind not in 'iu':
+        order_type = order_type.astype(str).map(ORDER_TYPE_CODES)
+    codes = order_type.to_numpy(dtype=np.int8)
+    created = df['creation_ts'].to_numpy(dtype=float)
+    finished = df['finished_ts'].to_numpy(dtype=float)
+    del df
+
+    def appeared():
+        for i in np.argsort(created, kind='stable'):
+            yield created[i], 0, int(i)
+
+    def finished_orders():
+        for i in np.argsort(finished, kind='stable'):
+            yield finished[i], 1, int(i)
+
+    # При равном времени заказ сначала появляется, потом снимается
+    for ts, removed, i in heapq.merge(appeared(), finished_orders()):
+        yield float(ts), i, None if removed else (*rows[i].tolist(), int(codes[i]))
+
+
+def open_changes(path):
+    if path.endswith(('.parquet', '.csv')):
+        return history_changes(path)
+    return event_log_changes(path)
+
+
+# ---------------------------------
+#   Кадры
+# ---------------------------------
+def frame_snapshots(changes, frame_seconds, start_ts=None, end_ts=None):
+    """
+    Снимки активных заказов (в формате visu.take_snapshot) через каждые frame_seconds
+    игрового времени. Генератор пар (номер кадра, снимок).
+    """
+    active = {}
+    frame_ts = start_ts
+    index = 0
+
+    def snapshot(ts):
+        values = np.array(list(active.values()), dtype=float).reshape(-1, 5)
+        return {
+            'origin': values[:, 0:2],
+            'destination': values[:, 2:4],
+            'order_type': values[:, 4].astype(np.int8),
+            'game_time': datetime.datetime.fromtimestamp(ts),
+        }
+
+    for ts, key, row in changes:
+        if frame_ts is None:
+            frame_ts = ts
+        while ts > frame_ts:
+            if end_ts is not None and frame_ts > end_ts:
+                return
+            yield index, snapshot(frame_ts)
+            index += 1
+            frame_ts += frame_seconds
+        if row is None:
+            active.pop(key, None)
+        else:
+            active[key] = row
+    if frame_ts is not None and (end_ts is None or frame_ts <= end_ts):
+        yield index, snapshot(frame_ts)
+
+
+def changes_bounds(changes):
+    """
+    Прямоугольник, покрывающий все точки заказов (отдельный проход по источнику).
+    """
+    minx = miny = np.inf
+    maxx = maxy = -np.inf
+    for _, _, row in changes:
+        if row is not None:
+            minx, maxx = min(minx, row[0], row[2]), max(maxx, row[0], row[2])
+            miny, maxy = min(miny, row[1], row[3]), max(maxy, row[1], row[3])
+    if minx > maxx:
+        raise ValueError("В источнике нет ни одного заказа")
+    return shapely.box(minx, miny, maxx, maxy)
+
+
+def load_polygon(value):
+    """
+    Полигон из геометрии shapely, списка координат, WKT или JSON-файла (список [lat, lon]).
+    """
+    if value is None or isinstance(value, shapely.Geometry):
+        return value
+    if isinstance(value, str):
+        if os.path.exists(value):
+            with open(value, "r", encoding="utf-8") as f:
+                return Polygon(json.load(f))
+        return shapely.from_wkt(value)
+    return Polygon(value)
+
+
+# ---------------------------------
+#   Воркеры
+# ---------------------------------
+_worker = {}
+
+
+def _init_worker(polygon_wkb, figsize, dpi, title, view_options):
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    ax.set_title(title)
+    ax.set_xlabel("Долгота (x)")
+    ax.set_ylabel("Широта (y)")
+    view = OrdersView(ax, shapely.from_wkb(polygon_wkb), **view_options)
+    # Без блиттинга все художники рисуются обычным savefig
+    for artist in view.artists():
+        artist.set_animated(False)
+    _worker.update(figure=figure, view=view)
+
+
+def _render_frame(task):
+    path, snapshot = task
+    _worker['view'].draw(snapshot)
+    _worker['figure'].savefig(path)
+    return path
+
+
+# ---------------------------------
+#   Сборка видео
+# ---------------------------------
+def _ffmpeg():
+    path = matplotlib.rcParams['animation.ffmpeg_path']
+    return shutil.which(path)
+
+
+def encode(frames_dir, output, fps):
+    """
+    Собирает кадры frames_dir/frame_XXXXXX.png в MP4 или GIF. Нужен ffmpeg; GIF без ffmpeg
+    собирается Pillow (все кадры в палитровом виде держатся в памяти).
+    """
+    pattern = os.path.join(frames_dir, FRAME_PATTERN)
+    ffmpeg = _ffmpeg()
+    if ffmpeg is not None:
+        command = [ffmpeg, '-y', '-loglevel', 'error', '-framerate', str(fps), '-i', pattern]
+        if output.endswith('.mp4'):
+            # Для yuv420p нужны чётные размеры кадра
+            command += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', '-c:v', 'libx264']
+        subprocess.run(command + [output], check=True)
+        return
+    if not output.endswith('.gif'):
+        raise RuntimeError("Для записи MP4 нужен ffmpeg (rcParams['animation.ffmpeg_path'])")
+
+    from PIL import Image
+
+    paths = sorted(os.path.join(frames_dir, name) for name in os.listdir(frames_dir) if name.endswith('.png'))
+    with Image.open(paths[0]) as first:
+        first.save(output, save_all=True, append_images=(Image.open(p) for p in paths[1:]),
+                   duration=round(1000 / fps), loop=0)
+
+
+# ---------------------------------
+#   Рендеринг
+# ---------------------------------
+def render(source, output, polygon=None, frame_seconds=60.0, fps=10, workers=None, start_ts=None, end_ts=None,
+           figsize=(8, 8), dpi=100, title="Taxi Orders Simulation", routes_threshold=2000, density_threshold=5000):
+    """
+    Рендерит прогон в output: *.mp4, *.gif или каталог для серии PNG.
+
+    :param source: поток событий (JSONL / JSONL.gz) или история заказов (Parquet / CSV).
+    :param polygon: полигон зоны (геометрия, координаты, WKT или JSON-файл). По умолчанию —
+        из заголовка записи, а если его нет — прямоугольник, охватывающий все заказы.
+    :param frame_seconds: шаг игрового времени между кадрами (сек).
+    :param fps: кадров в секунду видео.
+    :param workers: число процессов-воркеров (по умолчанию — число ядер; 0 — в текущем процессе).
+    :param start_ts: игровое время первого кадра (сек эпохи; по умолчанию — первое событие).
+    :param end_ts: игровое время, после которого кадры не рисуются.
+    :return: статистика {'frames', 'output', 'wall_seconds'}.
+    """
+    started = time.perf_counter()
+    polygon = load_polygon(polygon)
+    if polygon is None and not source.endswith(('.parquet', '.csv')):
+        polygon = load_polygon(read_meta(source).get('polygon'))
+    if polygon is None:
+        polygon = changes_bounds(open_changes(source))
+
+    video = output.endswith(('.mp4', '.gif'))
+    frames_dir = tempfile.mkdtemp(prefix="taxisim_frames_") if video else output
+    os.makedirs(frames_dir, exist_ok=True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    initargs = (shapely.to_wkb(polygon), figsize, dpi, title,
+                {'routes_threshold': routes_threshold, 'density_threshold': density_threshold})
+
+    frames = 0
+    tasks = (
+        (os.path.join(frames_dir, FRAME_PATTERN % index), snapshot)
+        for index, snapshot in frame_snapshots(open_changes(source), frame_seconds, start_ts, end_ts)
+    )
+    try:
+        if workers == 0:
+            _init_worker(*initargs)
+            for task in tasks:
+                _render_frame(task)
+                frames += 1
+        else:
+            with multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+                pending = collections.deque()
+                for task in tasks:
+                    pending.append(pool.apply_async(_render_frame, (task,)))
+                    if len(pending) >= workers * PENDING_PER_WORKER:
+                        pending.popleft().get()
+                        frames += 1
+                while pending:
+                    pending.popleft().get()
+                    frames += 1
+        logger.info("Rendered %d frames into %s", frames, frames_dir)
+        if video and frames:
+            encode(frames_dir, output, fps)
+    finally:
+        if video:
+            shutil.rmtree(frames_dir, ignore_errors=True)
+
+    return {'frames': frames, 'output': output, 'wall_seconds': time.perf_counter() - started}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Офлайн-рендеринг прогона в MP4/GIF или серию PNG")
+    parser.add_argument("source", help="поток событий (JSONL/JSONL.gz) или история (Parquet/CSV)")
+    parser.add_argument("--output", required=True, help="*.mp4, *.gif или каталог для PNG")
+    parser.add_argument("--polygon", default=None, help="JSON-файл со списком [lat, lon] или WKT")
+    parser.add_argument("--frame-seconds", type=float, default=60.0, help="игровых секунд между кадрами")
+    parser.add_argument("--fps", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--start-ts", type=float, default=None)
+    parser.add_argument("--end-ts", type=float, default=None)
+    parser.add_argument("--dpi", type=int, default=100)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    print(render(args.source, args.output, polygon=args.polygon, frame_seconds=args.frame_seconds, fps=args.fps,
+                 workers=args.workers, start_ts=args.start_ts, end_ts=args.end_ts, dpi=args.dpi))
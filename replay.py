@@ -0,0 +1,180 @@
+"""
+Воспроизведение записанного потока заказов (см. sinks.RecordingSink и record_path у TaxiOrderSimulator).
+
+Файл читается построчно, поэтому размер записи не ограничен памятью. Созданные заказы
+отправляются в приёмник заново (в API они получают новые b_id), просроченные — отменяются
+по новым id, принятые водителями — принимаются тем же водителем, голоса за заказы-голосования
+отправляются заново. Темп — исходный (игровое время / time_compression записи) или ускоренный.
+"""
+import argparse
+import datetime
+import json
+import logging
+import time
+
+import api
+from sinks import make_sink, open_event_log
+
+logger = logging.getLogger(__name__)
+
+
+def read_events(path):
+    """
+    Лениво читает события из JSONL-файла записи (строка-заголовок "meta" тоже возвращается).
+    """
+    with open_event_log(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class OrderReplayer:
+    """
+    Отправляет записанные заказы в приёмник с исходными интервалами между событиями.
+    """
+
+    def __init__(self, path, sink=None, speedup=1.0, clock=time.time, sleep=time.sleep):
+        """
+        :param path: файл записи (JSONL или JSONL.gz).
+        :param sink: приёмник заказов (по умолчанию — живой API).
+        :param speedup: во сколько раз быстрее исходного темпа; None — без пауз, как можно быстрее.
+        :param clock: источник реального времени.
+        :param sleep: функция ожидания (для тестов и дискретного режима).
+        """
+        self.path = path
+        self.sink = sink if sink is not None else make_sink('api')
+        self.speedup = speedup
+        self.clock = clock
+        self.sleep = sleep
+        self.meta = {}
+        self._ids = {}  # id заказа в записи -> id при воспроизведении
+        self.created = 0
+        self.cancelled = 0
+        self.accepted = 0
+        self.voted = 0
+        self.failed = 0
+        self.skipped = 0  # Отмены, принятия и голоса по заказам, которые не удалось создать
+        self.max_lag = 0.0  # Наибольшее отставание от расписания (сек)
+
+    def _order_from_created(self, event):
+        order = dict(event)
+        order['creation_ts'] = event['ts']
+        order['creation_time'] = datetime.datetime.fromisoformat(event['time'])
+        return order
+
+    def _order_from_expired(self, event, order_id):
+        return {
+            'id': order_id,
+            'expire_ts': event['ts'],
+            'expire_time': datetime.datetime.fromisoformat(event['time']),
+        }
+
+    def _order_from_driver_event(self, event, order_id):
+        return {
+            'id': order_id,
+            'action_ts': event['ts'],
+            'action_time': datetime.datetime.fromisoformat(event['time']),
+        }
+
+    def _wait_until(self, real_time):
+        delay = real_time - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+        else:
+            self.max_lag = max(self.max_lag, -delay)
+
+    def _handle(self, event):
+        if event['event'] == 'created':
+            try:
+                self._ids[event['id']] = self.sink.create_order(self._order_from_created(event))
+                self.created += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning("Replay->Order %s creation failed: %r", event['id'], e)
+        elif event['event'] == 'expired':
+            order_id = self._ids.pop(event['id'], None)
+            if order_id is None:
+                self.skipped += 1
+                return
+            try:
+                self.sink.cancel_order(self._order_from_expired(event, order_id), event.get('reason', "Order expired"))
+                self.cancelled += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning("Replay->Order %s cancellation failed: %r", order_id, e)
+        elif event['event'] == 'accepted':
+            order_id = self._ids.pop(event['id'], None)
+            if order_id is None:
+                self.skipped += 1
+                return
+            try:
+                self.sink.accept_order(self._order_from_driver_event(event, order_id), event['driver_id'])
+                self.accepted += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning("Replay->Order %s acceptance failed: %r", order_id, e)
+        elif event['event'] == 'voted':
+            # Голосование после голоса остаётся активным: его отмена придёт отдельным событием
+            order_id = self._ids.get(event['id'])
+            if order_id is None:
+                self.skipped += 1
+                return
+            try:
+                self.sink.vote_order(self._order_from_driver_event(event, order_id), event['driver_id'])
+                self.voted += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning("Replay->Order %s vote failed: %r", order_id, e)
+
+    def run(self, limit=None):
+        """
+        Воспроизводит запись (или первые limit событий) и возвращает статистику.
+        """
+        started = time.perf_counter()
+        first_ts = None
+        real_start = None
+        processed = 0
+        for event in read_events(self.path):
+            if event['event'] == 'meta':
+                self.meta = event
+                continue
+            if limit is not None and processed >= limit:
+                break
+            if first_ts is None:
+                first_ts = event['ts']
+                real_start = self.clock()
+            if self.speedup is not None:
+                rate = self.meta.get('time_compression', 1.0) * self.speedup
+                # События одного тика могут идти не строго по времени — тогда без паузы
+                self._wait_until(real_start + max(event['ts'] - first_ts, 0.0) / rate)
+            self._handle(event)
+            processed += 1
+
+        return {
+            'events': processed,
+            'created': self.created,
+            'cancelled': self.cancelled,
+            'accepted': self.accepted,
+            'voted': self.voted,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'max_lag_seconds': self.max_lag,
+            'wall_seconds': time.perf_counter() - started,
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Воспроизведение записанного потока заказов")
+    parser.add_argument("path")
+    parser.add_argument("--speedup", type=float, default=1.0,
+                        help="во сколько раз быстрее исходного темпа (0 — без пауз)")
+    parser.add_argument("--sink", default="api")
+    parser.add_argument("--url-prefix", default=None, help="например, адрес stub_server.py")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.url_prefix:
+        api.url_prefix = args.url_prefix
+    replayer = OrderReplayer(args.path, make_sink(args.sink), speedup=args.speedup or None)
+    print(replayer.run(args.limit))
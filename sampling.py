@@ -0,0 +1,483 @@
+"""
+Векторизованная генерация случайных точек внутри полигона зоны обслуживания.
+
+Все сэмплеры работают пачками: координаты генерируются массивами NumPy,
+а проверки "точка в полигоне" выполняются разом через векторные предикаты shapely 2.x.
+"""
+import math
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+
+class BoundingBoxSampler:
+    """
+    Метод "bounding box + проверка", но пачками.
+
+    Кандидаты генерируются в ограничивающем прямоугольнике полигона массивами NumPy
+    и проверяются одним вызовом shapely.contains_xy. Принятые точки складываются
+    в буфер, который пополняется по мере расхода.
+    """
+
+    def __init__(self, polygon, rng=None, batch_size=1024, max_rounds=10000):
+        """
+        :param polygon: shapely Polygon/MultiPolygon, внутри которого генерируются точки.
+        :param rng: numpy.random.Generator (по умолчанию — новый генератор).
+        :param batch_size: минимальный размер пачки кандидатов при пополнении буфера.
+        :param max_rounds: сколько раундов догенерации допускается, прежде чем сдаться.
+        """
+        self.polygon = polygon
+        shapely.prepare(self.polygon)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.batch_size = batch_size
+        self.max_rounds = max_rounds
+        self.bounds = self.polygon.bounds
+
+        # Буфер уже принятых точек и позиция чтения из него
+        self._buffer = np.empty((0, 2))
+        self._buffer_pos = 0
+
+        # Статистика отбора (пригодится для оценки размера следующих пачек)
+        self.candidates_drawn = 0
+        self.candidates_accepted = 0
+        self.dest_candidates_drawn = 0
+        self.dest_candidates_accepted = 0
+
+    def stats(self):
+        """
+        Счётчики отбора кандидатов (для метрик).
+        """
+        return {
+            'candidates_drawn': self.candidates_drawn,
+            'candidates_rejected': self.candidates_drawn - self.candidates_accepted,
+            'dest_candidates_drawn': self.dest_candidates_drawn,
+            'dest_candidates_rejected': self.dest_candidates_drawn - self.dest_candidates_accepted,
+        }
+
+    # ---------------------------------
+    #   Точки внутри полигона
+    # ---------------------------------
+    def _acceptance_ratio(self):
+        """
+        Оценка доли кандидатов, попадающих в полигон.
+        """
+        if self.candidates_drawn:
+            return max(self.candidates_accepted / self.candidates_drawn, 1e-6)
+        minx, miny, maxx, maxy = self.bounds
+        bbox_area = (maxx - minx) * (maxy - miny)
+        return max(self.polygon.area / bbox_area, 1e-6) if bbox_area > 0 else 1e-6
+
+    def _draw_candidates(self, n):
+        """
+        Генерирует n кандидатов в bounding box и возвращает только попавшие в полигон.
+        """
+        minx, miny, maxx, maxy = self.bounds
+        xs = self.rng.uniform(minx, maxx, n)
+        ys = self.rng.uniform(miny, maxy, n)
+        mask = shapely.contains_xy(self.polygon, xs, ys)
+        self.candidates_drawn += n
+        self.candidates_accepted += int(mask.sum())
+        return np.column_stack((xs[mask], ys[mask]))
+
+    def _refill(self, needed):
+        """
+        Пополняет буфер так, чтобы в нём было не меньше needed непрочитанных точек.
+        """
+        chunks = [self._buffer[self._buffer_pos:]]
+        available = len(chunks[0])
+        rounds = 0
+        while available < needed:
+            if rounds >= self.max_rounds:
+                raise RuntimeError("Не удалось сгенерировать точки внутри полигона")
+            missing = needed - available
+            n = max(self.batch_size, int(math.ceil(missing / self._acceptance_ratio() * 1.1)))
+            chunk = self._draw_candidates(n)
+            chunks.append(chunk)
+            available += len(chunk)
+            rounds += 1
+        self._buffer = np.concatenate(chunks)
+        self._buffer_pos = 0
+
+    def sample_points(self, n):
+        """
+        Возвращает массив (n, 2) равномерно распределённых точек внутри полигона.
+        """
+        if len(self._buffer) - self._buffer_pos < n:
+            self._refill(n)
+        points = self._buffer[self._buffer_pos:self._buffer_pos + n]
+        self._buffer_pos += n
+        return points
+
+    # ---------------------------------
+    #   Точки назначения в кольце расстояний
+    # ---------------------------------
+    def _dest_acceptance_ratio(self):
+        if self.dest_candidates_drawn:
+            return max(self.dest_candidates_accepted / self.dest_candidates_drawn, 1e-3)
+        return 0.25
+
+    def sample_destinations(self, origins, dmin, dmax):
+        """
+        Для каждой точки отправления подбирает точку внутри полигона,
+        расстояние до которой лежит в [dmin, dmax].
+
+        Каждой ещё не обслуженной точке отправления выдаётся своя порция кандидатов
+        из буфера; расстояния считаются одной матричной операцией, а в качестве
+        назначения берётся первый подходящий кандидат.
+        """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+        destinations = np.empty_like(origins)
+        pending = np.arange(len(origins))
+        rounds = 0
+        while len(pending):
+            if rounds >= self.max_rounds:
+                raise RuntimeError("Не удалось подобрать точку назначения в заданном диапазоне расстояний")
+            per_origin = min(int(math.ceil(2.0 / self._dest_acceptance_ratio())), 4096)
+            candidates = self.sample_points(len(pending) * per_origin).reshape(len(pending), per_origin, 2)
+            distances = np.hypot(candidates[:, :, 0] - origins[pending, None, 0],
+                                 candidates[:, :, 1] - origins[pending, None, 1])
+            valid = (distances >= dmin) & (distances <= dmax)
+            self.dest_candidates_drawn += valid.size
+            self.dest_candidates_accepted += int(valid.sum())
+
+            found = valid.any(axis=1)
+            first = valid.argmax(axis=1)
+            rows = np.nonzero(found)[0]
+            destinations[pending[rows]] = candidates[rows, first[rows]]
+            pending = pending[~found]
+            rounds += 1
+        return destinations
+
+    def sample_pairs(self, n, dmin, dmax):
+        """
+        Возвращает (origins, destinations) — два массива (n, 2) пар точек для заказов.
+        """
+        origins = self.sample_points(n).copy()
+        destinations = self.sample_destinations(origins, dmin, dmax)
+        return origins, destinations
+
+
+# ---------------------------------
+#   Триангуляция
+# ---------------------------------
+def fan_triangles(polygons):
+    """
+    Разбивает выпуклые полигоны на треугольники "веером" от первой вершины.
+    Возвращает (triangles, owner): массив (m, 3, 2) и индекс исходного полигона для каждого треугольника.
+    """
+    polygons = np.asarray(polygons, dtype=object)
+    if len(polygons) == 0:
+        return np.empty((0, 3, 2)), np.empty(0, dtype=np.intp)
+    coords, index = shapely.get_coordinates(shapely.get_exterior_ring(polygons), return_index=True)
+    counts = np.bincount(index, minlength=len(polygons))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    # Кольцо замкнуто: k различных вершин дают k + 1 координату и k - 2 треугольника
+    tri_counts = np.clip(counts - 3, 0, None)
+    owner = np.repeat(np.arange(len(polygons)), tri_counts)
+    local = np.arange(len(owner)) - np.repeat(np.cumsum(tri_counts) - tri_counts, tri_counts) + 1
+    a = starts[owner]
+    triangles = np.stack((coords[a], coords[a + local], coords[a + local + 1]), axis=1)
+    return triangles, owner
+
+
+def triangle_areas(triangles):
+    """
+    Площади треугольников из массива (m, 3, 2).
+    """
+    ab = triangles[:, 1] - triangles[:, 0]
+    ac = triangles[:, 2] - triangles[:, 0]
+    return 0.5 * np.abs(ab[:, 0] * ac[:, 1] - ab[:, 1] * ac[:, 0])
+
+
+def triangulate_polygon(polygon):
+    """
+    Точно разбивает полигон (в том числе с дырами и MultiPolygon) на треугольники.
+
+    Используется разбиение на вертикальные полосы по x-координатам вершин:
+    внутри полосы нет вершин полигона, поэтому каждый кусок пересечения полосы
+    с полигоном — выпуклая трапеция (или треугольник), которая режется "веером".
+    Возвращает массив (m, 3, 2).
+    """
+    xs = np.unique(shapely.get_coordinates(polygon)[:, 0])
+    _, miny, _, maxy = polygon.bounds
+    slabs = shapely.box(xs[:-1], miny, xs[1:], maxy)
+    pieces = shapely.get_parts(shapely.get_parts(shapely.intersection(slabs, polygon)))
+    pieces = pieces[(shapely.get_type_id(pieces) == 3) & (shapely.area(pieces) > 0)]
+    triangles, _ = fan_triangles(pieces)
+    return triangles[triangle_areas(triangles) > 0]
+
+
+def orient_ccw(triangles):
+    """
+    Переупорядочивает вершины треугольников (m, 3, 2) против часовой стрелки (на месте).
+    """
+    ab = triangles[:, 1] - triangles[:, 0]
+    ac = triangles[:, 2] - triangles[:, 0]
+    clockwise = ab[:, 0] * ac[:, 1] - ab[:, 1] * ac[:, 0] < 0
+    triangles[clockwise] = triangles[clockwise][:, [0, 2, 1]]
+    return triangles
+
+
+def points_in_triangles(triangles, rng):
+    """
+    Равномерно генерирует по одной точке в каждом треугольнике массива (m, 3, 2).
+    """
+    u = rng.random((len(triangles), 2))
+    # Точки из "отражённой" половины параллелограмма переносим обратно в треугольник
+    outside = u.sum(axis=1) > 1
+    u[outside] = 1 - u[outside]
+    a = triangles[:, 0]
+    return a + u[:, :1] * (triangles[:, 1] - a) + u[:, 1:] * (triangles[:, 2] - a)
+
+
+def clip_convex_by_triangles(polygons, counts, triangles):
+    """
+    Отсекает выпуклые многоугольники треугольниками (алгоритм Сазерленда — Ходжмана, векторно).
+
+    :param polygons: массив (m, k, 2) вершин против часовой стрелки, дополненный до k слотов.
+    :param counts: массив (m,) — число вершин каждого многоугольника.
+    :param triangles: массив (m, 3, 2) треугольников против часовой стрелки.
+    :return: (polygons, counts, rows) — непустые пересечения в том же формате (k + 3 слота)
+             и индексы исходных многоугольников, к которым они относятся.
+    """
+    rows = np.arange(len(polygons))
+    for edge in range(3):
+        a = triangles[rows, edge][:, None, :]
+        b = triangles[rows, (edge + 1) % 3][:, None, :]
+        m, slots = polygons.shape[:2]
+        index = np.arange(slots)[None, :]
+        valid = index < counts[:, None]
+        nxt = polygons[np.arange(m)[:, None], np.where(index + 1 < counts[:, None], index + 1, 0)]
+
+        # Знак векторного произведения: >= 0 — вершина по внутреннюю сторону ребра
+        ex, ey = b[..., 0] - a[..., 0], b[..., 1] - a[..., 1]
+        side_p = ex * (polygons[..., 1] - a[..., 1]) - ey * (polygons[..., 0] - a[..., 0])
+        side_q = ex * (nxt[..., 1] - a[..., 1]) - ey * (nxt[..., 0] - a[..., 0])
+        keep = valid & (side_p >= 0)
+        cross = valid & ((side_p >= 0) != (side_q >= 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = np.where(cross, side_p / (side_p - side_q), 0.0)
+        crossing = polygons + t[..., None] * (nxt - polygons)
+
+        # Каждая вершина даёт до двух выходных точек: себя и точку пересечения ребра;
+        # выпуклый многоугольник после отсечения полуплоскостью получает не больше одной новой вершины
+        candidates = np.stack((polygons, crossing), axis=2).reshape(m, 2 * slots, 2)
+        mask = np.stack((keep, cross), axis=2).reshape(m, 2 * slots)
+        counts = mask.sum(axis=1)
+        out_rows, out_cols = np.nonzero(mask)
+        positions = (np.cumsum(mask, axis=1) - 1)[out_rows, out_cols]
+        clipped = np.zeros((m, slots + 1, 2))
+        clipped[out_rows, positions] = candidates[out_rows, out_cols]
+
+        # Пустые пересечения дальше не обрабатываем
+        alive = counts >= 3
+        polygons, counts, rows = clipped[alive], counts[alive], rows[alive]
+    return polygons, counts, rows
+
+
+def fan_padded(polygons, counts):
+    """
+    Разбивает выпуклые многоугольники в формате (m, k, 2) + counts на треугольники "веером".
+    Возвращает (triangles, owner).
+    """
+    fan = np.arange(1, max(polygons.shape[1] - 1, 1))
+    valid = fan[None, :] <= (counts[:, None] - 2)
+    owner, local = np.nonzero(valid)
+    local = fan[local]
+    triangles = np.stack((polygons[owner, 0], polygons[owner, local], polygons[owner, local + 1]), axis=1)
+    return triangles, owner
+
+
+class TriangulatedSampler:
+    """
+    Точный сэмплер без отбраковки.
+
+    Полигон один раз триангулируется при создании, по площадям треугольников строится
+    кумулятивная таблица: точка генерируется выбором треугольника пропорционально площади
+    и равномерной точкой внутри него.
+
+    Точки назначения берутся из пересечения кольца [dmin, dmax] вокруг точки отправления
+    с полигоном. Кольцо аппроксимируется annulus_segments выпуклыми трапециями,
+    внутренний радиус которых слегка увеличен, так что каждая сгенерированная точка
+    гарантированно лежит в диапазоне расстояний.
+
+    Сначала для каждой точки отправления генерируется annulus_candidates равномерных
+    точек в кольце и берётся первая, попавшая в полигон, — это равномерная точка
+    пересечения. Точное отсечение секторов треугольниками полигона выполняется только
+    для тех точек отправления, у которых ни один кандидат не попал в полигон.
+    """
+
+    def __init__(self, polygon, rng=None, annulus_segments=32, annulus_candidates=8, max_rounds=1000):
+        """
+        :param polygon: shapely Polygon/MultiPolygon (дыры поддерживаются).
+        :param rng: numpy.random.Generator (по умолчанию — новый генератор).
+        :param annulus_segments: на сколько секторов разбивать кольцо расстояний.
+        :param annulus_candidates: сколько кандидатов в кольце проверять на точку отправления
+                                   до перехода к точному отсечению.
+        :param max_rounds: сколько раз допускается перевыбрать точку отправления,
+                           у которой в кольце расстояний нет ни одной точки полигона.
+        """
+        self.polygon = polygon
+        shapely.prepare(self.polygon)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.annulus_segments = annulus_segments
+        self.annulus_candidates = annulus_candidates
+        self.max_rounds = max_rounds
+
+        # === Триангуляция и таблица накопленных площадей ===
+        # Треугольники ориентированы против часовой стрелки (нужно для отсечения)
+        self.triangles = orient_ccw(triangulate_polygon(self.polygon))
+        self.cumulative_areas = np.cumsum(triangle_areas(self.triangles))
+        self.total_area = self.cumulative_areas[-1]
+        self._triangle_geoms = shapely.polygons(np.concatenate((self.triangles, self.triangles[:, :1]), axis=1))
+        self._tree = STRtree(self._triangle_geoms)
+
+        angles = np.linspace(0.0, 2 * math.pi, annulus_segments + 1)
+        self._unit_circle = np.column_stack((np.cos(angles), np.sin(angles)))
+
+        # Точки отправления, перевыбранные из-за недостижимого диапазона расстояний
+        self.origin_retries = 0
+        # Точки отправления, для которых понадобилось точное отсечение кольца
+        self.annulus_clipped = 0
+
+    def stats(self):
+        """
+        Счётчики перевыбора точек (для метрик).
+        """
+        return {'origin_retries': self.origin_retries, 'annulus_clipped': self.annulus_clipped}
+
+    def sample_points(self, n):
+        """
+        Возвращает массив (n, 2) равномерно распределённых точек внутри полигона.
+        """
+        chosen = np.searchsorted(self.cumulative_areas, self.rng.random(n) * self.total_area, side='right')
+        chosen = np.minimum(chosen, len(self.triangles) - 1)
+        return points_in_triangles(self.triangles[chosen], self.rng)
+
+    def _annulus_sectors(self, origins, dmin, dmax):
+        """
+        Строит для каждой точки отправления annulus_segments выпуклых секторов кольца [dmin, dmax].
+        """
+        # Внутренние хорды не должны заходить внутрь окружности радиуса dmin
+        inner_radius = dmin / math.cos(math.pi / self.annulus_segments)
+        inner = origins[:, None, :] + inner_radius * self._unit_circle[None, :, :]
+        outer = origins[:, None, :] + dmax * self._unit_circle[None, :, :]
+        # Вершины каждого сектора идут против часовой стрелки
+        return np.stack((inner[:, :-1], outer[:, :-1], outer[:, 1:], inner[:, 1:]), axis=2).reshape(-1, 4, 2)
+
+    def _sample_annulus(self, origins, dmin, dmax):
+        """
+        Возвращает (destinations, ok): точки назначения и маску точек отправления,
+        у которых пересечение кольца с полигоном не пусто.
+        """
+        n = len(origins)
+        k = self.annulus_candidates
+        destinations = np.full((n, 2), np.nan)
+        ok = np.zeros(n, dtype=bool)
+        if k > 0 and n > 0:
+            # Все секторы конгруэнтны и равны по площади: сектор выбирается равновероятно,
+            # точка в нём — через одну из двух половин трапеции пропорционально площади
+            sector = self._annulus_sectors(np.zeros((1, 2)), dmin, dmax)
+            halves = np.stack((sector[:, [0, 1, 2]], sector[:, [0, 2, 3]]), axis=1)
+            areas = triangle_areas(halves[0])
+            half = (self.rng.random(n * k) * areas.sum() >= areas[0]).astype(int)
+            turn = self.rng.integers(self.annulus_segments, size=n * k)
+            local = points_in_triangles(halves[turn, half], self.rng)
+            candidates = np.repeat(origins, k, axis=0) + local
+            hits = shapely.contains_xy(self.polygon, candidates[:, 0], candidates[:, 1]).reshape(n, k)
+            ok = hits.any(axis=1)
+            first = hits.argmax(axis=1)
+            destinations[ok] = candidates.reshape(n, k, 2)[ok, first[ok]]
+
+        missed = np.nonzero(~ok)[0]
+        if len(missed):
+            self.annulus_clipped += len(missed)
+            destinations[missed], ok[missed] = self._clip_annulus(origins[missed], dmin, dmax)
+        return destinations, ok
+
+    def _clip_annulus(self, origins, dmin, dmax):
+        """
+        Точный вариант _sample_annulus: отсекает секторы кольца треугольниками полигона
+        и выбирает точку пропорционально площади пересечения.
+        """
+        n = len(origins)
+        sectors = self._annulus_sectors(origins, dmin, dmax)
+        sector_owner = np.repeat(np.arange(n), self.annulus_segments)
+
+        # Секторы целиком внутри полигона берём как есть, пограничные режем по треугольникам
+        inside = shapely.contains(self.polygon, shapely.polygons(sectors))
+        border = np.nonzero(~inside)[0]
+        bboxes = shapely.box(sectors[border, :, 0].min(axis=1), sectors[border, :, 1].min(axis=1),
+                             sectors[border, :, 0].max(axis=1), sectors[border, :, 1].max(axis=1))
+        sector_idx, triangle_idx = self._tree.query(bboxes)
+        pieces, counts, piece_idx = clip_convex_by_triangles(
+            sectors[border][sector_idx],
+            np.full(len(sector_idx), 4),
+            self.triangles[triangle_idx]
+        )
+
+        inner_triangles, inner_idx = fan_padded(sectors[inside], np.full(int(inside.sum()), 4))
+        clipped_triangles, clipped_idx = fan_padded(pieces, counts)
+        triangles = np.concatenate((inner_triangles, clipped_triangles))
+        tri_owner = np.concatenate((sector_owner[inside][inner_idx], sector_owner[border][sector_idx][piece_idx][clipped_idx]))
+
+        # Выбор треугольника пропорционально площади — отдельно для каждой точки отправления
+        order = np.argsort(tri_owner, kind='stable')
+        triangles, tri_owner = triangles[order], tri_owner[order]
+        cumulative = np.cumsum(triangle_areas(triangles))
+        totals = np.bincount(tri_owner, weights=triangle_areas(triangles), minlength=n)
+        offsets = np.cumsum(totals) - totals
+        ok = totals > 0
+
+        destinations = np.full((n, 2), np.nan)
+        if ok.any():
+            targets = offsets[ok] + self.rng.random(int(ok.sum())) * totals[ok]
+            chosen = np.searchsorted(cumulative, targets, side='right')
+            chosen = np.minimum(chosen, len(triangles) - 1)
+            destinations[ok] = points_in_triangles(triangles[chosen], self.rng)
+        return destinations, ok
+
+    def sample_destinations(self, origins, dmin, dmax):
+        """
+        Для каждой точки отправления генерирует точку внутри полигона на расстоянии [dmin, dmax].
+        """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+        destinations, ok = self._sample_annulus(origins, dmin, dmax)
+        if not ok.all():
+            raise ValueError("Для части точек отправления в полигоне нет точек на расстоянии [dmin, dmax]")
+        return destinations
+
+    def sample_pairs(self, n, dmin, dmax):
+        """
+        Возвращает (origins, destinations) — два массива (n, 2) пар точек для заказов.
+        Точки отправления, из которых диапазон расстояний недостижим, перевыбираются.
+        """
+        origins = self.sample_points(n)
+        destinations, ok = self._sample_annulus(origins, dmin, dmax)
+        rounds = 0
+        while not ok.all():
+            if rounds >= self.max_rounds:
+                raise RuntimeError("Не удалось подобрать пары точек в заданном диапазоне расстояний")
+            retry = np.nonzero(~ok)[0]
+            self.origin_retries += len(retry)
+            origins[retry] = self.sample_points(len(retry))
+            destinations[retry], ok[retry] = self._sample_annulus(origins[retry], dmin, dmax)
+            rounds += 1
+        return origins, destinations
+
+
+# Доступные методы генерации точек (параметр sampling_method у TaxiOrderSimulator)
+SAMPLERS = {
+    'triangulation': TriangulatedSampler,
+    'bbox': BoundingBoxSampler,
+}
+
+
+def make_sampler(method, polygon, rng=None):
+    """
+    Создаёт сэмплер по имени метода из SAMPLERS.
+    """
+    if method not in SAMPLERS:
+        raise ValueError(f"Неизвестный метод генерации точек: {method!r} (доступны: {', '.join(SAMPLERS)})")
+    return SAMPLERS[method](polygon, rng=rng)
@@ -0,0 +1,159 @@
+"""
+Декларативные сценарии прогонов: файлы JSON, TOML или YAML (для YAML нужен PyYAML).
+
+Сценарий состоит из разделов:
+
+    name = "city_rush"                 # по умолчанию — имя файла
+
+    [users]
+    count = 200                        # сколько пользователей
+    cache_file = "users.json"          # кэш синхронизированных пользователей (необязательно)
+    sync = false                       # true — синхронизировать с API, false — make_local();
+                                       # по умолчанию — синхронизировать, если приёмник сетевой
+
+    [simulator]                        # параметры TaxiOrderSimulator
+    polygon = [[30.43, -9.61], ...]    # или polygon_file = "zone.json" (путь от файла сценария)
+    regular_frequency = 60
+    time_compression = 15.0
+    time_shift_minutes = 180
+    drivers = 1000                     # или [simulator.drivers] с параметрами drivers.DriverFleet
+                                       # (и cache_file — кэш водителей, синхронизированных с API:
+                                       # при сетевом приёмнике водители регистрируются в API)
+
+    [run]
+    mode = "discrete"                  # "discrete" (виртуальное время) или "realtime"
+    hours = 1.0                        # длительность (по умолчанию simulator.simulation_hours)
+    sink = "stub"                      # "fake", "api" или "stub" (локальный stub_server)
+    tick_seconds = 1.0                 # пауза между update() в режиме realtime
+    [run.stub]                         # параметры StubServer
+    latency_ms = 20
+
+    [sweep]                            # сетка параметров: ключ — путь через точку
+    "simulator.regular_frequency" = [60, 600, 3600]
+    "run.stub.latency_ms" = [0, 20, 100]
+
+Сетка разворачивается в декартово произведение вариантов (expand_sweep); прогон вариантов —
+sweep.py.
+"""
+import copy
+import itertools
+import json
+import os
+
+from main import DriversList, TaxiOrderSimulator, UsersList
+
+SECTIONS = ('name', 'users', 'simulator', 'run', 'sweep')
+
+
+def load_scenario(path):
+    """
+    Читает сценарий из файла (.json, .toml, .yaml/.yml) и возвращает словарь.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.json':
+        with open(path, "r", encoding="utf-8") as f:
+            scenario = json.load(f)
+    elif ext == '.toml':
+        import tomllib
+
+        with open(path, "rb") as f:
+            scenario = tomllib.load(f)
+    elif ext in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError as e:
+            raise ImportError("Для сценариев в YAML нужен PyYAML (pip install pyyaml)") from e
+        with open(path, "r", encoding="utf-8") as f:
+            scenario = yaml.safe_load(f)
+    else:
+        raise ValueError(f"Неизвестный формат сценария: {path!r} (нужен .json, .toml или .yaml)")
+
+    unknown = set(scenario) - set(SECTIONS)
+    if unknown:
+        raise ValueError(f"Неизвестные разделы сценария {path!r}: {', '.join(sorted(unknown))}")
+    scenario.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+
+    simulator = scenario.setdefault('simulator', {})
+    polygon_file = simulator.pop('polygon_file', None)
+    if polygon_file is not None:
+        with open(os.path.join(os.path.dirname(os.path.abspath(path)), polygon_file), "r", encoding="utf-8") as f:
+            simulator['polygon'] = json.load(f)
+    if 'polygon' not in simulator:
+        raise ValueError(f"В сценарии {path!r} не задан полигон (simulator.polygon или simulator.polygon_file)")
+    return scenario
+
+
+def set_path(scenario, path, value):
+    """
+    Записывает значение по пути через точку ('run.stub.latency_ms'), создавая промежуточные разделы.
+    """
+    *parents, key = path.split('.')
+    node = scenario
+    for name in parents:
+        node = node.setdefault(name, {})
+    node[key] = value
+
+
+def expand_sweep(scenario):
+    """
+    Разворачивает сетку sweep в список вариантов — копий сценария без раздела sweep,
+    с полями 'variant' (строка вида 'regular_frequency=60,latency_ms=20') и 'params'.
+    """
+    sweep = scenario.get('sweep') or {}
+    base = {k: v for k, v in scenario.items() if k != 'sweep'}
+    paths = list(sweep)
+    variants = []
+    for values in itertools.product(*(sweep[path] for path in paths)):
+        variant = copy.deepcopy(base)
+        params = dict(zip(paths, values))
+        for path, value in params.items():
+            set_path(variant, path, value)
+        variant['params'] = params
+        variant['variant'] = ",".join(f"{path.rsplit('.', 1)[-1]}={value}" for path, value in params.items()) or "base"
+        variants.append(variant)
+    return variants
+
+
+def build_users(scenario, sync=None):
+    """
+    UsersList по разделу users: синхронизированный с API или локальный.
+
+    :param sync: синхронизировать ли с API, если в сценарии не задано users.sync.
+    """
+    spec = scenario.get('users', {})
+    users = UsersList(user_count=spec.get('count', 10), cache_file=spec.get('cache_file'))
+    if spec.get('sync', sync):
+        users.sync(workers=spec.get('sync_workers', 8))
+    else:
+        users.make_local()
+    return users
+
+
+def build_drivers(spec, sync=False):
+    """
+    Параметры парка водителей (drivers.DriverFleet) по разделу simulator.drivers — числу
+    водителей или словарю. При sync=True водители синхронизируются с API (main.DriversList),
+    и их id подставляются в driver_ids.
+    """
+    spec = {'count': spec} if isinstance(spec, int) else dict(spec)
+    cache_file = spec.pop('cache_file', None)
+    workers = spec.pop('sync_workers', 8)
+    if sync and spec.get('driver_ids') is None:
+        drivers = DriversList(user_count=spec.get('count', 100), cache_file=cache_file)
+        drivers.sync(workers=workers)
+        spec['driver_ids'] = drivers.get_user_ids()
+    return spec
+
+
+def build_simulator(scenario, users_list, **overrides):
+    """
+    TaxiOrderSimulator по разделу simulator; overrides (sink, clock, metrics, ...) имеют приоритет.
+    Если приёмник сетевой, водители парка (simulator.drivers) синхронизируются с API.
+    """
+    kwargs = dict(scenario['simulator'])
+    kwargs['polygon_coords'] = [tuple(point) for point in kwargs.pop('polygon')]
+    kwargs.update(overrides)
+    if kwargs.get('drivers') is not None:
+        sink = kwargs.get('sink')  # None — живой API (ApiOrderSink по умолчанию)
+        kwargs['drivers'] = build_drivers(kwargs['drivers'], sync=sink is None or sink.remote)
+    return TaxiOrderSimulator(users_list=users_list, **kwargs)
@@ -0,0 +1,321 @@
+"""
+Приёмники заказов (sinks): куда симулятор отправляет созданные и просроченные заказы.
+
+ - ApiOrderSink — живой API (или локальный stub_server.StubServer, если направить на него api.url_prefix);
+ - FakeOrderSink — фейковый бэкенд в том же процессе;
+ - RecordingSink — запись потока событий в JSONL-файл поверх любого другого приёмника;
+ - JsonlOrderSink — только запись потока событий в файл.
+
+Приёмник реализует методы:
+ - create_order(order) -> id заказа (b_id),
+ - cancel_order(order, reason),
+ - accept_order(order, driver_id) — водитель берёт заказ (см. drivers.py),
+ - vote_order(order, driver_id) — водитель голосует за заказ-голосование,
+и их асинхронные варианты create_order_async / cancel_order_async / accept_order_async /
+vote_order_async (по умолчанию они просто вызывают синхронные методы).
+"""
+import gzip
+import itertools
+import json
+import threading
+
+from api import (AcceptDrive, CancelDrive, CreateDrive, VoteDrive, AsyncAcceptDrive, AsyncCancelDrive,
+                 AsyncCreateDrive, AsyncVoteDrive)
+
+
+def open_event_log(path, mode="r"):
+    """
+    Открывает JSONL-файл событий как текстовый; файлы .gz — через gzip.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def create_drive_args(order):
+    """
+    Аргументы CreateDrive для подготовленного заказа (с заранее собранным полем data, если оно есть).
+    """
+    return (order['userID'],
+            order['coords'][0],
+            order['coords'][1],
+            order['destination_coords'][0],
+            order['destination_coords'][1],
+            order['start_datetime'],
+            order['waiting'],
+            1,
+            order['services'],
+            order.get('data_json'))
+
+
+def _checked(response):
+    """
+    Ответ API с проверкой статуса (ошибка, например "drive not found", -> RuntimeError).
+    """
+    if not isinstance(response, dict) or response.get("status") != "success":
+        raise RuntimeError(f"API error: {response!r}")
+    return response
+
+
+class OrderSink:
+    """
+    Базовый приёмник заказов.
+    """
+
+    # True — вызовы идут по сети (их стоит выполнять параллельно, см. expiry.ExpiryPipeline)
+    remote = False
+
+    def create_order(self, order):
+        raise NotImplementedError
+
+    def cancel_order(self, order, reason):
+        raise NotImplementedError
+
+    def accept_order(self, order, driver_id):
+        raise NotImplementedError
+
+    def vote_order(self, order, driver_id):
+        raise NotImplementedError
+
+    async def create_order_async(self, order):
+        return self.create_order(order)
+
+    async def cancel_order_async(self, order, reason):
+        return self.cancel_order(order, reason)
+
+    async def accept_order_async(self, order, driver_id):
+        return self.accept_order(order, driver_id)
+
+    async def vote_order_async(self, order, driver_id):
+        return self.vote_order(order, driver_id)
+
+    def close(self):
+        pass
+
+
+class ApiOrderSink(OrderSink):
+    """
+    Живой API (CreateDrive / CancelDrive из api.py).
+    """
+
+    remote = True
+
+    def create_order(self, order):
+        response = _checked(CreateDrive(*create_drive_args(order)))
+        return response["data"]["b_id"]
+
+    def cancel_order(self, order, reason):
+        return _checked(CancelDrive(order['id'], reason))
+
+    def accept_order(self, order, driver_id):
+        return _checked(AcceptDrive(order['id'], driver_id))
+
+    def vote_order(self, order, driver_id):
+        return _checked(VoteDrive(order['id'], driver_id))
+
+    async def create_order_async(self, order):
+        response = _checked(await AsyncCreateDrive(*create_drive_args(order)))
+        return response["data"]["b_id"]
+
+    async def cancel_order_async(self, order, reason):
+        return _checked(await AsyncCancelDrive(order['id'], reason))
+
+    async def accept_order_async(self, order, driver_id):
+        return _checked(await AsyncAcceptDrive(order['id'], driver_id))
+
+    async def vote_order_async(self, order, driver_id):
+        return _checked(await AsyncVoteDrive(order['id'], driver_id))
+
+
+class FakeOrderSink(OrderSink):
+    """
+    Фейковый бэкенд в том же процессе: выдаёт последовательные b_id и ничего не отправляет.
+    Нужен, чтобы мерить производительность самого симулятора без сети.
+    """
+
+    def __init__(self, first_id=1):
+        self._ids = itertools.count(first_id)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.cancelled = 0
+        self.accepted = 0
+        self.voted = 0
+
+    def create_order(self, order):
+        with self._lock:
+            self.created += 1
+            return next(self._ids)
+
+    def cancel_order(self, order, reason):
+        with self._lock:
+            self.cancelled += 1
+
+    def accept_order(self, order, driver_id):
+        with self._lock:
+            self.accepted += 1
+
+    def vote_order(self, order, driver_id):
+        with self._lock:
+            self.voted += 1
+
+
+class RecordingSink(OrderSink):
+    """
+    Обёртка над другим приёмником: передаёт ему заказы и пишет поток событий в JSONL-файл.
+
+    Каждая строка — одно событие:
+     {"event": "created", "ts": <игровое время, сек эпохи>, "time": <игровое время ISO>, "id": ...,
+      "order_type": ..., "userID": ..., "coords": [lat, lon], "destination_coords": [lat, lon],
+      "start_datetime": ..., "waiting": ..., "services": [...]}
+     {"event": "expired", "ts": ..., "time": ..., "id": ..., "reason": ...}
+     {"event": "accepted", "ts": ..., "time": ..., "id": ..., "driver_id": ...}
+     {"event": "voted", "ts": ..., "time": ..., "id": ..., "driver_id": ...}
+    Если задан meta, первой строкой пишется {"event": "meta", ...} (без "ts").
+    Файлы с расширением .gz пишутся сжатыми. Поток можно воспроизвести через replay.OrderReplayer.
+    """
+
+    def __init__(self, inner, path, extra=None, meta=None, close_inner=True):
+        """
+        :param inner: приёмник, которому передаются заказы.
+        :param path: путь к JSONL-файлу событий (перезаписывается).
+        :param extra: словарь полей, добавляемых в каждое событие (например, {"zone": "center"}).
+        :param meta: параметры прогона для строки-заголовка (seed, time_compression, ...).
+        :param close_inner: закрывать ли inner в close() (False — если inner принадлежит вызывающему).
+        """
+        self.inner = inner
+        self.close_inner = close_inner
+        self.path = path
+        self.extra = extra or {}
+        self._file = open_event_log(path, "w")
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self.accepted = 0
+        self.voted = 0
+        if meta is not None:
+            self._write(dict(meta, event="meta"))
+
+    @property
+    def remote(self):
+        return self.inner.remote
+
+    def _write(self, event):
+        event.update(self.extra)
+        line = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def _created_event(self, order, order_id):
+        self.created += 1
+        return {
+            "event": "created",
+            "ts": order['creation_ts'],
+            "time": order['creation_time'].isoformat(),
+            "id": order_id,
+            "order_type": order['order_type'],
+            "userID": order['userID'],
+            "coords": list(order['coords']),
+            "destination_coords": list(order['destination_coords']),
+            "start_datetime": order['start_datetime'],
+            "waiting": order['waiting'],
+            "services": order['services'],
+        }
+
+    def _expired_event(self, order, reason):
+        self.expired += 1
+        return {
+            "event": "expired",
+            "ts": order['expire_ts'],
+            "time": order['expire_time'].isoformat(),
+            "id": order['id'],
+            "reason": reason,
+        }
+
+    def _driver_event(self, event, order, driver_id):
+        return {
+            "event": event,
+            "ts": order['action_ts'],
+            "time": order['action_time'].isoformat(),
+            "id": order['id'],
+            "driver_id": driver_id,
+        }
+
+    def _accepted_event(self, order, driver_id):
+        self.accepted += 1
+        return self._driver_event("accepted", order, driver_id)
+
+    def _voted_event(self, order, driver_id):
+        self.voted += 1
+        return self._driver_event("voted", order, driver_id)
+
+    def create_order(self, order):
+        order_id = self.inner.create_order(order)
+        self._write(self._created_event(order, order_id))
+        return order_id
+
+    def cancel_order(self, order, reason):
+        result = self.inner.cancel_order(order, reason)
+        self._write(self._expired_event(order, reason))
+        return result
+
+    def accept_order(self, order, driver_id):
+        result = self.inner.accept_order(order, driver_id)
+        self._write(self._accepted_event(order, driver_id))
+        return result
+
+    def vote_order(self, order, driver_id):
+        result = self.inner.vote_order(order, driver_id)
+        self._write(self._voted_event(order, driver_id))
+        return result
+
+    async def create_order_async(self, order):
+        order_id = await self.inner.create_order_async(order)
+        self._write(self._created_event(order, order_id))
+        return order_id
+
+    async def cancel_order_async(self, order, reason):
+        result = await self.inner.cancel_order_async(order, reason)
+        self._write(self._expired_event(order, reason))
+        return result
+
+    async def accept_order_async(self, order, driver_id):
+        result = await self.inner.accept_order_async(order, driver_id)
+        self._write(self._accepted_event(order, driver_id))
+        return result
+
+    async def vote_order_async(self, order, driver_id):
+        result = await self.inner.vote_order_async(order, driver_id)
+        self._write(self._voted_event(order, driver_id))
+        return result
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        if self.close_inner:
+            self.inner.close()
+
+
+class JsonlOrderSink(RecordingSink):
+    """
+    Пишет поток событий в JSONL-файл вместо API; id заказов выдаются последовательно
+    (RecordingSink поверх FakeOrderSink).
+    """
+
+    def __init__(self, path, first_id=1):
+        super().__init__(FakeOrderSink(first_id), path)
+
+
+# Приёмники, которые можно указать по имени (например, в настройках зон)
+SINKS = {
+    'api': ApiOrderSink,
+    'fake': FakeOrderSink,
+}
+
+
+def make_sink(name):
+    """
+    Создаёт приёмник по имени из SINKS.
+    """
+    if name not in SINKS:
+        raise ValueError(f"Неизвестный приёмник заказов: {name!r} (доступны: {', '.join(SINKS)})")
+    return SINKS[name]()
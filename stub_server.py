@@ -0,0 +1,194 @@
+"""
+Локальный HTTP-стаб бэкенда ibronevik для офлайн-нагрузочных тестов.
+
+Поддерживает тот же протокол, что использует api.py: auth, token, register,
+drive/ (создание заказа) и drive/get/<id> (получение, отмена, принятие водителем и голос
+водителя), с настраиваемой задержкой и долей ошибок. Принимать заказы и голосовать может
+только пользователь, зарегистрированный с ролью водителя (api.ROLE_DRIVER). Пример:
+
+    server = StubServer(latency_ms=50, error_rate=0.01).start()
+    api.url_prefix = server.url_prefix
+    ...
+    server.stop()
+
+или из командной строки: python stub_server.py --port 8080 --latency-ms 50 --error-rate 0.01
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from api import ROLE_DRIVER
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Ответ уходит одним пакетом: буферизованная запись и без алгоритма Нейгла
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status_code, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length") or 0)
+        params = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8"), keep_blank_values=True).items()}
+        path = self.path.split("?", 1)[0]
+        if not path.startswith(stub.path_prefix):
+            self._send_json(404, {"status": "error", "code": 404, "message": "not found"})
+            return
+        status_code, payload = stub.handle(path[len(stub.path_prefix):], params)
+        self._send_json(status_code, payload)
+
+    do_POST = _handle
+    do_GET = _handle
+
+
+class StubServer:
+    """
+    HTTP-стаб бэкенда. Хранит пользователей и заказы в памяти.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0, latency_jitter_ms=0.0, error_rate=0.0,
+                 path_prefix="/taxi/c/gruzvill/api/v1/", seed=None):
+        """
+        :param port: порт (0 — выбрать свободный).
+        :param latency_ms: задержка каждого ответа (мс).
+        :param latency_jitter_ms: случайная добавка к задержке, равномерно в [0, latency_jitter_ms] (мс).
+        :param error_rate: доля запросов, на которые отвечаем 500.
+        :param path_prefix: путь API (как в api.url_prefix).
+        """
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.path_prefix = path_prefix
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._user_ids = itertools.count(1)
+        self._drive_ids = itertools.count(1)
+        self.users = {}  # email -> пользователь
+        self.users_by_id = {}  # u_id -> пользователь
+        self.drives = {}  # b_id -> заказ
+        self.request_counts = {}
+
+        self._httpd = ThreadingHTTPServer((host, port), _StubHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = None
+
+    @property
+    def url_prefix(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{self.path_prefix}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="stub-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    # ---------------------------------
+    #   Обработка запросов
+    # ---------------------------------
+    def handle(self, endpoint, params):
+        """
+        Возвращает (HTTP-код, JSON-ответ) для запроса к endpoint (путь без path_prefix).
+        """
+        with self._lock:
+            key = "drive/get/<id>" if endpoint.startswith("drive/get/") else endpoint
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+            delay = (self.latency_ms + self._random.uniform(0, self.latency_jitter_ms)) / 1000
+            failed = self._random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            return 500, {"status": "error", "code": 500, "message": "stub: injected error"}
+
+        if endpoint == "auth":
+            return 200, {"status": "success", "auth_hash": "stub-auth-hash"}
+        if endpoint == "token":
+            if "auth_hash" in params:
+                return 200, {"status": "success", "data": {"token": "stub-token", "u_hash": "stub-u-hash"}}
+            with self._lock:
+                user = self.users.get(params.get("u_a_email"))
+            if user is None:
+                return 200, {"status": "error", "message": {"error": "user not found"}}
+            return 200, {"status": "success", "auth_user": user}
+        if endpoint == "register":
+            with self._lock:
+                email = params.get("u_email")
+                user = self.users.get(email)
+                if user is None:
+                    user = self.users[email] = {"u_id": str(next(self._user_ids)), "u_name": params.get("u_name"),
+                                                "u_email": email, "u_role": params.get("u_role")}
+                    self.users_by_id[user["u_id"]] = user
+            return 200, {"status": "success", "data": {"u_id": user["u_id"]}}
+        if endpoint == "drive/":
+            with self._lock:
+                b_id = next(self._drive_ids)
+                drive = json.loads(params.get("data") or "{}")
+                drive.update(b_id=b_id, u_id=params.get("u_a_id"), b_state="active")
+                self.drives[b_id] = drive
+            return 200, {"status": "success", "data": {"b_id": b_id}}
+        if endpoint.startswith("drive/get/"):
+            try:
+                b_id = int(endpoint[len("drive/get/"):].strip("/"))
+            except ValueError:
+                return 404, {"status": "error", "code": 404, "message": "bad drive id"}
+            with self._lock:
+                drive = self.drives.get(b_id)
+                if drive is None:
+                    return 200, {"status": "error", "message": "drive not found"}
+                action = params.get("action")
+                if action in ("set_performer", "set_vote"):
+                    driver = self.users_by_id.get(params.get("u_a_id"))
+                    if driver is None or driver["u_role"] != str(ROLE_DRIVER):
+                        return 200, {"status": "error", "message": "user is not a driver"}
+                    if drive["b_state"] != "active":
+                        return 200, {"status": "error", "message": "drive is not active"}
+                if action == "set_cancel_state":
+                    drive["b_state"] = "cancelled"
+                    drive["b_cancel_reason"] = params.get("reason")
+                elif action == "set_performer":
+                    drive["b_state"] = "accepted"
+                    drive["b_driver"] = params.get("u_a_id")
+                elif action == "set_vote":
+                    drive.setdefault("b_votes", []).append(params.get("u_a_id"))
+                return 200, {"status": "success", "data": {"booking": dict(drive)}}
+        return 404, {"status": "error", "code": 404, "message": "unknown endpoint"}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Локальный стаб API ibronevik")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StubServer(args.host, args.port, args.latency_ms, args.latency_jitter_ms, args.error_rate)
+    print("Stub API: " + server.url_prefix)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
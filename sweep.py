@@ -0,0 +1,165 @@
+"""
+Пакетный прогон сценариев (см. scenario.py) без визуализации: сетки параметров
+разворачиваются в варианты, варианты выполняются параллельно в пуле процессов,
+а итог сводится в одну таблицу (CSV и JSON).
+
+    python sweep.py examples/rate_vs_latency.toml --workers 4 --output sweep_output/results.csv
+
+Строка таблицы — один вариант: параметры сетки, число созданных / просроченных / принятых
+водителями / пропущенных заказов и голосов водителей, ошибки создания, заказов в секунду реального времени, перцентили задержки создания заказа
+и решения регулятора темпа (simulator.rate_control).
+Упавший вариант не прерывает прогон — в его строке заполняется колонка error.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import api
+from engine import DiscreteEventEngine, VirtualClock
+from metrics import Metrics
+from scenario import build_simulator, build_users, expand_sweep, load_scenario
+from sinks import ApiOrderSink, make_sink
+from stub_server import StubServer
+
+logger = logging.getLogger(__name__)
+
+# Колонки таблицы результатов (после колонок параметров сетки)
+RESULT_COLUMNS = (
+    'created', 'expired', 'accepted', 'voted', 'active', 'skipped', 'create_errors', 'cancel_failures',
+    'wall_seconds', 'orders_per_second', 'create_mean_ms', 'create_p50_ms', 'create_p95_ms',
+    'create_p99_ms', 'create_max_ms', 'rate_dropped', 'rate_coalesced', 'rate_deferred', 'error',
+)
+
+
+def _run_realtime(simulator, until, tick_seconds):
+    simulator.start()
+    end_time = time.time() + until / simulator.time_compression
+    while time.time() < end_time:
+        simulator.update()
+        time.sleep(tick_seconds)
+    simulator.update()
+
+
+def run_variant(variant, workdir):
+    """
+    Прогоняет один вариант сценария (выполняется в процессе-воркере) и возвращает строку таблицы.
+    """
+    run = variant.get('run', {})
+    row = {'scenario': variant['name'], 'variant': variant['variant'], **variant['params']}
+    server = None
+    saved_prefix, saved_credentials = api.url_prefix, api.admin_credentials
+    started = time.perf_counter()
+    try:
+        sink_name = run.get('sink', 'fake')
+        if sink_name == 'stub':
+            server = StubServer(**run.get('stub', {})).start()
+            api.url_prefix = server.url_prefix
+            api.admin_credentials = api.AdminCredentials(path=os.path.join(workdir, f"admin_{os.getpid()}.txt"))
+            sink = ApiOrderSink()
+        else:
+            sink = make_sink(sink_name)
+
+        metrics = Metrics()
+        mode = run.get('mode', 'discrete')
+        simulator = build_simulator(variant, build_users(variant, sync=sink.remote), sink=sink, metrics=metrics,
+                                    clock=VirtualClock() if mode == 'discrete' else None)
+        until = run.get('hours', simulator.simulation_hours) * 3600
+        started = time.perf_counter()
+        if mode == 'discrete':
+            DiscreteEventEngine(simulator).run(until)
+        elif mode == 'realtime':
+            _run_realtime(simulator, until, run.get('tick_seconds', 1.0))
+        else:
+            raise ValueError(f"Неизвестный режим: {mode!r}")
+        simulator.stop()
+        wall = time.perf_counter() - started
+
+        latency = metrics.merged_histogram('order_create_seconds')
+        created = len(simulator.orders) + len(simulator.orders.history)
+        row.update({
+            'created': created,
+            'expired': metrics.counter_total('orders_expired_total'),
+            'accepted': metrics.counter_total('orders_accepted_total'),
+            'voted': metrics.counter_total('orders_voted_total'),
+            'active': len(simulator.orders),
+            'skipped': metrics.counter_total('orders_skipped_total'),
+            'create_errors': metrics.counter_total('order_create_errors_total'),
+            'cancel_failures': simulator.expiry.failures,
+            'wall_seconds': wall,
+            'orders_per_second': created / wall if wall else 0.0,
+            'create_mean_ms': latency.sum / latency.count * 1e3 if latency.count else 0.0,
+            'create_p50_ms': latency.quantile(0.5) * 1e3,
+            'create_p95_ms': latency.quantile(0.95) * 1e3,
+            'create_p99_ms': latency.quantile(0.99) * 1e3,
+            'create_max_ms': latency.max * 1e3,
+            # Решения ratecontrol.RateController (simulator.rate_control)
+            'rate_dropped': metrics.counter_total('rate_control_decisions_total', decision='dropped'),
+            'rate_coalesced': metrics.counter_total('rate_control_decisions_total', decision='coalesced'),
+            'rate_deferred': metrics.counter_total('rate_control_decisions_total', decision='deferred'),
+            'error': "",
+        })
+    except Exception as e:
+        logger.error("Variant %s/%s failed:\n%s", variant['name'], variant['variant'], traceback.format_exc())
+        row.update({'wall_seconds': time.perf_counter() - started, 'error': repr(e)})
+    finally:
+        if server is not None:
+            server.stop()
+        api.url_prefix, api.admin_credentials = saved_prefix, saved_credentials
+    return row
+
+
+def run_sweep(paths, workers=None, output=None):
+    """
+    Разворачивает сценарии из файлов paths в варианты, прогоняет их в workers процессах
+    и возвращает строки таблицы (в порядке вариантов). Если задан output, таблица
+    пишется в CSV (и рядом — в JSON).
+    """
+    variants = [variant for path in paths for variant in expand_sweep(load_scenario(path))]
+    logger.info("Sweep: %d variants from %d scenario files", len(variants), len(paths))
+    workdir = tempfile.mkdtemp(prefix="taxisim_sweep_")
+
+    rows = [None] * len(variants)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_variant, variant, workdir): i for i, variant in enumerate(variants)}
+        for future, i in futures.items():
+            rows[i] = future.result()
+            logger.info("Sweep: %s/%s done (%d/%d)", rows[i]['scenario'], rows[i]['variant'],
+                        sum(row is not None for row in rows), len(rows))
+
+    if output is not None:
+        write_table(rows, output)
+    return rows
+
+
+def write_table(rows, path):
+    """
+    Пишет строки в CSV (колонки параметров всех сценариев + RESULT_COLUMNS) и в JSON рядом.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    params = []
+    for row in rows:
+        params.extend(name for name in row if name not in params and name not in RESULT_COLUMNS)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=params + list(RESULT_COLUMNS))
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(os.path.splitext(path)[0] + ".json", "w", encoding="utf-8") as f:
+        json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Пакетный прогон сценариев и сеток параметров")
+    parser.add_argument("scenarios", nargs="+", help="файлы сценариев (.json, .toml, .yaml)")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию — число ядер)")
+    parser.add_argument("--output", default=os.path.join("sweep_output", "results.csv"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    for row in run_sweep(args.scenarios, args.workers, args.output):
+        print(row)
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# Модули проекта лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def stub_api(tmp_path, monkeypatch):
+    """
+    Локальный stub_server.StubServer, на который направлены запросы api.py.
+    """
+    import api
+    from stub_server import StubServer
+
+    server = StubServer().start()
+    monkeypatch.setattr(api, "url_prefix", server.url_prefix)
+    monkeypatch.setattr(api, "admin_credentials", api.AdminCredentials(path=str(tmp_path / "admin.txt")))
+    yield server
+    server.stop()
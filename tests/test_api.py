@@ -0,0 +1,121 @@
+import pytest
+
+import api
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(api, "http_retries", 3)
+    monkeypatch.setattr(api, "http_backoff_factor", 0)
+    monkeypatch.setattr(api, "_sessions", {})
+    monkeypatch.setattr(api, "endpoint_stats", {})
+
+
+def fail_first(stub, endpoint, times, response=(500, {"status": "error", "code": 500, "message": "boom"})):
+    """
+    Первые times запросов к endpoint получают response; возвращает счётчик запросов к нему.
+    """
+    handle = stub.handle
+    calls = {"count": 0}
+
+    def wrapped(path, params):
+        if path != endpoint:
+            return handle(path, params)
+        calls["count"] += 1
+        if calls["count"] <= times:
+            return response
+        return handle(path, params)
+
+    stub.handle = wrapped
+    return calls
+
+
+def test_sessions_are_pooled_per_idempotency(fast_retries):
+    session = api.get_session()
+    assert api.get_session() is session
+    assert api.get_session(idempotent=False) is not session
+    assert session.get_adapter("http://localhost").max_retries.total == 3
+    assert api.get_session(idempotent=False).get_adapter("http://localhost").max_retries.read == 0
+
+    api.configure_session(retries=1)
+    try:
+        assert api.get_session() is not session
+        assert api.get_session().get_adapter("http://localhost").max_retries.total == 1
+    finally:
+        api.configure_session(retries=3)
+
+
+def test_idempotent_request_is_retried_on_5xx(stub_api, fast_retries):
+    api.RegisterClient("client@test.com", "Client")
+    calls = fail_first(stub_api, "token", 2)
+    # Токен админа получен до сбоев: повторяется только сам запрос
+    api.GetAdminHashAndToken()
+    calls["count"] = 0
+
+    assert api.GetUserInfo("client@test.com")["status"] == "success"
+    assert calls["count"] == 3
+    stats = api.GetEndpointStats()["token"]
+    assert stats["errors"] == 0 and stats["count"] >= 1
+
+
+def test_state_changing_request_is_not_retried(stub_api, fast_retries):
+    user_id = api.RegisterClient("client@test.com", "Client")["data"]["u_id"]
+    api.GetAdminHashAndToken()
+    calls = fail_first(stub_api, "drive/", 1)
+
+    result = api.CreateDrive(user_id, 30.4, -9.5, 30.41, -9.51, "2024-01-01 08:00:00+00:00", 600)
+    assert result["status"] == "error"
+    assert calls["count"] == 1
+    assert stub_api.drives == {}
+    assert api.GetEndpointStats()["drive/"]["errors"] == 1
+
+
+def test_endpoint_names_hide_ids(stub_api, fast_retries):
+    user_id = api.RegisterClient("client@test.com", "Client")["data"]["u_id"]
+    drive_id = api.CreateDrive(user_id, 30.4, -9.5, 30.41, -9.51, "2024-01-01 08:00:00+00:00", 600)["data"]["b_id"]
+    api.CancelDrive(drive_id, "test")
+    assert "drive/get/<id>" in api.GetEndpointStats()
+    api.ResetEndpointStats()
+    assert api.GetEndpointStats() == {}
+
+
+def test_admin_credentials_cached_in_memory_and_file(stub_api, tmp_path):
+    path = str(tmp_path / "admin.txt")
+    credentials = api.AdminCredentials(path=path)
+    assert credentials.get() == ["stub-token", "stub-u-hash"]
+    assert credentials.get() == ["stub-token", "stub-u-hash"]
+    assert stub_api.request_counts["auth"] == 1
+    assert open(path).read() == "stub-token\nstub-u-hash"
+
+    # Другой процесс (новый экземпляр) берёт токен из файла, без логина
+    assert api.AdminCredentials(path=path).get() == ["stub-token", "stub-u-hash"]
+    assert stub_api.request_counts["auth"] == 1
+
+
+def test_admin_credentials_refresh(stub_api, tmp_path, monkeypatch):
+    path = str(tmp_path / "admin.txt")
+    credentials = api.AdminCredentials(path=path, max_age=60)
+    credentials.get()
+    now = api.time.time()
+    monkeypatch.setattr(api.time, "time", lambda: now + 120)
+    credentials.get()
+    assert stub_api.request_counts["auth"] == 2
+
+    # Устаревший токен не сбрасывает новый; сброшенный токен не берётся из файла повторно
+    credentials.invalidate("old-token")
+    credentials.get()
+    assert stub_api.request_counts["auth"] == 2
+    credentials.invalidate("stub-token")
+    credentials.get()
+    assert stub_api.request_counts["auth"] == 3
+
+
+def test_admin_request_relogins_once_on_auth_error(stub_api):
+    api.RegisterClient("client@test.com", "Client")
+    api.GetAdminHashAndToken()
+    calls = fail_first(stub_api, "token", 1, (200, {"status": "error", "message": "token expired"}))
+
+    assert api.GetUserInfo("client@test.com")["status"] == "success"
+    # Запрос, сброс токена и логин (auth + token), повтор запроса
+    assert calls["count"] == 3
+    assert stub_api.request_counts["auth"] == 2
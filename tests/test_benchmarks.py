@@ -0,0 +1,43 @@
+import math
+import os
+import sys
+
+import pytest
+
+# Бенчмарки запускаются как скрипты из каталога benchmarks
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from run import compare, run  # noqa: E402
+from scenarios import SCENARIOS  # noqa: E402
+
+
+@pytest.mark.parametrize('name', list(SCENARIOS))
+def test_scenario_reports_results(name):
+    results = SCENARIOS[name](0.01)
+    names = [result['name'] for result in results]
+    assert results and len(set(names)) == len(names)
+    for result in results:
+        assert math.isfinite(result['value']) and result['value'] >= 0
+        assert result['unit'] and result['better'] in ('higher', 'lower')
+
+
+def test_compare_flags_regressions_by_direction():
+    def results(**values):
+        return {'results': {name: {'value': value, 'unit': 'x', 'better': 'lower' if name.endswith('ms') else 'higher'}
+                            for name, value in values.items()}}
+
+    baseline = results(rate=100.0, cost_ms=10.0, same=1.0)
+    current = results(rate=80.0, cost_ms=9.0, same=1.0, new=5.0)
+    lines, regressions = compare(current, baseline, tolerance=0.15)
+    assert regressions == ['rate']
+    assert len(lines) == 4 and 'нет в базовом' in lines[-1]
+
+    _, regressions = compare(results(rate=120.0, cost_ms=12.0), baseline, tolerance=0.15)
+    assert regressions == ['cost_ms']
+
+
+def test_run_collects_meta():
+    current = run(['distance_bands'], 0.01)
+    assert current['meta']['scenarios'] == ['distance_bands'] and current['meta']['scale'] == 0.01
+    assert 0 < current['results']['distance_band.short.bbox.acceptance']['value'] <= 1
+    assert all('name' not in result for result in current['results'].values())
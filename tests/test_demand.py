@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from demand import DAY_SECONDS, DemandProfile, FixedIntervalSchedule, PoissonSchedule
+
+PROFILE = [(0, 2), (7, 20), (10, 8), (17, 25), (20, 6)]
+
+
+def arrivals(schedule, until):
+    times = []
+    while schedule.next_time < until:
+        times.append(schedule.next_time)
+        schedule.advance()
+    return times
+
+
+def test_profile_integral_matches_rates():
+    profile = DemandProfile(PROFILE)
+    expected = 2 * 7 + 20 * 3 + 8 * 7 + 25 * 3 + 6 * 4
+    assert profile.total == pytest.approx(expected)
+    assert profile.cumulative_at(DAY_SECONDS) == pytest.approx(expected)
+    assert profile.cumulative_at(7 * 3600 + 1800) == pytest.approx(14 + 10)
+    for t in (0.0, 3600.0, 8 * 3600 + 17.5, 19 * 3600, DAY_SECONDS + 600):
+        assert profile.inverse_cumulative(profile.cumulative_at(t)) == pytest.approx(t)
+
+
+def test_profile_wraps_around_midnight():
+    profile = DemandProfile([(7, 20), (20, 6)])
+    assert profile.rate_at(3 * 3600) == pytest.approx(6)
+    assert profile.rate_at(DAY_SECONDS + 8 * 3600) == pytest.approx(20)
+    assert DemandProfile.hourly([10] * 24).total == pytest.approx(240)
+
+
+def test_profile_validation():
+    with pytest.raises(ValueError):
+        DemandProfile([])
+    with pytest.raises(ValueError):
+        DemandProfile([(0, -1)])
+    with pytest.raises(ValueError):
+        DemandProfile.hourly([1] * 23)
+
+
+def test_arrival_count_matches_rate_integral():
+    profile = DemandProfile(PROFILE)
+    days = 20
+    times = arrivals(PoissonSchedule(profile, rng=random.Random(1)), days * DAY_SECONDS)
+    expected = days * profile.total
+    # Пуассоновский поток: отклонение в пределах 4 сигм
+    assert abs(len(times) - expected) < 4 * expected ** 0.5
+
+
+def test_peak_hour_gets_more_arrivals():
+    profile = DemandProfile(PROFILE)
+    # Старт в 8:00, как у симулятора: игровое время отсчитывается от day_offset
+    times = arrivals(PoissonSchedule(profile, 8 * 3600, rng=random.Random(2)), 10 * DAY_SECONDS)
+    by_hour = [0] * 24
+    for t in times:
+        by_hour[int((t + 8 * 3600) % DAY_SECONDS // 3600)] += 1
+    peak, night = by_hour[18], by_hour[3]
+    assert peak > 5 * night
+    assert peak == pytest.approx(25 * 10, rel=0.25)
+    assert times == sorted(times)
+
+
+def test_zero_profile_never_arrives():
+    schedule = PoissonSchedule([0] * 24)
+    assert schedule.next_time == float('inf')
+
+
+def test_fixed_interval_schedule():
+    assert arrivals(FixedIntervalSchedule(600), 3600) == [0, 600, 1200, 1800, 2400, 3000]
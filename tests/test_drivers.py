@@ -0,0 +1,101 @@
+import pytest
+
+import api
+from engine import DiscreteEventEngine, VirtualClock
+from main import DriversList, TaxiOrderSimulator, UsersList
+from metrics import Metrics
+from sinks import ApiOrderSink, FakeOrderSink
+
+POLYGON = [(30.33, -9.60), (30.43, -9.60), (30.43, -9.48), (30.33, -9.48)]
+
+
+def make_simulator(sink, drivers, **kwargs):
+    users = UsersList(user_count=500)
+    users.make_local()
+    return TaxiOrderSimulator(POLYGON, users, regular_frequency=120, voting_frequency=120,
+                              voting_lifetime_minutes_min=5, voting_lifetime_minutes_max=5,
+                              distance_units='km', distance_min=1, distance_max=3,
+                              sink=sink, clock=VirtualClock(), seed=3, metrics=Metrics(), drivers=drivers, **kwargs)
+
+
+def test_accept_closes_order_and_vote_keeps_it_until_expiry():
+    sink = FakeOrderSink()
+    simulator = make_simulator(sink, drivers=50)
+    DiscreteEventEngine(simulator).run(2 * 3600)
+    simulator.stop()
+
+    history = simulator.orders.history.to_dataframe()
+    accepted = history[history['outcome'] == 'accepted']
+    assert len(accepted) == sink.accepted > 0
+    assert set(accepted['order_type']) == {'regular'}
+    # Голосования после голоса не закрываются: они истекают и отменяются в API
+    assert sink.voted > 0
+    voting = history[history['order_type'] == 'voting']
+    assert set(voting['outcome']) == {'expired'}
+    assert sink.cancelled == len(history[history['outcome'] == 'expired'])
+    assert simulator.metrics.counter_total('orders_voted_total') == sink.voted
+    # За каждое голосование голосует один водитель
+    assert sink.voted <= len(voting) + len(simulator.orders)
+
+
+def test_failed_driver_action_releases_driver():
+    class RejectingSink(FakeOrderSink):
+        def accept_order(self, order, driver_id):
+            raise RuntimeError("drive is not active")
+
+        vote_order = accept_order
+
+    simulator = make_simulator(RejectingSink(), drivers=20)
+    DiscreteEventEngine(simulator).run(1800)
+    simulator.stop()
+    stats = simulator.drivers.stats()
+    assert stats['pending'] == stats['to_pickup'] == stats['on_trip'] == 0
+    assert simulator.metrics.counter_total('driver_action_errors_total') > 0
+
+
+def test_remote_sink_requires_driver_ids():
+    with pytest.raises(ValueError):
+        make_simulator(ApiOrderSink(), drivers=5)
+
+
+def test_stub_accepts_actions_only_from_drivers(stub_api):
+    # RegisterClient сохраняет исходный u_role; отказ проверяем на пользователе с ролью клиента
+    user = api.RegisterClient("user@test.com", "User")["data"]["u_id"]
+    assert stub_api.users_by_id[user]["u_role"] == "2"
+    client = api._register("client@test.com", "Client", api.ROLE_CLIENT)["data"]["u_id"]
+    drivers = DriversList(user_count=2)
+    drivers.sync(workers=2)
+    driver_id = drivers.get_user_ids()[0]
+    assert stub_api.users_by_id[driver_id]["u_role"] == str(api.ROLE_DRIVER)
+    assert stub_api.users_by_id[client]["u_role"] == str(api.ROLE_CLIENT)
+
+    first = api.CreateDrive(client, 30.4, -9.5, 30.41, -9.51, "2026-01-01 08:00:00+00:00", 300)["data"]["b_id"]
+    second = api.CreateDrive(client, 30.4, -9.5, 30.41, -9.51, "2026-01-01 08:00:00+00:00", 300)["data"]["b_id"]
+    assert api.AcceptDrive(first, client)["status"] == "error"
+    assert api.AcceptDrive(first, driver_id)["status"] == "success"
+    assert api.VoteDrive(second, driver_id)["status"] == "success"
+    # Голосование остаётся активным, и его можно отменить
+    assert api.CancelDrive(second, "Order expired")["status"] == "success"
+
+
+def test_simulator_drivers_act_through_stub(stub_api):
+    drivers = DriversList(user_count=10)
+    drivers.sync(workers=4)
+    users = UsersList(user_count=50)
+    users.sync(workers=4)
+    simulator = TaxiOrderSimulator(POLYGON, users, regular_frequency=60, voting_frequency=60,
+                                   voting_lifetime_minutes_min=2, voting_lifetime_minutes_max=2,
+                                   distance_units='km', distance_min=1, distance_max=3,
+                                   sink=ApiOrderSink(), clock=VirtualClock(), seed=3, metrics=Metrics(),
+                                   drivers={'count': 10, 'driver_ids': drivers.get_user_ids()})
+    DiscreteEventEngine(simulator).run(1800)
+    assert simulator.stop(timeout=10)
+
+    metrics = simulator.metrics
+    assert metrics.counter_total('driver_action_errors_total') == 0
+    assert metrics.counter_total('orders_accepted_total') > 0
+    assert metrics.counter_total('orders_voted_total') > 0
+    # Голосования, созданные в последние минуты прогона, к его концу ещё не истекли
+    voted = [drive for drive_id, drive in stub_api.drives.items()
+             if drive.get("b_votes") and drive_id not in simulator.orders]
+    assert voted and all(drive["b_state"] == "cancelled" for drive in voted)
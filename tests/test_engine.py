@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from engine import DiscreteEventEngine, VirtualClock
+from main import TaxiOrderSimulator, UsersList
+from metrics import Metrics
+from sinks import FakeOrderSink
+
+POLYGON = [(30.33, -9.60), (30.43, -9.60), (30.43, -9.48), (30.33, -9.48)]
+
+
+def make_simulator(**kwargs):
+    users = UsersList(user_count=200)
+    users.make_local()
+    kwargs.setdefault('clock', VirtualClock())
+    return TaxiOrderSimulator(POLYGON, users, sink=FakeOrderSink(), seed=1, metrics=Metrics(), **kwargs)
+
+
+def test_virtual_clock_only_moves_forward():
+    clock = VirtualClock(10.0)
+    clock.advance_to(5.0)
+    assert clock() == 10.0
+    clock.advance_to(12.5)
+    assert clock() == 12.5
+
+
+@pytest.mark.parametrize('time_compression', [1.0, 60.0])
+def test_run_processes_every_event_faster_than_real_time(time_compression):
+    simulator = make_simulator(regular_frequency=60, voting_frequency=0, regular_lifetime_minutes=5,
+                               time_compression=time_compression)
+    started = time.perf_counter()
+    stats = DiscreteEventEngine(simulator).run(2 * 3600)
+    simulator.stop()
+
+    assert time.perf_counter() - started < 60
+    assert stats['game_seconds'] == pytest.approx(2 * 3600)
+    # Заказ раз в минуту (0, 60, ..., 7200); истечения через 5 минут совпадают с моментами заказов,
+    # поэтому событий столько же, сколько заказов. Голосование с нулевой частотой даёт один заказ в момент 0
+    assert simulator.metrics.counter_total('orders_created_total', order_type='regular') == 121
+    assert simulator.metrics.counter_total('orders_expired_total') == 117
+    assert stats['active_orders'] == 5
+    assert stats['events'] == 121
+
+
+def test_engine_replaces_real_clock():
+    simulator = make_simulator(clock=time.time, regular_frequency=60, voting_frequency=0)
+    engine = DiscreteEventEngine(simulator)
+    assert isinstance(simulator.clock, VirtualClock) and engine.clock is simulator.clock
+    assert engine.next_event_time() == 0.0
+    engine.run(600)
+    simulator.stop()
+    assert simulator.metrics.counter_total('orders_created_total', order_type='regular') == 11
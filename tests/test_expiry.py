@@ -0,0 +1,85 @@
+import pytest
+
+from expiry import ExpiryPipeline
+from sinks import ApiOrderSink, OrderSink
+
+
+class FlakySink(OrderSink):
+    """
+    Приёмник, у которого первые failures отмен каждого заказа падают.
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.attempts = {}
+        self.cancelled = []
+
+    def cancel_order(self, order, reason):
+        attempt = self.attempts[order['id']] = self.attempts.get(order['id'], 0) + 1
+        if attempt <= self.failures:
+            raise RuntimeError("API error")
+        self.cancelled.append(order['id'])
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_failed_cancellation_is_retried_with_backoff():
+    sink, clock = FlakySink(failures=2), FakeClock()
+    pipeline = ExpiryPipeline(sink, max_in_flight=0, retry_delay=1.0, clock=clock)
+    pipeline.submit([{'id': 1}])
+
+    pipeline.pump()
+    assert pipeline.failures == 1 and len(pipeline) == 1
+    clock.now = 0.5
+    pipeline.pump()
+    assert sink.attempts[1] == 1  # Повтор ещё не наступил
+    clock.now = 1.0
+    pipeline.pump()
+    assert sink.attempts[1] == 2
+    clock.now = 2.5  # Вторая задержка вдвое больше первой
+    pipeline.pump()
+    assert sink.attempts[1] == 2
+    clock.now = 3.0
+    pipeline.pump()
+    assert sink.cancelled == [1]
+    assert pipeline.cancelled == 1 and pipeline.failures == 2 and not len(pipeline)
+
+
+def test_cancellation_is_abandoned_after_max_attempts():
+    sink, clock = FlakySink(failures=10), FakeClock()
+    pipeline = ExpiryPipeline(sink, max_in_flight=0, retry_delay=1.0, max_attempts=3, clock=clock)
+    pipeline.submit([{'id': 7}])
+    for clock.now in range(10):
+        pipeline.pump()
+    assert sink.attempts[7] == 3
+    assert [order['id'] for order in pipeline.abandoned] == [7]
+    assert not len(pipeline)
+
+
+def test_threaded_pipeline_drains_retries():
+    sink = FlakySink(failures=1)
+    pipeline = ExpiryPipeline(sink, max_in_flight=4, retry_delay=0.01)
+    pipeline.submit([{'id': i} for i in range(20)])
+    assert pipeline.close(timeout=5.0)
+    assert sorted(sink.cancelled) == list(range(20))
+    assert pipeline.failures == 20 and pipeline.cancelled == 20
+
+
+def test_api_sink_cancel_error_goes_to_retry(stub_api):
+    sink = ApiOrderSink()
+    with pytest.raises(RuntimeError):
+        sink.cancel_order({'id': 12345}, "Order expired")
+
+    clock = FakeClock()
+    pipeline = ExpiryPipeline(sink, max_in_flight=0, max_attempts=2, clock=clock)
+    pipeline.submit([{'id': 12345}])
+    pipeline.pump()
+    clock.now = 10.0
+    pipeline.pump()
+    assert pipeline.cancelled == 0 and len(pipeline.abandoned) == 1
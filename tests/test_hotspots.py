@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Polygon
+
+from engine import DiscreteEventEngine, VirtualClock
+from hotspots import HotspotSampler, alias_sample, build_alias_table, load_heatmap
+from main import TaxiOrderSimulator, UsersList
+from metrics import Metrics
+from sinks import FakeOrderSink
+
+SQUARE = Polygon([(0, 0), (10, 0), (10, 10), (0, 10)])
+# Станция утром (7-10), торговый центр вечером (17-21)
+MORNING = [(0, 0), (7, 1), (10, 0)]
+EVENING = [(0, 0), (17, 1), (21, 0)]
+
+
+def near(points, center, radius=2.0):
+    return (np.hypot(*(points - np.asarray(center)).T) < radius).mean()
+
+
+def test_alias_table_matches_weights():
+    prob, alias = build_alias_table([1, 0, 3])
+    counts = np.bincount(alias_sample(prob, alias, 40000, np.random.default_rng(0)), minlength=3)
+    assert counts[1] == 0
+    assert counts[2] / counts.sum() == pytest.approx(0.75, abs=0.01)
+    with pytest.raises(ValueError):
+        build_alias_table([0, 0])
+
+
+def test_hotspot_profiles_follow_time_of_day():
+    sampler = HotspotSampler(SQUARE, hotspots=[
+        {'center': (2, 2), 'sigma': 0.5, 'weight': 50, 'profile': MORNING},
+        {'center': (8, 8), 'sigma': 0.5, 'weight': 50, 'profile': EVENING},
+    ], background=0.1, grid_size=32, rng=np.random.default_rng(1))
+
+    assert sampler.set_time(8 * 3600)
+    morning = sampler.sample_points(5000)
+    assert near(morning, (2, 2)) > 0.7 and near(morning, (8, 8)) < 0.05
+    # Внутри участка профиля распределение не меняется, таблицы не перестраиваются
+    table = sampler._origin_table
+    assert not sampler.set_time(9 * 3600)
+    assert sampler._origin_table is table
+
+    assert sampler.set_time(18 * 3600)
+    evening = sampler.sample_points(5000)
+    assert near(evening, (8, 8)) > 0.7 and near(evening, (2, 2)) < 0.05
+
+
+def test_hotspot_without_profile_is_static():
+    sampler = HotspotSampler(SQUARE, hotspots=[{'center': (2, 2), 'sigma': 0.5, 'weight': 50}],
+                             rng=np.random.default_rng(2))
+    assert not sampler.set_time(8 * 3600)
+
+
+def test_simulator_switches_hotspots_by_profile():
+    users = UsersList(user_count=500)
+    users.make_local()
+    polygon = [(30.33, -9.60), (30.43, -9.60), (30.43, -9.48), (30.33, -9.48)]
+    station, mall = (30.35, -9.58), (30.41, -9.50)
+    simulator = TaxiOrderSimulator(polygon, users, regular_frequency=600, voting_frequency=0,
+                                   regular_lifetime_minutes=5, distance_units='km', distance_min=0.1,
+                                   distance_max=3, sink=FakeOrderSink(), clock=VirtualClock(), seed=4,
+                                   metrics=Metrics(), hotspot_background=0,
+                                   hotspots=[{'center': station, 'sigma': 0.5, 'profile': [(0, 0), (8, 1), (9, 0)]},
+                                             {'center': mall, 'sigma': 0.5, 'profile': [(0, 0), (9, 1), (10, 0)]}])
+    DiscreteEventEngine(simulator).run(2 * 3600)
+    simulator.stop()
+
+    history = simulator.orders.history.to_dataframe()
+    origins = history[['origin_x', 'origin_y']].to_numpy()
+    first_hour = (history['creation_ts'] - simulator._start_ts < 3600).to_numpy()
+    assert first_hour.any() and (~first_hour).any()
+    # Заказы первого часа — у вокзала, второго — у ТЦ (буфер пар точек сбрасывается на границе)
+    assert near(origins[first_hour], station, 0.02) == 1.0
+    assert near(origins[~first_hour], mall, 0.02) == 1.0
+
+
+CONCAVE = Polygon([(0, 0), (10, 0), (10, 10), (6, 10), (6, 4), (4, 4), (4, 10), (0, 10)])
+
+
+def test_grid_covers_polygon():
+    sampler = HotspotSampler(CONCAVE, grid_size=16, rng=np.random.default_rng(3))
+    assert sampler.cell_areas.sum() == pytest.approx(CONCAVE.area)
+    assert len(sampler.cell_bounds) == len(sampler.cell_areas) == len(sampler.cell_centers)
+    points = sampler.sample_points(5000)
+    assert CONCAVE.contains(shapely.points(points)).all()
+    assert (sampler.cells_of(points) >= 0).all()
+    assert list(sampler.cells_of([[5, 8], [-1, 5]])) == [-1, -1]
+
+
+def test_heatmap_from_csv_and_npy(tmp_path):
+    csv_path = tmp_path / 'heat.csv'
+    csv_path.write_text("lat,lon\n8.5,1.5\n8.5,1.5\n1.5,8.5\n")
+    npy_path = tmp_path / 'heat.npy'
+    np.save(npy_path, np.array([[8.5, 1.5, 2.0], [1.5, 8.5, 1.0]]))
+    # Без столбца веса каждая точка весит 1, строка заголовка пропускается
+    assert load_heatmap(str(csv_path)).tolist() == [[8.5, 1.5, 1.0], [8.5, 1.5, 1.0], [1.5, 8.5, 1.0]]
+
+    sampler = HotspotSampler(SQUARE, heat_points=load_heatmap(str(npy_path)), background=0, grid_size=10,
+                             rng=np.random.default_rng(4))
+    points = sampler.sample_points(6000)
+    assert near(points, (8.5, 1.5), 1.0) == pytest.approx(2 / 3, abs=0.03)
+    assert near(points, (1.5, 8.5), 1.0) == pytest.approx(1 / 3, abs=0.03)
+
+    bad_path = tmp_path / 'bad.csv'
+    bad_path.write_text("1,2,3,4\n")
+    with pytest.raises(ValueError):
+        load_heatmap(str(bad_path))
+
+
+def test_od_matrix_directs_destinations():
+    sampler = HotspotSampler(SQUARE, grid_size=4, rng=np.random.default_rng(5))
+    k = len(sampler.cell_areas)
+    target = sampler.cells_of([[9, 9]])[0]
+    od_matrix = np.zeros((k, k))
+    od_matrix[:, target] = 1
+    sampler.set_od_matrix(od_matrix)
+
+    origins, destinations = sampler.sample_pairs(2000, 0, 20)
+    assert (sampler.cells_of(destinations) == target).all()
+    assert len(np.unique(sampler.cells_of(origins))) == k
+    with pytest.raises(ValueError):
+        sampler.set_od_matrix(np.ones((k, k + 1)))
+
+
+def test_distance_band_falls_back_to_uniform_annulus():
+    # Весь спрос в одной точке: пары на расстоянии 4-6 почти никогда не получаются по весам
+    sampler = HotspotSampler(SQUARE, hotspots=[{'center': (2, 2), 'sigma': 0.3, 'weight': 1000}], background=0,
+                             grid_size=32, rng=np.random.default_rng(6), max_rounds=4)
+    origins, destinations = sampler.sample_pairs(500, 4.0, 6.0)
+    distances = np.hypot(*(destinations - origins).T)
+    assert ((distances >= 4.0) & (distances <= 6.0)).all()
+    assert SQUARE.contains(shapely.points(destinations)).all()
+    assert sampler.stats()['fallbacks'] > 0 and sampler.stats()['dest_rejections'] > 0
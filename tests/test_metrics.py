@@ -0,0 +1,117 @@
+import gc
+import urllib.request
+
+import pytest
+
+from engine import DiscreteEventEngine, VirtualClock
+from main import TaxiOrderSimulator, UsersList
+from metrics import Histogram, Metrics, MetricsServer, Profiler
+from sinks import FakeOrderSink
+
+POLYGON = [(30.33, -9.60), (30.43, -9.60), (30.43, -9.48), (30.33, -9.48)]
+
+
+def test_histogram_quantiles_and_merge():
+    histogram = Histogram((1, 2, 5))
+    for value in (0.5, 1.5, 1.5, 3, 10):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1, 1]
+    assert (histogram.quantile(0.5), histogram.quantile(0.8), histogram.quantile(1.0)) == (2, 5, 10)
+
+    other = Histogram.from_dict(histogram.to_dict())
+    other.merge(histogram)
+    assert other.count == 10 and other.sum == 2 * histogram.sum and other.counts == [2, 4, 2, 2]
+    with pytest.raises(ValueError):
+        other.merge(Histogram((1, 2)))
+
+
+def test_labels_snapshot_and_prometheus():
+    metrics = Metrics()
+    metrics.inc('orders_created_total', order_type='regular')
+    metrics.inc('orders_created_total', 2, order_type='voting')
+    metrics.set_gauge('active_orders', 7)
+    metrics.observe('order_create_seconds', 0.003, order_type='regular')
+
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'] == {'orders_created_total{order_type="regular"}': 1,
+                                    'orders_created_total{order_type="voting"}': 2}
+    assert snapshot['gauges'] == {'active_orders': 7}
+    assert metrics.counter_total('orders_created_total') == 3
+    assert metrics.counter_total('orders_created_total', order_type='voting') == 2
+    assert metrics.merged_histogram('order_create_seconds').count == 1
+
+    text = metrics.to_prometheus()
+    assert '# TYPE orders_created_total counter' in text
+    assert 'order_create_seconds_bucket{order_type="regular",le="0.005"} 1' in text
+    assert 'order_create_seconds_bucket{order_type="regular",le="+Inf"} 1' in text
+    assert 'order_create_seconds_count{order_type="regular"} 1' in text
+
+
+def test_collectors_are_weak_and_removable():
+    metrics = Metrics()
+
+    class Source:
+        def collect(self, metrics):
+            metrics.set_gauge('collected', 1)
+
+    source = Source()
+    metrics.add_collector(source.collect)
+    assert metrics.snapshot()['gauges'] == {'collected': 1}
+    metrics.reset()
+    metrics.remove_collector(source.collect)
+    assert metrics.snapshot()['gauges'] == {}
+
+    metrics.add_collector(Source().collect)
+    gc.collect()
+    assert metrics.snapshot()['gauges'] == {} and not metrics._collectors
+
+
+def test_simulator_reports_phases_and_lag():
+    users = UsersList(user_count=1000)
+    users.make_local()
+    metrics = Metrics()
+    simulator = TaxiOrderSimulator(POLYGON, users, regular_frequency=600, voting_frequency=60,
+                                   sink=FakeOrderSink(), clock=VirtualClock(), seed=1, metrics=metrics)
+    DiscreteEventEngine(simulator).run(600)
+    snapshot = metrics.snapshot()
+    simulator.stop()
+
+    for phase in ('regular', 'voting', 'expire'):
+        assert snapshot['histograms'][f'update_phase_seconds{{phase="{phase}"}}']['count'] > 0
+    assert snapshot['gauges']['schedule_lag_seconds{order_type="regular"}'] == 0.0
+    assert snapshot['gauges']['active_orders'] == len(simulator.orders)
+    assert snapshot['counters']['orders_created_total{order_type="regular"}'] == 600 // 6 + 1
+
+
+def test_profiler_is_applied_in_simulation_thread():
+    profiler = Profiler()
+    profiler.request_cprofile(True)
+    assert not profiler.cprofile_enabled
+    profiler.apply()
+    assert profiler.cprofile_enabled
+    sum(range(1000))
+    profiler.request_cprofile(False)
+    profiler.apply()
+    assert not profiler.cprofile_enabled and 'function calls' in profiler.cprofile_stats()
+
+
+def test_metrics_server_endpoints():
+    metrics = Metrics()
+    metrics.inc('orders_created_total', order_type='regular')
+    profiler = Profiler()
+    server = MetricsServer(port=0, metrics=metrics, profiler=profiler).start()
+    base = server.url[:-len('/metrics')]
+    try:
+        with urllib.request.urlopen(server.url) as response:
+            assert 'orders_created_total{order_type="regular"} 1' in response.read().decode('utf-8')
+        urllib.request.urlopen(base + '/debug/cprofile/start').close()
+        assert profiler._wanted
+        with urllib.request.urlopen(base + '/debug/tracemalloc/start'):
+            pass
+        with urllib.request.urlopen(base + '/debug/tracemalloc/top') as response:
+            assert response.read().decode('utf-8').startswith('current=')
+        urllib.request.urlopen(base + '/debug/tracemalloc/stop').close()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(base + '/debug/unknown')
+    finally:
+        server.stop()
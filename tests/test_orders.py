@@ -0,0 +1,103 @@
+import pytest
+
+from orders import ActiveOrdersView, OrderStore
+
+DAY_START = 1_700_000_000.0
+
+
+def filled_store(n=10):
+    store = OrderStore(capacity=4)
+    for i in range(n):
+        store.add(100 + i, i, (30.0 + i, -9.0), (31.0, -9.0 - i), 'regular' if i % 2 else 'voting',
+                  DAY_START + 8 * 3600 + 60 * i, DAY_START + 8 * 3600 + 600 + 60 * i)
+    return store
+
+
+def make_view(store, now=DAY_START + 8 * 3600):
+    return ActiveOrdersView(store, [f"user{i}" for i in range(20)], lambda: now, DAY_START)
+
+
+def test_getitem_builds_only_requested_rows():
+    store = filled_store()
+    view = make_view(store)
+    expected = make_view(store).to_list()
+
+    assert view[3] == expected[3]
+    assert view[-1] == expected[-1]
+    assert view[2:7:2] == expected[2:7:2]
+    assert view[::-3] == expected[::-3]
+    assert view[20:] == []
+    assert view._static_rows is None and view._creation_times is None
+
+    assert view[3] == {'id': 103, 'order_type': 'regular', 'name': view[3]['name'], 'userID': 'user3',
+                       'coords': (33.0, -9.0), 'destination_coords': (31.0, -12.0),
+                       'creation_time': '08:03:00', 'remaining_lifetime': '13 мин 0 сек'}
+    with pytest.raises(IndexError):
+        view[10]
+    with pytest.raises(IndexError):
+        view[-11]
+
+
+def test_getitem_reuses_rows_built_by_to_list():
+    view = make_view(filled_store())
+    orders = view.to_list()
+    assert view._static_rows is not None
+    assert view[4] == orders[4] and view[1:3] == orders[1:3]
+    # Каждое обращение возвращает новый словарь
+    view[4]['id'] = -1
+    assert view[4]['id'] == 104
+
+
+def test_slots_are_reused_and_columns_grow():
+    store = filled_store(10)
+    assert len(store) == 10 and store._capacity == 16
+    slot = store.slot_of(104)
+    store.remove(slot, DAY_START + 9 * 3600, outcome='accepted')
+    assert 104 not in store and len(store) == 9
+    assert store.add(200, 5, (1.0, 2.0), (3.0, 4.0), 'regular', DAY_START, DAY_START + 60) == slot
+
+    cols = store.columns()
+    assert not cols['id'].flags.writeable
+    assert len(cols['id']) == 10 and cols['active'].all()
+    assert cols['id'][slot] == 200 and tuple(cols['origin'][slot]) == (1.0, 2.0)
+    assert list(store.ids[store.active_slots()]) == [100, 101, 102, 103, 200, 105, 106, 107, 108, 109]
+
+
+def test_changes_since_returns_delta():
+    store = filled_store(3)
+    version = store.version
+    store.remove(store.slot_of(101), DAY_START)
+    store.add(300, 0, (0, 0), (1, 1), 'voting', DAY_START, DAY_START + 60)
+    store.add(301, 0, (0, 0), (1, 1), 'voting', DAY_START, DAY_START + 60)
+    store.remove(store.slot_of(301), DAY_START)
+
+    current, added, removed = store.changes_since(version)
+    assert current == store.version == version + 4
+    assert list(added) == [300] and list(removed) == [101]
+    assert store.changes_since(store.version)[1].size == 0
+    assert store.changes_since(store.version + 1) is None
+
+
+def test_change_log_is_truncated():
+    store = OrderStore(change_log_size=8)
+    for i in range(20):
+        store.add(i, 0, (0, 0), (1, 1), 'regular', DAY_START, DAY_START + 60)
+    assert store.changes_since(0) is None
+    _, added, _ = store.changes_since(store.version - 3)
+    assert list(added) == [17, 18, 19]
+
+
+def test_history_keeps_finished_orders():
+    store = filled_store(4)
+    store.remove(store.slot_of(100), DAY_START + 8 * 3600 + 600)
+    store.remove(store.slot_of(103), DAY_START + 8 * 3600 + 300, outcome='accepted')
+
+    cols = store.history.columns()
+    assert len(store.history) == 2
+    assert list(cols['id']) == [100, 103] and list(cols['origin_x']) == [30.0, 33.0]
+
+    df = store.history.to_dataframe(user_ids=[f"user{i}" for i in range(4)])
+    assert list(df['outcome']) == ['expired', 'accepted']
+    assert list(df['order_type']) == ['voting', 'regular']
+    assert list(df['userID']) == ['user0', 'user3']
+    assert str(df['finished_time'][1]) == '2023-11-15 06:18:20'
@@ -0,0 +1,87 @@
+import math
+import random
+import time
+
+import pytest
+
+from demand import FixedIntervalSchedule
+from planning import OrderPlanner
+
+
+class ListSchedule:
+    """
+    Расписание по списку моментов (после последнего — inf).
+    """
+
+    def __init__(self, times):
+        self._times = list(times)
+        self.next_time = self._times.pop(0) if self._times else math.inf
+
+    def advance(self):
+        self.next_time = self._times.pop(0) if self._times else math.inf
+
+
+def make_planner(lookahead, seed=0):
+    rng = random.Random(seed)
+    schedules = {'regular': FixedIntervalSchedule(10.0), 'voting': ListSchedule([5.0, 10.0, 40.0])}
+    return OrderPlanner(schedules, lambda order_type, due: (order_type, due, rng.random()), lookahead=lookahead)
+
+
+def drain(planner, until=100.0, step=7.0):
+    orders = []
+    game_time = 0.0
+    while game_time <= until:
+        for order_type in ('regular', 'voting'):
+            orders.extend(planner.pop_due(order_type, game_time))
+        game_time += step
+    return orders
+
+
+def test_pop_due_returns_due_orders_in_time_order():
+    planner = make_planner(lookahead=0)
+    assert planner.next_time('voting') == 5.0
+    assert [order[1] for order in planner.pop_due('regular', 25.0)] == [0.0, 10.0, 20.0]
+    assert [order[1] for order in planner.pop_due('voting', 25.0)] == [5.0, 10.0]
+    assert planner.pop_due('voting', 25.0) == []
+    assert planner.next_time('voting') == 40.0
+    planner.pop_due('voting', 40.0)
+    assert planner.next_time('voting') == math.inf
+    assert planner.prepared == planner.prepared_inline
+
+
+def test_background_thread_gives_same_orders_as_inline():
+    inline = drain(make_planner(lookahead=0))
+    planner = make_planner(lookahead=4).start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(planner) < 4 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        # Фоновый поток держит не больше lookahead подготовленных заказов
+        assert planner.stats()['queued'] == planner.prepared == 4
+        prefetched = drain(planner)
+    finally:
+        planner.stop()
+    assert prefetched == inline
+    assert planner.prepared_inline < planner.prepared
+
+
+def test_failed_background_prepare_is_retried_inline():
+    calls = []
+
+    def prepare(order_type, due):
+        calls.append(due)
+        if len(calls) == 1:
+            raise RuntimeError("geometry failed")
+        return due
+
+    planner = OrderPlanner({'regular': FixedIntervalSchedule(10.0)}, prepare, lookahead=8).start()
+    planner._thread.join(5)
+    assert not planner._thread.is_alive()
+    # Заказ, на котором упал фоновый поток, не теряется: он готовится на месте
+    assert planner.pop_due('regular', 20.0) == [0.0, 10.0, 20.0]
+    assert calls[:2] == [0.0, 0.0]
+    planner.stop()
+
+    planner = OrderPlanner({'regular': FixedIntervalSchedule(10.0)}, lambda *_: 1 / 0, lookahead=0)
+    with pytest.raises(ZeroDivisionError):
+        planner.pop_due('regular', 0.0)
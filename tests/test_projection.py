@@ -0,0 +1,67 @@
+import math
+
+import numpy as np
+import pytest
+from shapely.geometry import Polygon
+
+from engine import DiscreteEventEngine, VirtualClock
+from main import TaxiOrderSimulator, UsersList
+from metrics import Metrics
+from projection import EARTH_RADIUS_M, LocalProjection
+from sinks import FakeOrderSink
+
+POLYGON = [(30.33, -9.60), (30.43, -9.60), (30.43, -9.48), (30.33, -9.48)]
+
+
+def haversine(a, b):
+    lat1, lon1, lat2, lon2 = map(np.radians, (a[..., 0], a[..., 1], b[..., 0], b[..., 1]))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(h))
+
+
+def test_round_trip_and_center_distances():
+    projection = LocalProjection.for_geometry(Polygon(POLYGON))
+    assert (projection.center_lat, projection.center_lon) == pytest.approx((30.38, -9.54))
+    rng = np.random.default_rng(0)
+    points = np.column_stack((rng.uniform(30.33, 30.43, 1000), rng.uniform(-9.60, -9.48, 1000)))
+
+    projected = projection.forward_points(points)
+    assert projection.inverse_points(projected) == pytest.approx(points, abs=1e-9)
+    assert projection.forward_points([[30.38, -9.54]])[0] == pytest.approx([0.0, 0.0], abs=1e-6)
+    # Расстояние от центра проекции передаётся точно
+    center = np.array([[projection.center_lat, projection.center_lon]])
+    assert np.hypot(*projected.T) == pytest.approx(haversine(center, points), rel=1e-9)
+
+
+def test_distances_within_city_match_haversine():
+    projection = LocalProjection(30.38, -9.54)
+    rng = np.random.default_rng(1)
+    a = np.column_stack((rng.uniform(30.33, 30.43, 500), rng.uniform(-9.60, -9.48, 500)))
+    b = np.column_stack((rng.uniform(30.33, 30.43, 500), rng.uniform(-9.60, -9.48, 500)))
+    planar = np.hypot(*(projection.forward_points(a) - projection.forward_points(b)).T)
+    assert planar == pytest.approx(haversine(a, b), rel=1e-3)
+
+
+def test_metric_distance_band_in_simulator():
+    users = UsersList(user_count=300)
+    users.make_local()
+    simulator = TaxiOrderSimulator(POLYGON, users, regular_frequency=600, voting_frequency=0,
+                                   distance_units='km', distance_min=1, distance_max=3, sink=FakeOrderSink(),
+                                   clock=VirtualClock(), seed=2, metrics=Metrics())
+    DiscreteEventEngine(simulator).run(3600)
+    simulator.stop()
+
+    history = simulator.orders.history.to_dataframe()
+    origins = history[['origin_x', 'origin_y']].to_numpy()
+    destinations = history[['destination_x', 'destination_y']].to_numpy()
+    distances = haversine(origins, destinations)
+    assert len(distances) > 0
+    assert distances.min() >= 1000 * (1 - 1e-3) and distances.max() <= 3000 * (1 + 1e-3)
+
+
+def test_unknown_distance_units():
+    users = UsersList(user_count=1)
+    users.make_local()
+    with pytest.raises(ValueError):
+        TaxiOrderSimulator(POLYGON, users, distance_units='miles', sink=FakeOrderSink())
+    assert math.isclose(LocalProjection(0, 0).forward(0, 1)[0], EARTH_RADIUS_M * math.radians(1))
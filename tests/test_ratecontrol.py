@@ -0,0 +1,131 @@
+import pytest
+
+from metrics import Metrics
+from ratecontrol import RateController, make_rate_controller
+
+
+def order(creation_ts, expire_ts=10 ** 9):
+    return {'creation_ts': creation_ts, 'expire_ts': expire_ts}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        RateController('fastest')
+
+
+def test_none_sends_everything():
+    controller = RateController('none')
+    orders = [order(0), order(1000)]
+    assert controller.admit('regular', orders, 2000) == orders
+
+
+def test_drop_discards_late_orders():
+    metrics = Metrics()
+    controller = RateController('drop', metrics=metrics, max_lag_seconds=60)
+    late, on_time = order(0), order(100)
+    assert controller.admit('regular', [late, on_time], 120) == [on_time]
+    assert metrics.counter_total('rate_control_decisions_total', decision='dropped') == 1
+
+
+def test_coalesce_keeps_latest_late_order():
+    controller = RateController('coalesce', max_lag_seconds=60)
+    late = [order(0), order(10), order(20)]
+    on_time = order(100)
+    assert controller.admit('regular', late + [on_time], 120) == [late[-1], on_time]
+    assert controller.decisions == {'coalesced': 2, 'sent': 2}
+
+
+def test_defer_limits_burst_and_keeps_order():
+    controller = RateController('defer', max_burst=2, max_lag_seconds=60)
+    orders = [order(100 + i) for i in range(5)]
+    assert controller.admit('regular', orders, 110) == orders[:2]
+    assert controller.admit('regular', [], 111) == orders[2:4]
+    assert controller.admit('regular', [], 112) == orders[4:]
+    assert controller.backlog() == 0
+    assert controller.decisions == {'sent': 5, 'deferred': 3}
+
+
+def test_defer_drops_orders_past_max_lag():
+    controller = RateController('defer', max_burst=1, max_lag_seconds=10)
+    orders = [order(0), order(1), order(8)]
+    assert controller.admit('regular', orders, 0) == orders[:1]
+    # Через 10 с второй заказ опаздывает на 9 с, третий — на 2 с
+    assert controller.admit('regular', [], 10) == orders[1:2]
+    assert controller.admit('regular', [], 19) == []  # Третий опоздал на 11 с
+    assert controller.backlog() == 0
+    assert controller.decisions['dropped'] == 1
+
+
+def test_backlog_drops_expired_orders():
+    controller = RateController('defer', max_burst=1, max_lag_seconds=600)
+    orders = [order(0), order(0, expire_ts=5), order(0)]
+    controller.admit('regular', orders, 0)
+    assert controller.admit('regular', [], 5) == [orders[2]]
+    assert controller.decisions['dropped'] == 1
+
+
+def test_backlog_overflow_drops_oldest():
+    controller = RateController('defer', max_burst=0, max_backlog=3)
+    orders = [order(i) for i in range(5)]
+    controller.admit('regular', orders, 5)
+    assert list(controller._backlog['regular']) == orders[2:]
+    assert controller.decisions['dropped'] == 2
+
+
+def test_aimd_follows_token_bucket_clock():
+    clock = FakeClock()
+    controller = RateController('aimd', target_rate=2.0, max_burst=0, max_lag_seconds=600, clock=clock)
+    orders = [order(0) for _ in range(10)]
+    assert controller.admit('regular', orders, 0) == []
+    clock.now = 1.0
+    assert len(controller.admit('regular', [], 1)) == 2
+    clock.now = 2.0
+    assert len(controller.admit('regular', [], 2)) == 2
+    assert controller.backlog() == 6
+
+
+def test_aimd_decreases_and_increases_limit():
+    clock = FakeClock()
+    controller = RateController('aimd', target_rate=8.0, decrease_factor=0.5, additive_increase=1.0,
+                                latency_target=0.5, cooldown_seconds=1.0, clock=clock)
+    controller.observe(1.0)
+    assert controller.limit == 4.0
+    controller.observe(0.1, ok=False)  # В пределах cooldown — без повторного уменьшения
+    assert controller.limit == 4.0
+    clock.now = 3.0
+    controller.observe(0.1)
+    assert controller.limit == 7.0  # +1 заказ/с за каждую секунду без перегрузки
+
+
+def test_make_rate_controller_uses_given_clock():
+    clock = FakeClock()
+    assert make_rate_controller('aimd', clock=clock).clock is clock
+    own = FakeClock()
+    assert make_rate_controller({'policy': 'aimd', 'clock': own}, clock=clock).clock is own
+    assert make_rate_controller(None).policy == 'none'
+
+
+def test_aimd_in_discrete_run_uses_virtual_time():
+    from engine import DiscreteEventEngine, VirtualClock
+    from main import TaxiOrderSimulator, UsersList
+    from sinks import FakeOrderSink
+
+    users = UsersList(user_count=2000)
+    users.make_local()
+    sink = FakeOrderSink()
+    simulator = TaxiOrderSimulator([(30.33, -9.60), (30.43, -9.60), (30.43, -9.48), (30.33, -9.48)], users,
+                                   regular_frequency=3600, voting_frequency=0, sink=sink, clock=VirtualClock(),
+                                   seed=1, metrics=Metrics(), rate_control={'policy': 'aimd', 'max_rate': 2.0})
+    DiscreteEventEngine(simulator).run(1800)
+    simulator.stop()
+    # Темп — заказ в секунду виртуального времени, ниже лимита: отправлены все
+    assert sink.created >= 1790
+    assert 'dropped' not in simulator.rate_control.decisions
@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pytest
+import shapely
+from PIL import Image
+
+import render
+from engine import DiscreteEventEngine, VirtualClock
+from main import TaxiOrderSimulator, UsersList
+from metrics import Metrics
+from render import event_log_changes, frame_snapshots, history_changes, load_polygon
+from sinks import FakeOrderSink
+
+POLYGON = [(30.33, -9.60), (30.43, -9.60), (30.43, -9.48), (30.33, -9.48)]
+UNTIL = 1800
+
+
+@pytest.fixture(scope='module')
+def recorded(tmp_path_factory):
+    """
+    Записанный прогон: (поток событий .jsonl.gz, история заказов .csv, время старта).
+    """
+    path = tmp_path_factory.mktemp('render')
+    users = UsersList(user_count=300)
+    users.make_local()
+    simulator = TaxiOrderSimulator(POLYGON, users, regular_frequency=600, voting_frequency=120,
+                                   regular_lifetime_minutes=5, voting_lifetime_minutes_min=2,
+                                   voting_lifetime_minutes_max=5, sink=FakeOrderSink(), clock=VirtualClock(),
+                                   seed=2, metrics=Metrics(), drivers=20, record_path=str(path / 'run.jsonl.gz'))
+    DiscreteEventEngine(simulator).run(UNTIL)
+    simulator.stop()
+    simulator.orders.history.to_dataframe().to_csv(path / 'history.csv', index=False)
+    return str(path / 'run.jsonl.gz'), str(path / 'history.csv'), simulator._start_ts
+
+
+def test_frame_snapshots_apply_changes_between_frames():
+    changes = [
+        (0.0, 'a', (1.0, 1.0, 2.0, 2.0, 0)),
+        (5.0, 'b', (3.0, 3.0, 4.0, 4.0, 1)),
+        (10.0, 'a', None),
+        (25.0, 'c', (5.0, 5.0, 6.0, 6.0, 0)),
+    ]
+    frames = list(frame_snapshots(iter(changes), 10.0))
+    assert [index for index, _ in frames] == [0, 1, 2, 3]
+    assert [len(snapshot['origin']) for _, snapshot in frames] == [1, 1, 1, 2]
+    assert list(frames[1][1]['order_type']) == [1]
+    assert frames[1][1]['destination'].tolist() == [[4.0, 4.0]]
+
+    frames = list(frame_snapshots(iter(changes), 10.0, start_ts=-10.0, end_ts=10.0))
+    assert [len(snapshot['origin']) for _, snapshot in frames] == [0, 1, 1]
+
+
+def test_history_gives_same_frames_as_event_log(recorded):
+    events, history, start_ts = recorded
+    # Заказы, активные к концу прогона, в истории отсутствуют: сравниваем кадры до последнего срока жизни
+    end_ts = start_ts + UNTIL - 300
+    from_events = list(frame_snapshots(event_log_changes(events), 60.0, start_ts, end_ts))
+    from_history = list(frame_snapshots(history_changes(history), 60.0, start_ts, end_ts))
+
+    assert len(from_events) == len(from_history) == (UNTIL - 300) // 60 + 1
+    for (_, a), (_, b) in zip(from_events, from_history):
+        # CSV хранит координаты с точностью до последнего знака
+        np.testing.assert_allclose(sorted(a['origin'].tolist()), sorted(b['origin'].tolist()), rtol=1e-12)
+        assert sorted(a['order_type'].tolist()) == sorted(b['order_type'].tolist())
+    assert len(from_events[-1][1]['origin']) > 0
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_render_png_series(recorded, tmp_path, workers):
+    events, _, _ = recorded
+    stats = render.render(events, str(tmp_path / 'frames'), frame_seconds=300, workers=workers, dpi=40)
+
+    names = sorted(os.listdir(tmp_path / 'frames'))
+    assert stats['frames'] == len(names) == UNTIL // 300 + 1
+    assert names[0] == 'frame_000000.png'
+    with Image.open(tmp_path / 'frames' / names[-1]) as image:
+        assert image.size == (320, 320)
+
+
+def test_render_gif_without_ffmpeg(recorded, tmp_path, monkeypatch):
+    _, history, _ = recorded
+    monkeypatch.setattr(render, '_ffmpeg', lambda: None)
+    stats = render.render(history, str(tmp_path / 'run.gif'), polygon=POLYGON, frame_seconds=600, workers=0,
+                          dpi=40)
+    with Image.open(tmp_path / 'run.gif') as image:
+        assert image.n_frames == stats['frames'] > 1
+    with pytest.raises(RuntimeError):
+        render.render(history, str(tmp_path / 'run.mp4'), polygon=POLYGON, frame_seconds=600, workers=0, dpi=40)
+
+
+def test_load_polygon(tmp_path):
+    path = tmp_path / 'zone.json'
+    path.write_text('[[0, 0], [1, 0], [1, 1]]')
+    expected = shapely.Polygon([(0, 0), (1, 0), (1, 1)])
+    for value in (expected, [(0, 0), (1, 0), (1, 1)], expected.wkt, str(path)):
+        assert load_polygon(value).equals(expected)
+    assert load_polygon(None) is None
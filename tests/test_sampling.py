@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import MultiPolygon, Polygon
+
+from sampling import BoundingBoxSampler, TriangulatedSampler, make_sampler
+
+SQUARE = [(0, 0), (10, 0), (10, 10), (0, 10)]
+HOLE = [(3, 3), (7, 3), (7, 7), (3, 7)]
+
+WITH_HOLE = Polygon(SQUARE, [HOLE])
+MULTI = MultiPolygon([
+    Polygon([(0, 0), (4, 0), (4, 4), (0, 4)]),
+    Polygon([(6, 6), (12, 6), (9, 12)]),
+])
+
+
+def inside(polygon, points):
+    return shapely.contains_xy(polygon, points[:, 0], points[:, 1])
+
+
+@pytest.mark.parametrize('polygon', [WITH_HOLE, MULTI], ids=['hole', 'multipolygon'])
+def test_points_fall_inside_polygon(polygon):
+    sampler = TriangulatedSampler(polygon, rng=np.random.default_rng(0))
+    assert sampler.total_area == pytest.approx(polygon.area)
+
+    points = sampler.sample_points(20000)
+    assert inside(polygon, points).all()
+
+
+def test_points_are_uniform_over_parts():
+    sampler = TriangulatedSampler(MULTI, rng=np.random.default_rng(1))
+    points = sampler.sample_points(40000)
+    share = inside(MULTI.geoms[0], points).mean()
+    assert share == pytest.approx(MULTI.geoms[0].area / MULTI.area, abs=0.01)
+
+
+@pytest.mark.parametrize('candidates', [8, 0], ids=['candidates', 'clipping'])
+@pytest.mark.parametrize('polygon', [WITH_HOLE, MULTI], ids=['hole', 'multipolygon'])
+def test_destinations_meet_distance_band_without_retries(polygon, candidates):
+    sampler = TriangulatedSampler(polygon, rng=np.random.default_rng(2), annulus_candidates=candidates)
+    origins, destinations = sampler.sample_pairs(2000, 1.0, 3.0)
+
+    distances = np.hypot(*(destinations - origins).T)
+    assert ((distances >= 1.0) & (distances <= 3.0)).all()
+    assert inside(polygon, origins).all()
+    assert inside(polygon, destinations).all()
+    assert sampler.origin_retries == 0
+    if candidates == 0:
+        assert sampler.annulus_clipped == 2000
+
+
+def test_candidates_match_exact_clipping():
+    # Кандидаты в кольце и точное отсечение дают одно и то же распределение
+    origins = np.repeat([[5.0, 1.5]], 5000, axis=0)
+    means = []
+    for candidates in (8, 0):
+        sampler = TriangulatedSampler(WITH_HOLE, rng=np.random.default_rng(3), annulus_candidates=candidates)
+        means.append(sampler.sample_destinations(origins, 1.0, 4.0).mean(axis=0))
+    assert means[0] == pytest.approx(means[1], abs=0.05)
+
+
+def test_unreachable_band_raises_for_fixed_origins():
+    sampler = TriangulatedSampler(Polygon(SQUARE), rng=np.random.default_rng(4))
+    with pytest.raises(ValueError):
+        sampler.sample_destinations([[5.0, 5.0]], 20.0, 30.0)
+
+
+def test_make_sampler():
+    assert isinstance(make_sampler('bbox', WITH_HOLE), BoundingBoxSampler)
+    assert isinstance(make_sampler('triangulation', WITH_HOLE), TriangulatedSampler)
+    with pytest.raises(ValueError):
+        make_sampler('grid', WITH_HOLE)
+
+
+@pytest.mark.parametrize('polygon', [WITH_HOLE, MULTI], ids=['hole', 'multipolygon'])
+def test_bbox_sampler_batches(polygon):
+    sampler = BoundingBoxSampler(polygon, rng=np.random.default_rng(5), batch_size=256)
+    points = np.concatenate([sampler.sample_points(n) for n in (1, 10, 300, 2000)])
+    assert len(points) == 2311
+    assert inside(polygon, points).all()
+    # Непрочитанные точки пачки остаются в буфере; доля принятых — доля полигона в bounding box
+    assert sampler.candidates_accepted >= len(points)
+    minx, miny, maxx, maxy = polygon.bounds
+    assert sampler.candidates_accepted / sampler.candidates_drawn == pytest.approx(
+        polygon.area / ((maxx - minx) * (maxy - miny)), abs=0.03)
+
+    origins, destinations = sampler.sample_pairs(2000, 1.0, 3.0)
+    distances = np.hypot(*(destinations - origins).T)
+    assert ((distances >= 1.0) & (distances <= 3.0)).all()
+    assert inside(polygon, destinations).all()
+    stats = sampler.stats()
+    assert stats['dest_candidates_drawn'] > stats['dest_candidates_rejected'] >= 0
+
+
+def test_simulator_uses_batched_pairs():
+    from main import TaxiOrderSimulator, UsersList
+    from sinks import FakeOrderSink
+
+    users = UsersList(user_count=10)
+    users.make_local()
+    polygon = [(30.33, -9.60), (30.43, -9.60), (30.43, -9.48), (30.33, -9.48)]
+    simulator = TaxiOrderSimulator(polygon, users, geometry_batch_size=64, sink=FakeOrderSink(), seed=1,
+                                   distance_min=0.01, distance_max=0.03)
+    pairs = [simulator._random_order_coords() for _ in range(100)]
+    # Две пачки по 64 пары: в буфере осталось 28
+    assert len(simulator._order_coords_buffer) == 28
+    shape = Polygon(polygon)
+    for origin, destination in pairs:
+        assert shape.contains(shapely.Point(origin)) and shape.contains(shapely.Point(destination))
+        assert 0.01 <= np.hypot(origin[0] - destination[0], origin[1] - destination[1]) <= 0.03
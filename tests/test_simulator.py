@@ -0,0 +1,186 @@
+import api
+from engine import DiscreteEventEngine, VirtualClock
+from main import TaxiOrderSimulator, UsersList
+from metrics import Metrics
+from sinks import ApiOrderSink, FakeOrderSink
+
+POLYGON = [(30.33, -9.60), (30.43, -9.60), (30.43, -9.48), (30.33, -9.48)]
+
+
+def test_sync_update_survives_create_errors(stub_api, monkeypatch):
+    monkeypatch.setattr(api, "http_retries", 0)
+    monkeypatch.setattr(api, "_sessions", {})
+    users = UsersList(user_count=100)
+    users.sync(workers=4)
+    stub_api.error_rate = 0.2
+    stub_api._random.seed(1)
+
+    metrics = Metrics()
+    simulator = TaxiOrderSimulator(POLYGON, users, regular_frequency=600, voting_frequency=120,
+                                   sink=ApiOrderSink(), clock=VirtualClock(), seed=1, metrics=metrics,
+                                   rate_control='aimd')
+    DiscreteEventEngine(simulator).run(1800)
+    simulator.stop(timeout=10)
+
+    errors = metrics.counter_total('order_create_errors_total')
+    created = metrics.counter_total('orders_created_total')
+    assert errors > 0 and created > 0
+    # Тик не прерывается: истечение заказов тоже работает
+    assert metrics.counter_total('orders_expired_total') > 0
+    # Пользователи неудачных заказов освобождены
+    assert len(simulator._free_users) == len(users.get_users()) - len(simulator.orders)
+
+
+def test_sent_time_is_recorded_apart_from_schedule():
+    users = UsersList(user_count=500)
+    users.make_local()
+    metrics = Metrics()
+    clock = VirtualClock()
+    simulator = TaxiOrderSimulator(POLYGON, users, regular_frequency=600, voting_frequency=120,
+                                   regular_lifetime_minutes=5, sink=FakeOrderSink(), clock=clock,
+                                   seed=1, metrics=metrics)
+    simulator.start()
+    # Тик раз в 10 игровых секунд: заказы внутри тика уходят позже своего расписания
+    for tick in range(1, 181):
+        clock.advance_to(tick * 10.0)
+        simulator.update()
+    simulator.stop()
+
+    history = simulator.orders.history.to_dataframe()
+    assert len(history) > 0
+    delay = history['sent_ts'] - history['creation_ts']
+    assert (delay >= 0).all() and (delay <= 10).all() and (delay > 0).any()
+    assert (history['sent_time'] >= history['creation_time']).all()
+
+    snapshot = metrics.snapshot()['histograms']
+    sent = sum(h['count'] for name, h in snapshot.items() if name.startswith('order_send_delay_seconds'))
+    assert sent == metrics.counter_total('orders_created_total')
+
+
+def test_async_update_records_the_same_timers():
+    import asyncio
+
+    from main import AsyncTaxiOrderSimulator
+
+    def timers(simulator_class):
+        users = UsersList(user_count=200)
+        users.make_local()
+        metrics = Metrics()
+        simulator = simulator_class(POLYGON, users, regular_frequency=600, voting_frequency=120,
+                                    regular_lifetime_minutes=2, sink=FakeOrderSink(), clock=VirtualClock(),
+                                    seed=1, metrics=metrics)
+        engine = DiscreteEventEngine(simulator)
+        simulator.start()
+        for tick in range(1, 601):
+            engine._advance_game_time(tick)
+            if simulator_class is AsyncTaxiOrderSimulator:
+                asyncio.run(simulator.update())
+            else:
+                simulator.update()
+        simulator.stop()
+        assert metrics.counter_total('orders_expired_total') > 0
+        return metrics.snapshot()['histograms']
+
+    sync, async_ = timers(TaxiOrderSimulator), timers(AsyncTaxiOrderSimulator)
+    for name in ('update_seconds', 'update_phase_seconds{phase="expire"}'):
+        assert sync[name]['count'] == async_[name]['count'] == 600
+
+
+def test_async_client_limits_concurrency():
+    import asyncio
+    import threading
+    import time
+
+    client = api.AsyncApiClient(max_concurrency=3)
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def blocking(i):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.02)
+        with lock:
+            state["running"] -= 1
+        return i
+
+    async def run():
+        return await asyncio.gather(*(client.call(blocking, i) for i in range(12)))
+
+    try:
+        assert asyncio.run(run()) == list(range(12))
+    finally:
+        client.close()
+    assert state["peak"] == 3
+
+
+def test_async_simulator_through_stub(stub_api, monkeypatch):
+    import asyncio
+
+    from main import AsyncTaxiOrderSimulator
+
+    monkeypatch.setattr(api, "_async_client", None)
+    users = UsersList(user_count=50)
+    users.sync(workers=4)
+    stub_api.latency_ms = 5
+
+    metrics = Metrics()
+    simulator = AsyncTaxiOrderSimulator(POLYGON, users, regular_frequency=1200, voting_frequency=0,
+                                        regular_lifetime_minutes=2, sink=ApiOrderSink(), clock=VirtualClock(),
+                                        seed=1, metrics=metrics)
+    engine = DiscreteEventEngine(simulator)
+    simulator.start()
+
+    async def run():
+        # Тик раз в 30 игровых секунд: за тик набегает 10 заказов, они уходят одновременно
+        for tick in range(1, 41):
+            engine._advance_game_time(tick * 30.0)
+            await simulator.update()
+
+    asyncio.run(run())
+    assert simulator.stop(timeout=10)
+
+    created = metrics.counter_total('orders_created_total')
+    assert created == len(stub_api.drives) > 0
+    assert metrics.counter_total('order_create_errors_total') == 0
+    cancelled = [drive for drive in stub_api.drives.values() if drive["b_state"] == "cancelled"]
+    assert len(cancelled) == metrics.counter_total('orders_expired_total') > 0
+    assert len(simulator.orders) == created - len(cancelled)
+
+
+def test_orders_expire_exactly_on_time_in_expiry_order():
+    users = UsersList(user_count=500)
+    users.make_local()
+    metrics = Metrics()
+    simulator = TaxiOrderSimulator(POLYGON, users, regular_frequency=300, voting_frequency=300,
+                                   voting_lifetime_minutes_min=1, voting_lifetime_minutes_max=15,
+                                   sink=FakeOrderSink(), clock=VirtualClock(), seed=2, metrics=metrics, drivers=20)
+    DiscreteEventEngine(simulator).run(2 * 3600)
+    simulator.stop()
+
+    history = simulator.orders.history.to_dataframe()
+    expired = history[history['outcome'] == 'expired']
+    assert len(expired) == metrics.counter_total('orders_expired_total') > 0
+    # Движок будит симулятор ровно в момент истечения: снятие без опоздания и по порядку expire_ts
+    assert (expired['finished_ts'] == expired['expire_ts']).all()
+    assert expired['expire_ts'].is_monotonic_increasing
+    # Принятые водителями заказы остаются в куче истечения, но повторно не снимаются
+    assert (history['outcome'] == 'accepted').any()
+    assert history['id'].is_unique
+
+
+def test_free_user_pool():
+    users = UsersList(user_count=5)
+    users.make_local()
+    simulator = TaxiOrderSimulator(POLYGON, users, sink=FakeOrderSink(), seed=1)
+    taken = [simulator._take_free_user() for _ in range(5)]
+    assert sorted(taken) == [0, 1, 2, 3, 4]
+    assert simulator._take_free_user() is None
+    assert simulator._get_free_user_ids() == []
+
+    simulator._release_user(3)
+    simulator._release_user(3)
+    simulator._release_user(1)
+    assert sorted(simulator._get_free_user_ids()) == [1, 3]
+    assert sorted([simulator._take_free_user(), simulator._take_free_user()]) == [1, 3]
+    assert simulator._take_free_user() is None
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+import api
+from sinks import ApiOrderSink, FakeOrderSink, make_sink
+from stub_server import StubServer
+
+
+def make_order(user_id, order_id=None):
+    return {'id': order_id, 'userID': user_id, 'coords': (30.4, -9.5), 'destination_coords': (30.41, -9.52),
+            'start_datetime': '2026-01-01 10:00:00+03:00', 'waiting': 600, 'services': []}
+
+
+def test_fake_sink_issues_sequential_ids_across_threads():
+    sink = FakeOrderSink(first_id=100)
+    ids = []
+
+    def create():
+        for _ in range(500):
+            ids.append(sink.create_order({}))
+
+    threads = [threading.Thread(target=create) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(ids) == list(range(100, 2100))
+    sink.cancel_order({}, 'expired')
+    sink.accept_order({}, 1)
+    sink.vote_order({}, 1)
+    assert (sink.created, sink.cancelled, sink.accepted, sink.voted) == (2000, 1, 1, 1)
+
+
+def test_make_sink():
+    assert isinstance(make_sink('fake'), FakeOrderSink)
+    assert isinstance(make_sink('api'), ApiOrderSink)
+    with pytest.raises(ValueError):
+        make_sink('kafka')
+
+
+def test_api_sink_against_stub(stub_api):
+    client_id = api.RegisterClient("client@test.com", "Client")["data"]["u_id"]
+    driver_id = api.RegisterDriver("driver@test.com", "Driver")["data"]["u_id"]
+    sink = ApiOrderSink()
+
+    accepted = make_order(client_id, sink.create_order(make_order(client_id)))
+    cancelled = make_order(client_id, sink.create_order(make_order(client_id)))
+    assert stub_api.drives[accepted['id']]['u_id'] == client_id
+
+    # Принять заказ может только зарегистрированный водитель
+    with pytest.raises(RuntimeError):
+        sink.accept_order(accepted, '999')
+    sink.accept_order(accepted, driver_id)
+    assert stub_api.drives[accepted['id']]['b_driver'] == driver_id
+    with pytest.raises(RuntimeError):
+        sink.vote_order(accepted, driver_id)
+
+    sink.cancel_order(cancelled, 'expired')
+    assert stub_api.drives[cancelled['id']]['b_state'] == 'cancelled'
+    with pytest.raises(RuntimeError):
+        sink.cancel_order(make_order(client_id, 999), 'expired')
+    assert stub_api.request_counts['drive/'] == 2
+
+
+def test_stub_latency_and_errors():
+    stub = StubServer(latency_ms=20, error_rate=0.5, seed=1).start()
+    started = time.perf_counter()
+    codes = [stub.handle('auth', {})[0] for _ in range(40)]
+    assert time.perf_counter() - started >= 40 * 0.02
+    assert set(codes) == {200, 500}
+    assert 10 <= codes.count(500) <= 30
+    assert stub.request_counts['auth'] == 40
+    assert stub.handle('unknown', {})[0] in (404, 500)
+    stub.stop()
@@ -0,0 +1,128 @@
+import csv
+import json
+import os
+
+import pytest
+
+from scenario import build_simulator, build_users, expand_sweep, load_scenario, set_path
+from sinks import FakeOrderSink
+from sweep import RESULT_COLUMNS, run_sweep, run_variant, write_table
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+POLYGON = [[30.33, -9.60], [30.43, -9.60], [30.43, -9.48], [30.33, -9.48]]
+
+SCENARIO = {
+    'users': {'count': 100},
+    'simulator': {'polygon': POLYGON, 'regular_frequency': 600, 'voting_frequency': 60,
+                  'regular_lifetime_minutes': 5, 'seed': 1},
+    'run': {'mode': 'discrete', 'hours': 0.25, 'sink': 'fake'},
+    'sweep': {'simulator.regular_frequency': [300, 1200], 'run.sink': ['fake', 'stub']},
+}
+
+TOML = '''
+[users]
+count = 100
+
+[simulator]
+polygon_file = "zone.json"
+regular_frequency = 600
+voting_frequency = 60
+regular_lifetime_minutes = 5
+seed = 1
+
+[run]
+mode = "discrete"
+hours = 0.25
+sink = "fake"
+
+[sweep]
+"simulator.regular_frequency" = [300, 1200]
+"run.sink" = ["fake", "stub"]
+'''
+
+
+def write_scenario(tmp_path, name='city.json', scenario=SCENARIO):
+    path = tmp_path / name
+    path.write_text(json.dumps(scenario))
+    return str(path)
+
+
+def test_json_and_toml_scenarios_match(tmp_path):
+    (tmp_path / 'zone.json').write_text(json.dumps(POLYGON))
+    (tmp_path / 'city.toml').write_text(TOML)
+    assert load_scenario(str(tmp_path / 'city.toml')) == load_scenario(write_scenario(tmp_path))
+    assert load_scenario(write_scenario(tmp_path))['name'] == 'city'
+
+
+@pytest.mark.parametrize('scenario', [
+    {**SCENARIO, 'runs': {}},
+    {key: value for key, value in SCENARIO.items() if key != 'simulator'},
+], ids=['unknown_section', 'no_polygon'])
+def test_invalid_scenario_raises(tmp_path, scenario):
+    with pytest.raises(ValueError):
+        load_scenario(write_scenario(tmp_path, scenario=scenario))
+
+
+def test_unknown_format_raises(tmp_path):
+    with pytest.raises(ValueError):
+        load_scenario(str(tmp_path / 'city.ini'))
+
+
+def test_expand_sweep_builds_grid():
+    variants = expand_sweep(SCENARIO)
+    assert [variant['variant'] for variant in variants] == [
+        'regular_frequency=300,sink=fake', 'regular_frequency=300,sink=stub',
+        'regular_frequency=1200,sink=fake', 'regular_frequency=1200,sink=stub',
+    ]
+    assert variants[1]['run']['sink'] == 'stub' and variants[1]['simulator']['regular_frequency'] == 300
+    assert variants[1]['params'] == {'simulator.regular_frequency': 300, 'run.sink': 'stub'}
+    assert 'sweep' not in variants[0] and SCENARIO['run']['sink'] == 'fake'
+    assert [variant['variant'] for variant in expand_sweep({'simulator': {}})] == ['base']
+
+    scenario = {}
+    set_path(scenario, 'run.stub.latency_ms', 20)
+    assert scenario == {'run': {'stub': {'latency_ms': 20}}}
+
+
+@pytest.mark.parametrize('name', sorted(os.listdir(EXAMPLES)))
+def test_examples_load(name):
+    scenario = load_scenario(os.path.join(EXAMPLES, name))
+    variants = expand_sweep(scenario)
+    assert len(variants) > 1
+    simulator = build_simulator(variants[0], build_users({'users': {'count': 10}}), sink=FakeOrderSink())
+    simulator.stop()
+
+
+def test_run_variant_reports_counts(tmp_path):
+    variants = expand_sweep({**SCENARIO, 'name': 'city'})
+    rows = [run_variant(variant, str(tmp_path)) for variant in variants[:2]]
+    for row in rows:
+        assert row['error'] == ""
+        assert row['created'] == row['expired'] + row['active'] > 0
+        assert row['scenario'] == 'city' and row['simulator.regular_frequency'] == 300
+    # Один и тот же seed — одинаковый поток заказов через любой приёмник
+    assert rows[0]['created'] == rows[1]['created'] == 300 // 4 + 1 + 60 // 4 + 1
+
+    broken = dict(variants[0], run={**variants[0]['run'], 'mode': 'later'})
+    row = run_variant(broken, str(tmp_path))
+    assert 'later' in row['error'] and 'created' not in row
+
+
+def test_run_sweep_writes_table(tmp_path):
+    rows = run_sweep([write_scenario(tmp_path)], workers=2, output=str(tmp_path / 'out' / 'results.csv'))
+    assert [row['variant'] for row in rows] == [variant['variant'] for variant in expand_sweep(SCENARIO)]
+    assert all(row['error'] == "" for row in rows)
+
+    with open(tmp_path / 'out' / 'results.csv', encoding='utf-8') as f:
+        table = list(csv.DictReader(f))
+    assert [int(row['created']) for row in table] == [row['created'] for row in rows]
+    with open(tmp_path / 'out' / 'results.json', encoding='utf-8') as f:
+        assert json.load(f) == rows
+
+
+def test_write_table_unions_parameter_columns(tmp_path):
+    write_table([{'scenario': 'a', 'x': 1, 'created': 2}, {'scenario': 'b', 'y': 3, 'error': 'boom'}],
+                str(tmp_path / 'table.csv'))
+    with open(tmp_path / 'table.csv', encoding='utf-8') as f:
+        header = next(csv.reader(f))
+    assert header == ['scenario', 'x', 'y', *RESULT_COLUMNS]
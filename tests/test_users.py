@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import api
+from main import UsersList
+
+
+@pytest.fixture
+def no_retries(monkeypatch):
+    monkeypatch.setattr(api, "http_retries", 0)
+    monkeypatch.setattr(api, "_sessions", {})
+
+
+def test_sync_registers_missing_and_finds_existing_users(stub_api):
+    api.RegisterClient(UsersList._email(3), "Existing")
+    users = UsersList(user_count=40)
+    users.sync(workers=8)
+
+    assert [u["email"] for u in users.get_users()] == [UsersList._email(i) for i in range(40)]
+    assert len(set(users.get_user_ids())) == 40
+    assert len(stub_api.users) == 40
+    assert users.get_users()[3]["name"] == "Existing"
+    # Регистрируются только отсутствующие: 39 при синхронизации и один заранее
+    assert stub_api.request_counts["register"] == 40
+
+
+def test_sync_uses_cache(stub_api, tmp_path):
+    cache = str(tmp_path / "users.json")
+    first = UsersList(user_count=20, cache_file=cache)
+    first.sync(workers=4)
+    requests = dict(stub_api.request_counts)
+
+    second = UsersList(user_count=25, cache_file=cache)
+    second.sync(workers=4)
+    assert second.get_users()[:20] == first.get_users()
+    # Из API запрошены только 5 новых пользователей
+    assert stub_api.request_counts["register"] - requests["register"] == 5
+    assert len(json.load(open(cache, encoding="utf-8"))) == 25
+
+
+def test_sync_retries_failed_users(stub_api, no_retries):
+    stub_api.error_rate = 0.3
+    stub_api._random.seed(3)
+    users = UsersList(user_count=30)
+    users.sync(workers=4, retries=20)
+    assert len(users.get_users()) == 30
+
+
+def test_sync_reports_users_that_never_synced(stub_api, no_retries, tmp_path):
+    stub_api.error_rate = 1.0
+    users = UsersList(user_count=5, cache_file=str(tmp_path / "users.json"))
+    with pytest.raises(Exception, match="failed for 5 users"):
+        users.sync(workers=2, retries=1)
+    assert users.get_users() == []
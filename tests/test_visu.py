@@ -0,0 +1,137 @@
+import datetime
+import time
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+from shapely.geometry import Polygon  # noqa: E402
+
+import visu  # noqa: E402
+from engine import DiscreteEventEngine, VirtualClock  # noqa: E402
+from main import TaxiOrderSimulator, UsersList  # noqa: E402
+from orders import ORDER_TYPE_CODES  # noqa: E402
+from sinks import FakeOrderSink  # noqa: E402
+from visu import OrdersView, SimulationRunner, polygon_patch, take_snapshot  # noqa: E402
+
+POLYGON = [(30.33, -9.60), (30.43, -9.60), (30.43, -9.48), (30.33, -9.48)]
+
+
+def make_simulator(**kwargs):
+    users = UsersList(user_count=2000)
+    users.make_local()
+    return TaxiOrderSimulator(POLYGON, users, regular_frequency=3600, voting_frequency=600, sink=FakeOrderSink(),
+                              seed=1, **kwargs)
+
+
+@pytest.fixture
+def axes():
+    fig, ax = plt.subplots()
+    yield ax
+    plt.close(fig)
+
+
+def test_snapshot_matches_active_orders():
+    simulator = make_simulator(clock=VirtualClock(), drivers=20)
+    DiscreteEventEngine(simulator).run(600)
+    snapshot = take_snapshot(simulator)
+    simulator.stop()
+
+    orders = simulator.get_active_orders()
+    assert len(snapshot['origin']) == len(orders) > 0
+    assert [tuple(point) for point in snapshot['origin']] == [order['coords'] for order in orders]
+    assert list(snapshot['order_type']) == [ORDER_TYPE_CODES[order['order_type']] for order in orders]
+    assert snapshot['drivers'].shape == (20, 2)
+    assert not snapshot['origin'].flags.writeable
+
+
+def test_runner_publishes_snapshots_from_its_thread():
+    simulator = make_simulator(time_compression=600)
+    simulator.start()
+    runner = SimulationRunner(simulator, tick_seconds=0.01).start()
+    try:
+        deadline = time.monotonic() + 10
+        while not len(runner.latest()['origin']) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        runner.stop()
+        simulator.stop()
+    assert len(runner.latest()['origin']) > 0
+    assert not runner._thread.is_alive()
+
+
+def test_polygon_patch_keeps_holes():
+    shape = Polygon([(0, 0), (10, 0), (10, 10), (0, 10)], [[(3, 3), (7, 3), (7, 7), (3, 7)]])
+    fig, ax = plt.subplots(figsize=(2, 2), dpi=50)
+    try:
+        ax.add_patch(polygon_patch(shape, facecolor='black'))
+        ax.set_xlim(0, 10)
+        ax.set_ylim(0, 10)
+        ax.axis('off')
+        fig.subplots_adjust(0, 0, 1, 1)
+        fig.canvas.draw()
+        pixels = np.asarray(fig.canvas.buffer_rgba())
+    finally:
+        plt.close(fig)
+    # Угол полигона закрашен, дыра в центре — нет
+    assert tuple(pixels[95, 5, :3]) == (0, 0, 0)
+    assert tuple(pixels[50, 50, :3]) == (255, 255, 255)
+
+
+def snapshot_of(count, rng):
+    origin = rng.uniform((30.33, -9.60), (30.43, -9.48), (count, 2))
+    return {'origin': origin, 'destination': origin + 0.001, 'order_type': np.arange(count) % 2,
+            'drivers': None, 'game_time': datetime.datetime(2026, 1, 1, 10)}
+
+
+def test_orders_view_switches_modes_by_count(axes):
+    view = OrdersView(axes, Polygon(POLYGON), routes_threshold=100, density_threshold=1000)
+    rng = np.random.default_rng(0)
+
+    view.draw(snapshot_of(50, rng))
+    assert view.routes.get_visible() and len(view.routes.get_segments()) == 50
+    assert len(view.points['regular'].get_offsets()) == 25 and not view.density.get_visible()
+    assert not view.drivers.get_visible()
+    assert view.clock.get_text() == "10:00:00 — заказов: 50"
+
+    view.draw(snapshot_of(500, rng))
+    assert not view.routes.get_visible() and view.points['voting'].get_visible()
+
+    snapshot = snapshot_of(5000, rng)
+    snapshot['drivers'] = np.zeros((3, 2))
+    artists = view.draw(snapshot)
+    assert view.density.get_visible() and not view.points['regular'].get_visible()
+    assert np.nansum(view.density.get_array()) == 5000
+    assert view.drivers.get_visible() and len(view.drivers.get_offsets()) == 3
+    assert all(artist.get_animated() for artist in artists)
+    axes.figure.canvas.draw()
+
+
+def test_visualize_simulation_stops_runner(monkeypatch):
+    simulator = make_simulator(time_compression=600)
+    simulator.start()
+    frames = []
+
+    def show():
+        anim._draw_next_frame(0, blit=False)
+        frames.append(len(simulator.orders))
+
+    anim = None
+    real_animation = visu.FuncAnimation
+
+    def animation(*args, **kwargs):
+        nonlocal anim
+        anim = real_animation(*args, **kwargs)
+        return anim
+
+    monkeypatch.setattr(visu, 'FuncAnimation', animation)
+    monkeypatch.setattr(plt, 'show', show)
+    try:
+        assert visu.visualize_simulation(simulator, tick_seconds=0.01) is anim
+    finally:
+        simulator.stop()
+        plt.close('all')
+    assert frames and anim._blit
@@ -0,0 +1,115 @@
+import json
+
+from metrics import Metrics
+from zones import merge_endpoint_stats, merge_event_logs, merge_metrics
+
+
+def write_log(path, events):
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+
+
+def test_merge_endpoint_stats():
+    a = {"drive/": {"count": 2, "errors": 1, "total_seconds": 1.0, "max_seconds": 0.8, "mean_seconds": 0.5}}
+    b = {"drive/": {"count": 3, "errors": 0, "total_seconds": 0.5, "max_seconds": 0.3, "mean_seconds": 0.17},
+         "token": {"count": 1, "errors": 0, "total_seconds": 0.1, "max_seconds": 0.1, "mean_seconds": 0.1}}
+    merged = merge_endpoint_stats([a, b])
+    assert merged["drive/"] == {"count": 5, "errors": 1, "total_seconds": 1.5, "max_seconds": 0.8,
+                                "mean_seconds": 0.3}
+    assert merged["token"]["count"] == 1
+
+
+def test_merge_event_logs_sorts_unordered_streams(tmp_path):
+    # Отмены пишутся по ответу API, поэтому внутри потока зоны ts идут не по порядку
+    write_log(tmp_path / "a.jsonl", [
+        {"event": "meta", "seed": 1},
+        {"event": "created", "ts": 10, "id": 1},
+        {"event": "created", "ts": 30, "id": 2},
+        {"event": "expired", "ts": 20, "id": 1},
+    ])
+    write_log(tmp_path / "b.jsonl", [
+        {"event": "created", "ts": 15, "id": 1, "zone": "b"},
+        {"event": "voted", "ts": 15, "id": 1, "zone": "b"},
+        {"event": "expired", "ts": 5, "id": 0, "zone": "b"},
+    ])
+    output = tmp_path / "events.jsonl"
+    count = merge_event_logs([tmp_path / "a.jsonl", tmp_path / "b.jsonl"], output)
+    events = [json.loads(line) for line in open(output, encoding="utf-8")]
+    assert count == len(events) == 6
+    assert [event["ts"] for event in events] == [5, 10, 15, 15, 20, 30]
+    # При равном ts сохраняется порядок записи
+    assert [event["event"] for event in events[2:4]] == ["created", "voted"]
+    assert all(event["event"] != "meta" for event in events)
+
+
+def test_merge_metrics():
+    zones = []
+    for latency in (0.002, 0.2):
+        metrics = Metrics()
+        metrics.inc('orders_created_total', 3, order_type='regular')
+        metrics.set_gauge('active_orders', 2)
+        metrics.observe('order_create_seconds', latency)
+        zones.append(metrics.snapshot())
+    merged = merge_metrics(zones)
+    assert merged['counters'] == {'orders_created_total{order_type="regular"}': 6}
+    assert merged['gauges'] == {'active_orders': 4}
+    histogram = merged['histograms']['order_create_seconds']
+    assert histogram['count'] == 2
+    assert histogram['max'] == 0.2
+    assert histogram['p50'] == 0.0025
+    assert sum(histogram['buckets'].values()) == 2
+
+
+def test_zone_results_are_not_cumulative_in_a_shared_worker(tmp_path):
+    from main import UsersList
+    from zones import ZoneCoordinator
+
+    users = UsersList(user_count=200)
+    users.make_local()
+    polygon = [(30.33, -9.60), (30.43, -9.60), (30.43, -9.48), (30.33, -9.48)]
+    zones = [{'name': name, 'polygon_coords': polygon, 'regular_frequency': frequency, 'voting_frequency': 0,
+              'seed': 1, 'sampling_method': method}
+             for name, frequency, method in (('a', 400, 'bbox'), ('b', 200, 'triangulation'))]
+    # Один процесс на обе зоны: вторая выполняется в том же воркере после первой
+    result = ZoneCoordinator(zones, users, processes=1, output_dir=str(tmp_path)).run(until=1800)
+    def created(snapshot):
+        return sum(value for key, value in snapshot['counters'].items() if key.startswith('orders_created_total'))
+
+    for zone in result['zones']:
+        assert created(zone['metrics']) == zone['created']
+        # Gauge-метрики зоны пишет только её собственный симулятор
+        gauges = zone['metrics']['gauges']
+        assert gauges['active_orders'] == zone['active_orders']
+    samplers = {key for key in result['zones'][1]['metrics']['gauges'] if key.startswith('sampler_')}
+    assert samplers and all('TriangulatedSampler' in key for key in samplers)
+    assert created(result['metrics']) == result['created']
+
+
+def test_stopped_simulator_does_not_write_gauges_after_reset():
+    from engine import DiscreteEventEngine, VirtualClock
+    from main import TaxiOrderSimulator, UsersList
+    from sinks import FakeOrderSink
+
+    users = UsersList(user_count=200)
+    users.make_local()
+    polygon = [(30.33, -9.60), (30.43, -9.60), (30.43, -9.48), (30.33, -9.48)]
+    metrics = Metrics()
+
+    def run(frequency, method):
+        simulator = TaxiOrderSimulator(polygon, users, regular_frequency=frequency, voting_frequency=0,
+                                       sampling_method=method, sink=FakeOrderSink(), clock=VirtualClock(),
+                                       seed=1, metrics=metrics)
+        DiscreteEventEngine(simulator).run(1800)
+        simulator.stop()
+        return simulator
+
+    # Как в воркере пула: симулятор прошлой зоны ещё жив, реестр метрик обнулён
+    previous = run(400, 'bbox')
+    metrics.reset()
+    current = run(200, 'triangulation')
+
+    gauges = metrics.snapshot()['gauges']
+    assert gauges['active_orders'] == len(current.orders) != len(previous.orders)
+    samplers = {key for key in gauges if key.startswith('sampler_')}
+    assert samplers and all('TriangulatedSampler' in key for key in samplers)
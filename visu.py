@@ -1,83 +1,254 @@
+import asyncio
+import threading
+
 import matplotlib.pyplot as plt
+import numpy as np
+import shapely
 from matplotlib.animation import FuncAnimation
-from shapely.geometry import Point, Polygon
+from matplotlib.collections import LineCollection
+from matplotlib.patches import PathPatch
+from matplotlib.path import Path
+from shapely.geometry.polygon import orient
+
+from orders import ORDER_TYPE_CODES
+
+# Цвета заказов по типам
+ORDER_COLORS = {'regular': 'red', 'voting': 'blue'}
 
 
-def visualize_simulation(simulator):
+def take_snapshot(simulator):
     """
-    Визуализация симуляции в режиме анимации (matplotlib).
-    Предполагается, что simulator уже создан и запущен (simulator.start()).
+    Снимок активных заказов в виде массивов NumPy (неизменяемые копии — симуляция может идти дальше).
+    Массивы берутся из кэшированного simulator.active_orders_view() и пересобираются,
+    только если заказы менялись. Если у симулятора есть водители, в снимок попадают
+    их координаты ('drivers').
     """
-    fig, ax = plt.subplots()
+    view = simulator.active_orders_view()
+    return {
+        'origin': view.origin,
+        'destination': view.destination,
+        'order_type': view.order_type,
+        'drivers': simulator.drivers.locations() if simulator.drivers is not None else None,
+        'game_time': simulator._get_current_game_datetime(),
+    }
 
-    x_poly, y_poly = simulator.polygon.exterior.xy
-    ax.fill(x_poly, y_poly, alpha=0.2, edgecolor='black', linewidth=1)
 
-    points_plot = ax.scatter([], [], color='red', marker='o')
+class SimulationRunner:
+    """
+    Крутит simulator.update() в отдельном потоке и после каждого тика публикует снимок
+    активных заказов. Отрисовка берёт последний снимок и не задерживает генерацию заказов.
+    """
 
-    def init():
-        ax.set_title("Taxi Orders Simulation")
-        ax.set_xlabel("Долгота (x)")
-        ax.set_ylabel("Широта (y)")
-        return (points_plot,)
+    def __init__(self, simulator, tick_seconds=0.2):
+        self.simulator = simulator
+        self.tick_seconds = tick_seconds
+        self._snapshot = take_snapshot(simulator)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def latest(self):
+        with self._lock:
+            return self._snapshot
+
+    def _publish(self):
+        snapshot = take_snapshot(self.simulator)
+        with self._lock:
+            self._snapshot = snapshot
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.simulator.update()
+            self._publish()
+            self._stop.wait(self.tick_seconds)
+
+    async def _run_async(self):
+        while not self._stop.is_set():
+            await self.simulator.update()
+            self._publish()
+            await asyncio.sleep(self.tick_seconds)
+
+    def _target(self):
+        if asyncio.iscoroutinefunction(self.simulator.update):
+            asyncio.run(self._run_async())
+        else:
+            self._run()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._target, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def polygon_patch(geometry, **kwargs):
+    """
+    PathPatch для Polygon/MultiPolygon (с дырами) в координатах (lat, lon).
+    """
+    vertices, codes = [], []
+    for part in shapely.get_parts(geometry):
+        part = orient(part, 1.0)  # Внешний контур против часовой стрелки, дыры — по часовой
+        for ring in [part.exterior, *part.interiors]:
+            coords = np.asarray(ring.coords)
+            vertices.append(coords)
+            codes.append(np.full(len(coords), Path.LINETO, dtype=Path.code_type))
+            codes[-1][0] = Path.MOVETO
+            codes[-1][-1] = Path.CLOSEPOLY
+    return PathPatch(Path(np.concatenate(vertices), np.concatenate(codes)), **kwargs)
+
+
+class OrdersView:
+    """
+    Отрисовка снимка заказов на осях: по scatter на каждый тип заказа, отрезки
+    "откуда -> куда" одной LineCollection, а при большом числе заказов — карта плотности.
+    Все изменяемые художники анимированы (для блиттинга).
+    """
 
-    def update(frame):
-        # Обновляем симуляцию
-        simulator.update()
-        orders = simulator.get_active_orders()
+    def __init__(self, ax, polygon, routes_threshold=2000, density_threshold=5000, density_bins=120):
+        """
+        :param routes_threshold: отрезки маршрутов рисуются, пока заказов не больше этого числа.
+        :param density_threshold: при большем числе заказов вместо точек рисуется карта плотности.
+        :param density_bins: разрешение карты плотности (клеток по длинной стороне).
+        """
+        self.ax = ax
+        self.routes_threshold = routes_threshold
+        self.density_threshold = density_threshold
+
+        ax.add_patch(polygon_patch(polygon, alpha=0.2, edgecolor='black', linewidth=1))
+        minx, miny, maxx, maxy = polygon.bounds
+        pad = 0.02 * max(maxx - minx, maxy - miny)
+        ax.set_xlim(minx - pad, maxx + pad)
+        ax.set_ylim(miny - pad, maxy + pad)
+        self._extent = (minx, maxx, miny, maxy)
+        size = max(maxx - minx, maxy - miny) / density_bins
+        self._bins = (max(int(np.ceil((maxx - minx) / size)), 1), max(int(np.ceil((maxy - miny) / size)), 1))
+
+        self.routes = LineCollection([], colors='gray', linewidths=0.5, alpha=0.4, animated=True)
+        ax.add_collection(self.routes)
+        self.points = {
+            name: ax.scatter([], [], color=color, marker='o', s=8, label=name, animated=True)
+            for name, color in ORDER_COLORS.items()
+        }
+        self.drivers = ax.scatter([], [], color='green', marker='^', s=6, alpha=0.6, label='driver',
+                                  animated=True, visible=False)
+        self.density = ax.imshow(np.zeros(self._bins[::-1]), extent=self._extent, origin='lower',
+                                 cmap='hot_r', alpha=0.8, aspect='auto', animated=True, visible=False)
+        self.clock = ax.text(0.02, 0.98, "", transform=ax.transAxes, va='top', animated=True)
+        ax.legend(loc='lower right')
+
+    def artists(self):
+        return (self.routes, *self.points.values(), self.drivers, self.density, self.clock)
+
+    def draw(self, snapshot):
+        origin = snapshot['origin']
+        count = len(origin)
+        dense = count > self.density_threshold
+
+        self.density.set_visible(dense)
+        if dense:
+            hist, _, _ = np.histogram2d(origin[:, 0], origin[:, 1], bins=self._bins,
+                                        range=((self._extent[0], self._extent[1]), (self._extent[2], self._extent[3])))
+            # Пустые клетки прозрачны
+            self.density.set_data(np.where(hist > 0, hist, np.nan).T)
+            self.density.set_clim(0, max(hist.max(), 1))
+        for name, scatter in self.points.items():
+            scatter.set_visible(not dense)
+            if not dense:
+                scatter.set_offsets(origin[snapshot['order_type'] == ORDER_TYPE_CODES[name]])
+
+        show_routes = count <= self.routes_threshold
+        self.routes.set_visible(show_routes)
+        if show_routes:
+            self.routes.set_segments(np.stack((origin, snapshot['destination']), axis=1))
+
+        drivers = snapshot.get('drivers')
+        self.drivers.set_visible(drivers is not None)
+        if drivers is not None:
+            self.drivers.set_offsets(drivers)
+
+        self.clock.set_text(f"{snapshot['game_time'].strftime('%H:%M:%S')} — заказов: {count}")
+        return self.artists()
+
+
+def visualize_simulation(simulator, interval_ms=200, tick_seconds=0.2, routes_threshold=2000, density_threshold=5000):
+    """
+    Визуализация симуляции в режиме анимации (matplotlib).
+    Предполагается, что simulator уже создан и запущен (simulator.start()).
 
-        # Извлекаем координаты активных заказов
-        xs = [o['coords'][0] for o in orders]
-        ys = [o['coords'][1] for o in orders]
+    Симуляция идёт в отдельном потоке (SimulationRunner, тик — tick_seconds), а анимация
+    раз в interval_ms перерисовывает (с блиттингом) последний снимок активных заказов.
+    """
+    fig, ax = plt.subplots()
+    ax.set_title("Taxi Orders Simulation")
+    ax.set_xlabel("Долгота (x)")
+    ax.set_ylabel("Широта (y)")
+    view = OrdersView(ax, simulator.polygon, routes_threshold, density_threshold)
 
-        # Обновляем scatter plot
-        points_plot.set_offsets(list(zip(xs, ys)))
+    runner = SimulationRunner(simulator, tick_seconds).start()
 
-        # Можно также отобразить текущее "игровое" время
-        current_game_dt = simulator._get_current_game_datetime()
-        ax.set_title(f"Taxi Orders Simulation — {current_game_dt.strftime('%H:%M:%S')}")
+    def init():
+        return view.artists()
 
-        return (points_plot,)
+    def update(frame):
+        return view.draw(runner.latest())
 
-    anim = FuncAnimation(fig, update, init_func=init, interval=1000, blit=False, frames=100)
-    plt.show()
+    anim = FuncAnimation(fig, update, init_func=init, interval=interval_ms, blit=True, cache_frame_data=False)
+    try:
+        plt.show()
+    finally:
+        runner.stop()
+    return anim
 
 
 if __name__ == '__main__':
-    polygon_coords = [
-        (30.42854544631636, -9.611663818359375),
-        (30.45459295698008, -9.53819274902344),
-        (30.420256142845158, -9.545745849609377),
-        (30.410189613309132, -9.526519775390627),
-        (30.385314913418373, -9.482574462890627),
-        (30.35806392728733, -9.477081298828127),
-        (30.34325042354528, -9.472961425781252),
-        (30.329620019722665, -9.481201171875002),
-        (30.315987718557867, -9.50798034667969),
-        (30.329620019722665, -9.539566040039064),
-        (30.347990988731844, -9.567718505859377),
-        (30.378206692827195, -9.602050781250002),
-        (30.42854544631636, -9.611663818359375)
-    ]
-
-    from main import TaxiOrderSimulator,UsersList
-    users = UsersList(user_count=5)
-    users.sync()
-
-    simulator = TaxiOrderSimulator(
-        polygon_coords=polygon_coords,
-        users_list=users,
-        regular_frequency=5,
-        voting_frequency=2,
-        regular_lifetime_minutes=10,
-        voting_lifetime_minutes_min=5,
-        voting_lifetime_minutes_max=15,
-        distance_min=0.01,
-        distance_max=0.05,
-        time_compression=15.0,  # ускоряем время в 20 раз
-        simulation_hours=4,  # 1 час симуляции (с 8:00 до 9:00)
-        time_shift_minutes=3 * 60
-    )
+    import sys
+
+    if len(sys.argv) > 1:
+        # Параметры из файла сценария (см. scenario.py): python visu.py examples/rate_vs_latency.toml
+        from scenario import build_simulator, build_users, load_scenario
+
+        scenario = load_scenario(sys.argv[1])
+        simulator = build_simulator(scenario, build_users(scenario, sync=True))
+    else:
+        polygon_coords = [
+            (30.42854544631636, -9.611663818359375),
+            (30.45459295698008, -9.53819274902344),
+            (30.420256142845158, -9.545745849609377),
+            (30.410189613309132, -9.526519775390627),
+            (30.385314913418373, -9.482574462890627),
+            (30.35806392728733, -9.477081298828127),
+            (30.34325042354528, -9.472961425781252),
+            (30.329620019722665, -9.481201171875002),
+            (30.315987718557867, -9.50798034667969),
+            (30.329620019722665, -9.539566040039064),
+            (30.347990988731844, -9.567718505859377),
+            (30.378206692827195, -9.602050781250002),
+            (30.42854544631636, -9.611663818359375)
+        ]
+
+        from main import TaxiOrderSimulator,UsersList
+        users = UsersList(user_count=5)
+        users.sync()
+
+        simulator = TaxiOrderSimulator(
+            polygon_coords=polygon_coords,
+            users_list=users,
+            regular_frequency=5,
+            voting_frequency=2,
+            regular_lifetime_minutes=10,
+            voting_lifetime_minutes_min=5,
+            voting_lifetime_minutes_max=15,
+            distance_min=0.01,
+            distance_max=0.05,
+            time_compression=15.0,  # ускоряем время в 20 раз
+            simulation_hours=4,  # 1 час симуляции (с 8:00 до 9:00)
+            time_shift_minutes=3 * 60
+        )
+
     simulator.start()
 
     visualize_simulation(simulator)
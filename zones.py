@@ -0,0 +1,260 @@
+"""
+Многозонная симуляция: каждая зона обслуживания (свой полигон, свои частоты)
+работает в отдельном процессе, а координатор делит между зонами пользователей,
+задаёт общие часы и сводит метрики и потоки событий.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import DiscreteEventEngine, VirtualClock
+from main import TaxiOrderSimulator, UsersList
+from sinks import RecordingSink, make_sink
+from api import GetEndpointStats, ResetEndpointStats
+from metrics import Histogram, registry
+
+# Параметры, общие для всех зон (задаются координатором, а не зоной)
+SHARED_PARAMS = ('time_compression', 'simulation_hours', 'time_shift_minutes')
+
+
+def _run_zone(name, simulator_kwargs, users, sink_name, mode, real_start_time, until, events_path, tick_seconds):
+    """
+    Запускает симуляцию одной зоны (выполняется в процессе-воркере) и возвращает её метрики.
+    """
+    # Воркер пула может выполнить несколько зон подряд, а счётчики API и реестр метрик
+    # общие на процесс: обнуляем их, чтобы в результат попали только запросы этой зоны
+    ResetEndpointStats()
+    registry.reset()
+
+    users_list = UsersList(user_count=len(users))
+    users_list.users = users
+    sink = RecordingSink(make_sink(sink_name), events_path, extra={"zone": name})
+
+    started = time.perf_counter()
+    if mode == 'discrete':
+        simulator = TaxiOrderSimulator(users_list=users_list, sink=sink, clock=VirtualClock(), **simulator_kwargs)
+        DiscreteEventEngine(simulator).run(until)
+    else:
+        simulator = TaxiOrderSimulator(users_list=users_list, sink=sink, **simulator_kwargs)
+        # Все зоны отсчитывают игровое время от одного и того же реального момента
+        while time.time() < real_start_time:
+            time.sleep(min(real_start_time - time.time(), tick_seconds))
+        simulator.start(real_start_time)
+        end_time = real_start_time + until / simulator.time_compression
+        while time.time() < end_time:
+            simulator.update()
+            time.sleep(tick_seconds)
+        simulator.update()
+    simulator.stop()
+    sink.close()
+
+    return {
+        'zone': name,
+        'users': len(users),
+        'created': sink.created,
+        'expired': sink.expired,
+        'active_orders': len(simulator.orders),
+        'wall_seconds': time.perf_counter() - started,
+        'api': GetEndpointStats(),
+        'metrics': registry.snapshot(),
+        'events_path': events_path,
+    }
+
+
+def merge_endpoint_stats(stats_list):
+    """
+    Сводит счётчики задержек api.GetEndpointStats() нескольких процессов.
+    """
+    merged = {}
+    for stats in stats_list:
+        for endpoint, s in stats.items():
+            m = merged.setdefault(endpoint, {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            m["count"] += s["count"]
+            m["errors"] += s["errors"]
+            m["total_seconds"] += s["total_seconds"]
+            m["max_seconds"] = max(m["max_seconds"], s["max_seconds"])
+    for m in merged.values():
+        m["mean_seconds"] = m["total_seconds"] / m["count"] if m["count"] else 0.0
+    return merged
+
+
+def merge_metrics(snapshots):
+    """
+    Сводит снимки metrics.Metrics.snapshot() нескольких процессов: счётчики и gauge-метрики
+    складываются, гистограммы объединяются по корзинам (квантили пересчитываются).
+    Gauge-метрики, которые не имеет смысла складывать (например, schedule_lag_seconds),
+    смотрите в снимках отдельных зон.
+    """
+    counters = {}
+    gauges = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for key, value in snapshot['counters'].items():
+            counters[key] = counters.get(key, 0) + value
+        for key, value in snapshot['gauges'].items():
+            gauges[key] = gauges.get(key, 0) + value
+        for key, data in snapshot['histograms'].items():
+            histogram = Histogram.from_dict(data)
+            if key in histograms:
+                histograms[key].merge(histogram)
+            else:
+                histograms[key] = histogram
+    return {
+        'counters': counters,
+        'gauges': gauges,
+        'histograms': {key: h.to_dict() for key, h in histograms.items()},
+    }
+
+
+def _event_keys(f, stream):
+    """
+    Ключи (ts, номер потока, смещение строки) событий файла f; строки-заголовки (без "ts") пропускаются.
+    """
+    keys = []
+    offset = 0
+    for line in f:
+        event = json.loads(line)
+        if "ts" in event:
+            keys.append((event["ts"], stream, offset))
+        offset += len(line)
+    return keys
+
+
+def merge_event_logs(paths, output_path):
+    """
+    Сливает JSONL-потоки событий зон в один, упорядоченный по игровому времени.
+
+    Внутри потока зоны события не обязательно упорядочены: отмены и действия водителей
+    записываются по мере ответа API, а ts у них — игровое время события. Поэтому события
+    сортируются по ts (при равенстве — в порядке записи); в памяти держатся только ключи
+    (ts, смещение строки), сами строки перечитываются из файлов.
+    """
+    files = [open(path, "rb") for path in paths]
+    try:
+        keys = sorted(key for stream, f in enumerate(files) for key in _event_keys(f, stream))
+        with open(output_path, "wb") as out:
+            for _, stream, offset in keys:
+                f = files[stream]
+                f.seek(offset)
+                out.write(f.readline())
+        return len(keys)
+    finally:
+        for f in files:
+            f.close()
+
+
+class ZoneCoordinator:
+    """
+    Запускает симуляторы зон в пуле процессов.
+
+    Зона — словарь параметров TaxiOrderSimulator плюс:
+     'name' — имя зоны (обязательно),
+     'user_count' — сколько пользователей отдать зоне (по умолчанию — поровну из оставшихся).
+    Параметры time_compression, simulation_hours и time_shift_minutes задаются
+    координатором и одинаковы для всех зон.
+    """
+
+    def __init__(self, zones, users_list, sink='fake', mode='discrete', output_dir='zones_output',
+                 time_compression=1.0, simulation_hours=2, time_shift_minutes=0,
+                 processes=None, tick_seconds=1.0, startup_delay=2.0):
+        """
+        :param zones: список словарей настроек зон.
+        :param users_list: UsersList (синхронизированный или make_local()), делится между зонами без пересечений.
+        :param sink: имя приёмника заказов в воркерах (см. sinks.SINKS).
+        :param mode: 'discrete' (виртуальное время, как можно быстрее) или 'realtime'.
+        :param output_dir: куда писать потоки событий зон и общий events.jsonl.
+        :param processes: число процессов (по умолчанию — по одному на зону).
+        :param tick_seconds: пауза между update() в режиме realtime.
+        :param startup_delay: через сколько секунд после run() начинается общее игровое время (realtime).
+        """
+        names = [zone['name'] for zone in zones]
+        if len(set(names)) != len(names):
+            raise ValueError("Имена зон должны быть уникальными")
+        if mode not in ('discrete', 'realtime'):
+            raise ValueError(f"Неизвестный режим: {mode!r}")
+        self.zones = zones
+        self.users_list = users_list
+        self.sink = sink
+        self.mode = mode
+        self.output_dir = output_dir
+        self.shared = {
+            'time_compression': time_compression,
+            'simulation_hours': simulation_hours,
+            'time_shift_minutes': time_shift_minutes,
+        }
+        self.processes = processes or len(zones)
+        self.tick_seconds = tick_seconds
+        self.startup_delay = startup_delay
+
+    def partition_users(self):
+        """
+        Делит пользователей между зонами непересекающимися срезами.
+        """
+        users = self.users_list.get_users()
+        fixed = sum(zone['user_count'] for zone in self.zones if 'user_count' in zone)
+        flexible = [i for i, zone in enumerate(self.zones) if 'user_count' not in zone]
+        if fixed > len(users):
+            raise ValueError(f"Зонам нужно {fixed} пользователей, а доступно {len(users)}")
+        share, extra = divmod(len(users) - fixed, len(flexible)) if flexible else (0, 0)
+
+        parts = []
+        offset = 0
+        for i, zone in enumerate(self.zones):
+            if 'user_count' in zone:
+                count = zone['user_count']
+            else:
+                count = share + (1 if flexible.index(i) < extra else 0)
+            parts.append(users[offset:offset + count])
+            offset += count
+        return parts
+
+    def _simulator_kwargs(self, zone):
+        kwargs = {k: v for k, v in zone.items() if k not in ('name', 'user_count')}
+        kwargs.update(self.shared)
+        return kwargs
+
+    def run(self, until=None):
+        """
+        Запускает все зоны и ждёт их завершения. Возвращает сводные метрики;
+        общий поток событий пишется в output_dir/events.jsonl.
+
+        :param until: длительность прогона в игровых секундах (по умолчанию — simulation_hours).
+        """
+        if until is None:
+            until = self.shared['simulation_hours'] * 3600
+        os.makedirs(self.output_dir, exist_ok=True)
+        real_start_time = time.time() + self.startup_delay
+
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            futures = [
+                executor.submit(
+                    _run_zone,
+                    zone['name'],
+                    self._simulator_kwargs(zone),
+                    users,
+                    self.sink,
+                    self.mode,
+                    real_start_time,
+                    until,
+                    os.path.join(self.output_dir, zone['name'] + ".jsonl"),
+                    self.tick_seconds,
+                )
+                for zone, users in zip(self.zones, self.partition_users())
+            ]
+            zone_results = [future.result() for future in futures]
+
+        events_path = os.path.join(self.output_dir, "events.jsonl")
+        events = merge_event_logs([r['events_path'] for r in zone_results], events_path)
+        return {
+            'zones': zone_results,
+            'created': sum(r['created'] for r in zone_results),
+            'expired': sum(r['expired'] for r in zone_results),
+            'active_orders': sum(r['active_orders'] for r in zone_results),
+            'events': events,
+            'events_path': events_path,
+            'wall_seconds': time.perf_counter() - started,
+            'api': merge_endpoint_stats(r['api'] for r in zone_results),
+            'metrics': merge_metrics(r['metrics'] for r in zone_results),
+        }